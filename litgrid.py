@@ -12,15 +12,21 @@ from datetime import datetime, date, timedelta
 import plotly.graph_objects as go
 import plotly.express as px
 import pandas as pd
+import numpy as np
 from dotenv import load_dotenv
 import hashlib
 import hmac
 import secrets
 import json
 import re
+import math
+import unicodedata
 from zoneinfo import ZoneInfo
-from collections import Counter
+from collections import Counter, OrderedDict
+from types import SimpleNamespace
+import heapq
 import warnings
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 # Optional security imports
 try:
@@ -55,6 +61,12 @@ try:
 except ImportError:
     BARCODE_AVAILABLE = False
 
+try:
+    from rapidfuzz import fuzz as rf_fuzz, process as rf_process
+    RAPIDFUZZ_AVAILABLE = True
+except ImportError:
+    RAPIDFUZZ_AVAILABLE = False
+
 try:
     import pdfplumber
     PDF_PLUMBER_AVAILABLE = True
@@ -758,46 +770,606 @@ class BarcodeQRGenerator:
         qr_image.save(buffer, format='PNG')
         return base64.b64encode(buffer.getvalue()).decode()
 
+class TrigramIndex:
+    """In-memory trigram inverted index used to prefilter typo-tolerant book search"""
+    
+    INDEXED_FIELDS = ('title', 'author', 'isbn')
+    TEXT_FIELDS = ('title', 'author', 'genre', 'isbn')
+    CANDIDATE_LIMIT = 500
+    MIN_OVERLAP = 0.3
+    STOP_GRAM_RATIO = 0.2
+    
+    @staticmethod
+    @st.cache_resource(show_spinner=False)
+    def _state():
+        """Postings and watermark shared by every session; a resource so reruns keep the index"""
+        return SimpleNamespace(lock=threading.Lock(), postings={}, doc_grams={}, doc_text={}, watermark=None)
+    
+    @staticmethod
+    def trigrams(text):
+        """Split text into padded word trigrams"""
+        grams = set()
+        for word in re.findall(r'[a-z0-9]+', str(text or '').lower()):
+            padded = f"  {word} "
+            grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+        return grams
+    
+    @classmethod
+    def _add_book(cls, state, book):
+        book_id = book['book_id']
+        grams = cls.trigrams(" ".join(str(book.get(f) or '') for f in cls.INDEXED_FIELDS))
+        state.doc_grams[book_id] = grams
+        state.doc_text[book_id] = " ".join(str(book.get(f) or '') for f in cls.TEXT_FIELDS).lower()
+        for gram in grams:
+            state.postings.setdefault(gram, set()).add(book_id)
+    
+    @staticmethod
+    def _remove_book(state, book_id):
+        for gram in state.doc_grams.pop(book_id, ()):
+            postings = state.postings.get(gram)
+            if postings is not None:
+                postings.discard(book_id)
+                if not postings:
+                    del state.postings[gram]
+        state.doc_text.pop(book_id, None)
+    
+    @classmethod
+    def refresh(cls):
+        """Bring the index up to date with the catalog_changes feed"""
+        state = cls._state()
+        with state.lock:
+            latest = Database.execute_query(
+                "SELECT COALESCE(MAX(change_id), 0) as change_id FROM catalog_changes",
+                fetch_one=True
+            )
+            if latest is None:
+                return False
+            latest_id = int(latest['change_id'])
+            
+            if state.watermark is None:
+                books = Database.execute_query(
+                    "SELECT book_id, title, author, genre, isbn FROM books"
+                ) or []
+                state.postings, state.doc_grams, state.doc_text = {}, {}, {}
+                for book in books:
+                    cls._add_book(state, book)
+                state.watermark = latest_id
+                return True
+            
+            if latest_id <= state.watermark:
+                return True
+            
+            changed = Database.execute_query(
+                "SELECT DISTINCT book_id FROM catalog_changes WHERE change_id > ? AND change_id <= ? AND change_type <> 'popularity'",
+                (state.watermark, latest_id)
+            ) or []
+            changed_ids = [row['book_id'] for row in changed]
+            books = Database.execute_query(
+                """
+                SELECT book_id, title, author, genre, isbn FROM books
+                WHERE book_id IN (SELECT value FROM json_each(?))
+                """,
+                (json.dumps(changed_ids),)
+            ) or []
+            for book_id in changed_ids:
+                cls._remove_book(state, book_id)
+            for book in books:
+                cls._add_book(state, book)
+            state.watermark = latest_id
+            return True
+    
+    @classmethod
+    def watermark(cls):
+        """Last catalog_changes id applied, None until the index is built"""
+        return cls._state().watermark
+    
+    @classmethod
+    def candidates(cls, query, limit=None):
+        """Return book ids sharing the most trigrams with query, best first"""
+        overlap = cls._overlap(query)
+        return heapq.nlargest(limit or cls.CANDIDATE_LIMIT, overlap, key=overlap.__getitem__)
+    
+    @classmethod
+    def matching_ids(cls, query):
+        """Return every book id with enough trigram overlap to be a fuzzy match"""
+        return list(cls._overlap(query))
+    
+    @classmethod
+    def _overlap(cls, query):
+        """Trigram hit counts for books passing the minimum overlap"""
+        grams = cls.trigrams(query)
+        if not grams:
+            return {}
+        
+        cls.refresh()
+        state = cls._state()
+        with state.lock:
+            postings = [state.postings[g] for g in grams if g in state.postings]
+            if not postings:
+                return {}
+            
+            # Very common trigrams barely discriminate, skip them when rarer ones exist
+            stop_size = max(1, int(len(state.doc_text) * cls.STOP_GRAM_RATIO))
+            selective = [p for p in postings if len(p) <= stop_size]
+            if selective:
+                postings = selective
+            
+            overlap = Counter()
+            for posting in postings:
+                overlap.update(posting)
+        
+        min_hits = max(1, int(len(postings) * cls.MIN_OVERLAP))
+        return {book_id: hits for book_id, hits in overlap.items() if hits >= min_hits}
+    
+    @classmethod
+    def texts_for(cls, book_ids):
+        """Preprocessed lowercase search text for the given book ids"""
+        state = cls._state()
+        with state.lock:
+            return [state.doc_text.get(book_id, '') for book_id in book_ids]
+
 class FuzzySearchEngine:
     """Fuzzy search implementation"""
     
+    BOOK_FIELDS = ('title', 'author', 'genre', 'isbn')
+    USER_FIELDS = ('full_name', 'username', 'email')
+    VERSION_SQL = {
+        'books': "SELECT COALESCE(MAX(change_id), 0) as version FROM catalog_changes",
+        'users': "SELECT COUNT(*) || ':' || COALESCE(MAX(user_id), 0) || ':' || COALESCE(MAX(updated_at), '') as version FROM users",
+    }
+    
+    @staticmethod
+    @st.cache_resource(show_spinner=False)
+    def _corpus_cache():
+        """Per-kind (version, {id: text}) corpora, kept across reruns"""
+        return SimpleNamespace(lock=threading.Lock(), corpora={})
+    
+    @classmethod
+    def _corpus_version(cls, kind):
+        """Cheap table version: the change feed watermark for books, count/max id/max updated_at for users"""
+        row = Database.execute_query(cls.VERSION_SQL[kind], fetch_one=True)
+        return row['version'] if row else None
+    
+    @classmethod
+    def _prepare_corpus(cls, kind, rows, fields, id_field):
+        """Return preprocessed lowercase search strings, cached per row id until the table version moves"""
+        version = cls._corpus_version(kind)
+        
+        cache = cls._corpus_cache()
+        with cache.lock:
+            cached = cache.corpora.get(kind)
+            if version is None or cached is None or cached[0] != version:
+                cached = (version, {})
+                cache.corpora[kind] = cached
+            texts = cached[1]
+            
+            choices = []
+            for row in rows:
+                row_id = row.get(id_field)
+                text = texts.get(row_id)
+                if text is None:
+                    text = " ".join(str(row.get(f) or '') for f in fields).lower()
+                    if row_id is not None and version is not None:
+                        texts[row_id] = text
+                choices.append(text)
+        return choices
+    
+    @staticmethod
+    def batch_score(query, choices, threshold=60, top_k=None):
+        """Score query against all choices at once, return top-k (score, index) pairs"""
+        if not query or not choices:
+            return []
+        
+        query = query.lower()
+        if RAPIDFUZZ_AVAILABLE:
+            # Single vectorized call over the whole candidate array
+            scores = rf_process.cdist(
+                [query], choices, scorer=rf_fuzz.partial_ratio,
+                dtype=np.uint8, workers=-1
+            )[0]
+        else:
+            scores = np.fromiter(
+                (fuzz.partial_ratio(query, choice) for choice in choices),
+                dtype=np.uint8, count=len(choices)
+            )
+        
+        matched = np.flatnonzero(scores >= threshold)
+        if top_k is None:
+            top_k = len(matched)
+        
+        # Heap selection keeps the original order for equal scores
+        best = heapq.nlargest(top_k, matched.tolist(), key=scores.__getitem__)
+        return [(int(scores[i]), i) for i in best]
+    
     @staticmethod
-    def search_books(query, books_list, threshold=60):
+    def search_books(query, books_list, threshold=60, top_k=None):
         """Fuzzy search books"""
         if not query or not books_list:
             return []
         
-        results = []
-        for book in books_list:
-            # Create searchable text
-            searchable = f"{book.get('title', '')} {book.get('author', '')} {book.get('genre', '')} {book.get('isbn', '')}"
-            
-            # Calculate similarity score
-            score = fuzz.partial_ratio(query.lower(), searchable.lower())
-            
-            if score >= threshold:
-                results.append((score, book))
+        choices = FuzzySearchEngine._prepare_corpus('books', books_list, FuzzySearchEngine.BOOK_FIELDS, 'book_id')
+        ranked = FuzzySearchEngine.batch_score(query, choices, threshold, top_k)
+        return [books_list[i] for score, i in ranked]
+    
+    @staticmethod
+    def search_catalog(query, threshold=60, top_k=None, candidate_limit=None):
+        """Typo-tolerant catalog search: trigram prefilter, then exact fuzz scoring"""
+        if not query:
+            return []
+        
+        candidate_ids = TrigramIndex.candidates(query, limit=candidate_limit)
+        if not candidate_ids:
+            return []
         
-        # Sort by score descending
-        results.sort(reverse=True, key=lambda x: x[0])
-        return [book for score, book in results]
+        choices = TrigramIndex.texts_for(candidate_ids)
+        ranked = FuzzySearchEngine.batch_score(query, choices, threshold, top_k)
+        return [(candidate_ids[i], score) for score, i in ranked]
     
     @staticmethod
-    def search_users(query, users_list, threshold=70):
+    def search_users(query, users_list, threshold=70, top_k=None):
         """Fuzzy search users"""
         if not query or not users_list:
             return []
         
-        results = []
-        for user in users_list:
-            searchable = f"{user.get('full_name', '')} {user.get('username', '')} {user.get('email', '')}"
-            score = fuzz.partial_ratio(query.lower(), searchable.lower())
+        choices = FuzzySearchEngine._prepare_corpus('users', users_list, FuzzySearchEngine.USER_FIELDS, 'user_id')
+        ranked = FuzzySearchEngine.batch_score(query, choices, threshold, top_k)
+        return [users_list[i] for score, i in ranked]
+
+class SpellingIndex:
+    """Symmetric-delete spelling dictionary over catalog title and author vocabulary
+    
+    Every word is stored under each string reachable by deleting up to MAX_DISTANCE
+    characters from its prefix, so a lookup only generates the deletes of the input
+    word and probes spelling_deletes by primary key instead of scanning the vocabulary.
+    """
+    
+    MAX_DISTANCE = 2
+    PREFIX_LENGTH = 7
+    WATERMARK_NAME = 'spelling_index'
+    
+    _lock = threading.Lock()
+    
+    @staticmethod
+    def tokenize(text):
+        """Lowercase word tokens, ignoring numbers"""
+        return re.findall(r"[a-z][a-z']*", str(text or '').lower())
+    
+    @classmethod
+    def deletes(cls, word):
+        """All delete variants of the word prefix within MAX_DISTANCE"""
+        key = word[:cls.PREFIX_LENGTH]
+        variants = {key}
+        frontier = {key}
+        for _ in range(cls.MAX_DISTANCE):
+            frontier = {w[:i] + w[i + 1:] for w in frontier if len(w) > 1 for i in range(len(w))}
+            variants |= frontier
+        return variants
+    
+    @staticmethod
+    def distance(source, target, max_distance):
+        """Optimal string alignment distance, or max_distance + 1 once exceeded"""
+        if abs(len(source) - len(target)) > max_distance:
+            return max_distance + 1
+        previous_row = None
+        row = list(range(len(target) + 1))
+        for i in range(1, len(source) + 1):
+            before, previous_row, row = previous_row, row, [i] + [0] * len(target)
+            for j in range(1, len(target) + 1):
+                cost = 0 if source[i - 1] == target[j - 1] else 1
+                row[j] = min(previous_row[j] + 1, row[j - 1] + 1, previous_row[j - 1] + cost)
+                if (i > 1 and j > 1 and source[i - 1] == target[j - 2]
+                        and source[i - 2] == target[j - 1]):
+                    row[j] = min(row[j], before[j - 2] + 1)
+            if min(row) > max_distance:
+                return max_distance + 1
+        return row[-1]
+    
+    @classmethod
+    def _source_tokens(cls, book):
+        return cls.tokenize(f"{book.get('title') or ''} {book.get('author') or ''}")
+    
+    @classmethod
+    def _word_statements(cls, added_words, removed_words):
+        statements = []
+        if removed_words:
+            statements.append((
+                "DELETE FROM spelling_deletes WHERE delete_key = ? AND word = ?",
+                [(key, word) for word in removed_words for key in cls.deletes(word)]
+            ))
+            statements.append(("DELETE FROM spelling_words WHERE word = ?", [(word,) for word in removed_words]))
+        if added_words:
+            statements.append((
+                "INSERT OR IGNORE INTO spelling_deletes (delete_key, word) VALUES (?, ?)",
+                [(key, word) for word in added_words for key in cls.deletes(word)]
+            ))
+        return statements
+    
+    @classmethod
+    def refresh(cls):
+        """Bring the persisted dictionary up to date with the catalog change feed"""
+        with cls._lock:
+            state = Database.execute_query(
+                "SELECT change_id FROM index_watermarks WHERE index_name = ?",
+                (cls.WATERMARK_NAME,), fetch_one=True
+            )
+            latest = Database.execute_query(
+                "SELECT COALESCE(MAX(change_id), 0) as change_id FROM catalog_changes",
+                fetch_one=True
+            )
+            if latest is None:
+                return False
+            latest_id = int(latest['change_id'])
+            watermark_statement = (
+                """INSERT INTO index_watermarks (index_name, change_id, updated_at)
+                   VALUES (?, ?, CURRENT_TIMESTAMP)
+                   ON CONFLICT(index_name) DO UPDATE SET change_id = excluded.change_id, updated_at = CURRENT_TIMESTAMP""",
+                (cls.WATERMARK_NAME, latest_id)
+            )
+            
+            if state is None:
+                return cls._rebuild(watermark_statement)
+            if latest_id <= state['change_id']:
+                return True
+            
+            changed = Database.execute_query(
+                "SELECT DISTINCT book_id FROM catalog_changes WHERE change_id > ? AND change_id <= ? AND change_type <> 'popularity'",
+                (state['change_id'], latest_id)
+            ) or []
+            changed_ids = json.dumps([row['book_id'] for row in changed])
+            books = Database.execute_query(
+                "SELECT book_id, title, author FROM books WHERE book_id IN (SELECT value FROM json_each(?))",
+                (changed_ids,)
+            )
+            sources = Database.execute_query(
+                "SELECT book_id, tokens FROM spelling_sources WHERE book_id IN (SELECT value FROM json_each(?))",
+                (changed_ids,)
+            )
+            if books is None or sources is None:
+                return False
+            
+            delta = Counter()
+            for source in sources:
+                delta.subtract(source['tokens'].split())
+            new_tokens = {book['book_id']: cls._source_tokens(book) for book in books}
+            for tokens in new_tokens.values():
+                delta.update(tokens)
+            delta = {word: change for word, change in delta.items() if change}
+            
+            current = Database.execute_query(
+                "SELECT word, frequency FROM spelling_words WHERE word IN (SELECT value FROM json_each(?))",
+                (json.dumps(list(delta)),)
+            ) or []
+            frequencies = {row['word']: row['frequency'] for row in current}
+            updated = {word: frequencies.get(word, 0) + change for word, change in delta.items()}
+            added_words = [word for word, freq in updated.items() if freq > 0 and word not in frequencies]
+            removed_words = [word for word, freq in updated.items() if freq <= 0 and word in frequencies]
             
-            if score >= threshold:
-                results.append((score, user))
+            statements = [
+                ("DELETE FROM spelling_sources WHERE book_id IN (SELECT value FROM json_each(?))", (changed_ids,)),
+                ("INSERT INTO spelling_sources (book_id, tokens) VALUES (?, ?)",
+                 [(book_id, ' '.join(tokens)) for book_id, tokens in new_tokens.items()]),
+                ("""INSERT INTO spelling_words (word, frequency) VALUES (?, ?)
+                    ON CONFLICT(word) DO UPDATE SET frequency = excluded.frequency""",
+                 [(word, freq) for word, freq in updated.items() if freq > 0]),
+            ]
+            statements.extend(cls._word_statements(added_words, removed_words))
+            statements.append(watermark_statement)
+            return Database.execute_batch(statements)
+    
+    @classmethod
+    def _rebuild(cls, watermark_statement):
+        books = Database.execute_query("SELECT book_id, title, author FROM books")
+        if books is None:
+            return False
+        frequencies = Counter()
+        sources = []
+        for book in books:
+            tokens = cls._source_tokens(book)
+            frequencies.update(tokens)
+            sources.append((book['book_id'], ' '.join(tokens)))
+        
+        statements = [
+            ("DELETE FROM spelling_sources", None),
+            ("DELETE FROM spelling_words", None),
+            ("DELETE FROM spelling_deletes", None),
+            ("INSERT INTO spelling_sources (book_id, tokens) VALUES (?, ?)", sources),
+            ("INSERT INTO spelling_words (word, frequency) VALUES (?, ?)", list(frequencies.items())),
+        ]
+        statements.extend(cls._word_statements(list(frequencies), []))
+        statements.append(watermark_statement)
+        return Database.execute_batch(statements)
+    
+    @classmethod
+    def suggest(cls, words):
+        """Map each unknown word to its closest dictionary word (or None); known words are omitted"""
+        words = list(dict.fromkeys(word for word in words if word))
+        if not words or not cls.refresh():
+            return {}
+        
+        known = Database.execute_query(
+            "SELECT word FROM spelling_words WHERE word IN (SELECT value FROM json_each(?))",
+            (json.dumps(words),)
+        ) or []
+        known_words = {row['word'] for row in known}
+        unknown = [word for word in words if word not in known_words]
+        if not unknown:
+            return {}
+        
+        probe_keys = {word: cls.deletes(word) for word in unknown}
+        rows = Database.execute_query(
+            """SELECT d.delete_key, d.word, w.frequency
+               FROM spelling_deletes d
+               JOIN spelling_words w ON w.word = d.word
+               WHERE d.delete_key IN (SELECT value FROM json_each(?))""",
+            (json.dumps(sorted(set().union(*probe_keys.values()))),)
+        ) or []
+        candidates_by_key = {}
+        for row in rows:
+            candidates_by_key.setdefault(row['delete_key'], {})[row['word']] = row['frequency']
+        
+        suggestions = {}
+        for word in unknown:
+            candidates = {}
+            for key in probe_keys[word]:
+                candidates.update(candidates_by_key.get(key, {}))
+            best = None
+            for candidate, frequency in candidates.items():
+                dist = cls.distance(word, candidate, cls.MAX_DISTANCE)
+                if dist <= cls.MAX_DISTANCE and (best is None or (dist, -frequency) < best[0]):
+                    best = ((dist, -frequency), candidate)
+            suggestions[word] = best[1] if best else None
+        return suggestions
+
+def _score_duplicate_pairs(pairs):
+    """Score (index1, index2, title1, title2, author1, author2) tuples; runs in worker processes"""
+    if not pairs:
+        return []
+    if RAPIDFUZZ_AVAILABLE:
+        left_i, right_j, titles1, titles2, authors1, authors2 = zip(*pairs)
+        scores = (rf_process.cpdist(titles1, titles2, scorer=rf_fuzz.ratio) +
+                  rf_process.cpdist(authors1, authors2, scorer=rf_fuzz.ratio)) / 2
+        return list(zip(left_i, right_j, scores.tolist()))
+    return [
+        (i, j, (fuzz.ratio(title1, title2) + fuzz.ratio(author1, author2)) / 2)
+        for i, j, title1, title2, author1, author2 in pairs
+    ]
+
+class DuplicateDetector:
+    """Candidate-pair duplicate detection for the Book Similarity Matcher
+    
+    Candidates come from MinHash/LSH over character trigrams of title+author and from
+    author-surname and exact-title blocks compared within a sorted window, so only likely
+    pairs are scored instead of every pair in the catalog.
+    """
+    
+    NUM_PERM = 64
+    BAND_ROWS = 4
+    WINDOW = 20
+    CHUNK_SIZE = 2000
+    PARALLEL_MIN_PAIRS = 10000
+    MAX_WORKERS = 4
+    PRIME = (1 << 31) - 1
+    
+    @staticmethod
+    def normalize(text):
+        """Lowercase alphanumeric words separated by single spaces"""
+        return ' '.join(re.findall(r'[a-z0-9]+', str(text or '').lower()))
+    
+    @classmethod
+    def signatures(cls, texts):
+        """MinHash signatures (n x NUM_PERM) over byte trigrams, computed in one vectorized pass"""
+        rng = np.random.default_rng(7)
+        a = rng.integers(1, cls.PRIME, cls.NUM_PERM, dtype=np.uint64)
+        b = rng.integers(0, cls.PRIME, cls.NUM_PERM, dtype=np.uint64)
+        
+        encoded = [(' ' + text + ' ').encode('utf-8') for text in texts]
+        lengths = np.array([len(chunk) for chunk in encoded], dtype=np.int64)
+        data = np.frombuffer(b''.join(encoded), dtype=np.uint8).astype(np.uint64)
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        
+        # Trigram codes for every position, keeping only those inside one text
+        codes = (data[:-2] << np.uint64(16)) | (data[1:-1] << np.uint64(8)) | data[2:]
+        owner = np.repeat(np.arange(len(texts)), lengths)[:-2]
+        keep = np.arange(len(codes)) + 2 < np.repeat(starts + lengths, lengths)[:-2]
+        codes, owner = codes[keep], owner[keep]
+        
+        signatures = np.full((len(texts), cls.NUM_PERM), np.iinfo(np.uint32).max, dtype=np.uint32)
+        step = 50000
+        for offset in range(0, len(codes), step):
+            hashed = ((codes[offset:offset + step, None] * a + b) % np.uint64(cls.PRIME)).astype(np.uint32)
+            rows, group_starts = np.unique(owner[offset:offset + step], return_index=True)
+            signatures[rows] = np.minimum(signatures[rows], np.minimum.reduceat(hashed, group_starts, axis=0))
+        return signatures
+    
+    @classmethod
+    def _window_pairs(cls, group_codes, order):
+        """Pair codes (i * n + j) for items within WINDOW positions of each other in the same group"""
+        n = len(group_codes)
+        grouped = group_codes[order]
+        found = []
+        for offset in range(1, cls.WINDOW + 1):
+            same = grouped[:-offset] == grouped[offset:]
+            first, second = order[:-offset][same], order[offset:][same]
+            found.append(np.minimum(first, second) * n + np.maximum(first, second))
+        return np.concatenate(found) if found else np.empty(0, dtype=np.int64)
+    
+    @classmethod
+    def candidate_pairs(cls, titles, authors):
+        """Sorted (i, j) index pairs sharing an LSH band bucket, author surname or exact title"""
+        n = len(titles)
+        if n < 2:
+            return []
+        texts = [f"{title} {author}" for title, author in zip(titles, authors)]
+        signatures = cls.signatures(texts)
+        found = []
+        
+        for band_start in range(0, cls.NUM_PERM, cls.BAND_ROWS):
+            band = np.ascontiguousarray(signatures[:, band_start:band_start + cls.BAND_ROWS])
+            keys = band.view(np.dtype((np.void, band.dtype.itemsize * cls.BAND_ROWS))).ravel()
+            codes = np.unique(keys, return_inverse=True)[1].ravel()
+            found.append(cls._window_pairs(codes, np.argsort(codes, kind='stable')))
         
-        results.sort(reverse=True, key=lambda x: x[0])
-        return [user for score, user in results]
+        title_codes = np.unique(np.array(titles, dtype=object), return_inverse=True)[1].ravel()
+        author_codes = np.unique(np.array(authors, dtype=object), return_inverse=True)[1].ravel()
+        surnames = np.array([author.split()[-1] if author else '' for author in authors], dtype=object)
+        surname_codes = np.unique(surnames, return_inverse=True)[1].ravel()
+        found.append(cls._window_pairs(surname_codes, np.lexsort((title_codes, surname_codes))))
+        found.append(cls._window_pairs(title_codes, np.lexsort((author_codes, title_codes))))
+        
+        pair_codes = np.unique(np.concatenate(found))
+        return list(zip((pair_codes // n).tolist(), (pair_codes % n).tolist()))
+    
+    @classmethod
+    def iter_matches(cls, books, threshold):
+        """Yield (scored, total, matches) as candidate chunks finish scoring"""
+        titles = [cls.normalize(book['title']) for book in books]
+        authors = [cls.normalize(book['author']) for book in books]
+        pairs = cls.candidate_pairs(titles, authors)
+        total = len(pairs)
+        
+        raw_titles = [str(book['title'] or '').lower() for book in books]
+        raw_authors = [str(book['author'] or '').lower() for book in books]
+        chunks = [
+            [(i, j, raw_titles[i], raw_titles[j], raw_authors[i], raw_authors[j])
+             for i, j in pairs[offset:offset + cls.CHUNK_SIZE]]
+            for offset in range(0, total, cls.CHUNK_SIZE)
+        ]
+        
+        def matches_from(scored):
+            return [(i, j, score) for i, j, score in scored if score >= threshold]
+        
+        if not chunks:
+            yield 0, 0, []
+            return
+        
+        done = 0
+        if total >= cls.PARALLEL_MIN_PAIRS:
+            try:
+                with ProcessPoolExecutor(max_workers=min(cls.MAX_WORKERS, os.cpu_count() or 1)) as executor:
+                    for scored in executor.map(_score_duplicate_pairs, chunks):
+                        done += len(scored)
+                        yield done, total, matches_from(scored)
+                return
+            except Exception:
+                if done:
+                    raise
+        
+        for chunk in chunks:
+            scored = _score_duplicate_pairs(chunk)
+            done += len(scored)
+            yield done, total, matches_from(scored)
+    
+    @staticmethod
+    def pick_matches(books, matches):
+        """Best-first pairing so each book appears in at most one reported match"""
+        checked = set()
+        duplicates = []
+        for i, j, score in sorted(matches, key=lambda match: -match[2]):
+            if i in checked or j in checked:
+                continue
+            checked.update((i, j))
+            duplicates.append({'book1': books[i], 'book2': books[j], 'similarity': score})
+        return duplicates
 
 class RecommendationEngine:
     """Book recommendation system"""
@@ -836,644 +1408,3145 @@ class RecommendationEngine:
         return [book for score, book in similarities[:max_results]]
     
     @staticmethod
-    def get_popular_books(transactions, all_books, top_n=10):
+    def get_popular_books(top_n=10, window=None):
         """Get most popular books"""
-        book_counts = Counter([t['book_id'] for t in transactions])
-        popular_ids = [book_id for book_id, count in book_counts.most_common(top_n)]
-        return [b for b in all_books if b['book_id'] in popular_ids]
+        return PopularityTracker.top_books(top_n, window)
 
-class PseudonymGenerator:
-    """Generate random pseudonyms for anonymous mode"""
+class RecommendationStore:
+    """Persisted neighbour lists in book_recommendations with per-book staleness state"""
     
-    ADJECTIVES = ['Swift', 'Silent', 'Brave', 'Wise', 'Noble', 'Mystic', 'Shadow', 'Golden', 
-                  'Silver', 'Crystal', 'Emerald', 'Crimson', 'Azure', 'Starlight', 'Moonlit']
+    STALE_AFTER_HOURS = 24
     
-    NOUNS = ['Reader', 'Scholar', 'Sage', 'Wanderer', 'Seeker', 'Guardian', 'Keeper', 'Voyager',
-             'Explorer', 'Dreamer', 'Thinker', 'Watcher', 'Phoenix', 'Dragon', 'Raven']
+    @staticmethod
+    def replace_lists(recommendation_type, lists, source_version):
+        """Bulk upsert neighbour lists {book_id: [(other_id, score)]}, prune dropped rows and mark them fresh"""
+        if not lists:
+            return True
+        stamp = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S.%f')
+        book_ids = json.dumps(list(lists))
+        rows = [
+            (book_id, recommendation_type, other_id, score, stamp, book_id, other_id)
+            for book_id, neighbours in lists.items()
+            for other_id, score in neighbours
+        ]
+        # Both ends are foreign keys to books; rows for deleted books are dropped, not fatal
+        return Database.execute_batch([
+            ("""INSERT INTO book_recommendations
+                (book_id, recommendation_type, recommended_book_id, similarity_score, updated_at)
+                SELECT ?, ?, ?, ?, ?
+                WHERE EXISTS (SELECT 1 FROM books WHERE book_id = ?) AND EXISTS (SELECT 1 FROM books WHERE book_id = ?)
+                ON CONFLICT(book_id, recommendation_type, recommended_book_id)
+                DO UPDATE SET similarity_score = excluded.similarity_score, updated_at = excluded.updated_at""",
+             rows),
+            ("""DELETE FROM book_recommendations
+                WHERE recommendation_type = ? AND book_id IN (SELECT value FROM json_each(?))
+                  AND (updated_at IS NULL OR updated_at <> ?)""",
+             (recommendation_type, book_ids, stamp)),
+            ("""INSERT INTO book_recommendation_state (book_id, recommendation_type, source_version, is_stale, computed_at)
+                SELECT value, ?, ?, 0, datetime('now') FROM json_each(?) WHERE true
+                ON CONFLICT(book_id, recommendation_type)
+                DO UPDATE SET source_version = excluded.source_version, is_stale = 0, computed_at = excluded.computed_at""",
+             (recommendation_type, source_version, book_ids)),
+        ])
     
     @staticmethod
-    def generate():
-        """Generate random pseudonym"""
-        import random
-        adj = random.choice(PseudonymGenerator.ADJECTIVES)
-        noun = random.choice(PseudonymGenerator.NOUNS)
-        number = random.randint(100, 999)
-        return f"{adj}{noun}{number}"
-
-class BackupManager:
-    """Backup and restore utilities"""
+    def mark_stale(recommendation_type, book_ids):
+        """Flag books whose neighbour lists need recomputing"""
+        book_ids = list(book_ids)
+        if not book_ids:
+            return True
+        return Database.execute_update(
+            """INSERT INTO book_recommendation_state (book_id, recommendation_type, is_stale)
+               SELECT value, ?, 1 FROM json_each(?) WHERE true
+               ON CONFLICT(book_id, recommendation_type) DO UPDATE SET is_stale = 1""",
+            (recommendation_type, json.dumps(book_ids))
+        )
     
     @staticmethod
-    def create_backup(backup_name=None):
-        """Create database backup as ZIP"""
-        if not backup_name:
-            backup_name = f"litgrid_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
-        
-        backup_dir = "backups"
-        if not os.path.exists(backup_dir):
-            os.makedirs(backup_dir)
-        
-        backup_path = os.path.join(backup_dir, backup_name)
-        
-        try:
-            with zipfile.ZipFile(backup_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                # Export tables to CSV and add to ZIP
-                tables = ['users', 'books', 'transactions', 'fines', 'roles', 'member_tiers',
-                         'book_covers', 'user_photos', 'pdf_library', 'privacy_settings',
-                         'user_profiles', 'book_reviews', 'author_profiles']
-                
-                for table in tables:
-                    try:
-                        query = f"SELECT * FROM {table}"
-                        data = Database.execute_query(query)
-                        if data:
-                            # Convert to CSV
-                            csv_buffer = io.StringIO()
-                            if data:
-                                keys = data[0].keys()
-                                dict_writer = csv.DictWriter(csv_buffer, keys)
-                                dict_writer.writeheader()
-                                dict_writer.writerows(data)
-                            
-                            # Add to ZIP
-                            zipf.writestr(f"{table}.csv", csv_buffer.getvalue())
-                    except:
-                        pass
-            
-            return backup_path, os.path.getsize(backup_path)
-        except Exception as e:
-            return None, 0
+    def stale_books(recommendation_type, universe_sql, limit):
+        """Next books to refresh: flagged stale first, then never computed, then oldest past the age limit"""
+        rows = Database.execute_query(
+            f"""
+            SELECT u.book_id
+            FROM ({universe_sql}) u
+            LEFT JOIN book_recommendation_state s
+              ON s.book_id = u.book_id AND s.recommendation_type = ?
+            WHERE s.book_id IS NULL OR s.is_stale = 1 OR s.computed_at < datetime('now', ?)
+            ORDER BY CASE WHEN s.is_stale = 1 THEN 0 WHEN s.book_id IS NULL THEN 1 ELSE 2 END, s.computed_at
+            LIMIT ?
+            """,
+            (recommendation_type, f"-{RecommendationStore.STALE_AFTER_HOURS} hours", limit)
+        )
+        return [row['book_id'] for row in rows or []]
     
     @staticmethod
-    def restore_backup(zip_path):
-        """Restore from backup ZIP"""
-        try:
-            with zipfile.ZipFile(zip_path, 'r') as zipf:
-                # Extract and restore each table
-                for filename in zipf.namelist():
-                    if filename.endswith('.csv'):
-                        table_name = filename.replace('.csv', '')
-                        csv_data = zipf.read(filename).decode('utf-8')
-                        # Process CSV and insert into database
-                        # Implementation depends on specific requirements
-                        pass
-            return True
-        except:
-            return False
+    def lookup(recommendation_type, book_id, limit=5):
+        """Stored neighbours joined with book details; books never computed are queued for the refresher"""
+        rows = Database.execute_query(
+            """
+            SELECT r.recommended_book_id as book_id, r.similarity_score, r.recommendation_type,
+                   b.title, b.author, b.genre, b.isbn
+            FROM book_recommendations r
+            JOIN books b ON r.recommended_book_id = b.book_id
+            WHERE r.book_id = ? AND r.recommendation_type = ?
+            ORDER BY r.similarity_score DESC
+            LIMIT ?
+            """,
+            (book_id, recommendation_type, limit)
+        ) or []
+        if not rows:
+            Database.execute_update(
+                """INSERT OR IGNORE INTO book_recommendation_state (book_id, recommendation_type, is_stale)
+                   SELECT ?, ?, 1 WHERE EXISTS (SELECT 1 FROM books WHERE book_id = ?)""",
+                (book_id, recommendation_type, book_id)
+            )
+        return rows
 
-class ExcelExporter:
-    """Export data to Excel"""
+class ContentSimilarityIndex:
+    """TF-IDF similarity over keywords, genre and author with top-k neighbours stored in book_recommendations
+    
+    Term vectors live in memory and follow the catalog_changes feed. Neighbour lists are
+    persisted per book; sync() flags changed books and the books that list them as stale
+    for RecommendationRefresher to recompute.
+    """
+    
+    TOP_K = 10
+    MAX_POSTINGS = 2000
+    RECOMMENDATION_TYPE = 'content'
+    WATERMARK_NAME = 'content_recommendations'
     
     @staticmethod
-    def export_books(books):
-        """Export books to Excel"""
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Books Catalog"
-        
-        # Headers
-        headers = ['Book ID', 'Title', 'Author', 'Genre', 'ISBN', 'Year', 'Pages', 
-                  'Available', 'Total Copies', 'Status']
-        ws.append(headers)
-        
-        # Style headers
-        header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        header_font = Font(bold=True, color="FFFFFF")
-        
-        for cell in ws[1]:
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = Alignment(horizontal="center")
-        
-        # Data
-        for book in books:
-            ws.append([
-                book.get('book_id'),
-                book.get('title'),
-                book.get('author'),
-                book.get('genre'),
-                book.get('isbn'),
-                book.get('publication_year'),
-                book.get('page_count'),
-                book.get('available_copies'),
-                book.get('total_copies'),
-                book.get('status')
-            ])
-        
-        # Auto-adjust column widths
-        for column in ws.columns:
-            max_length = 0
-            column = [cell for cell in column]
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(cell.value)
-                except:
-                    pass
-            adjusted_width = (max_length + 2)
-            ws.column_dimensions[column[0].column_letter].width = adjusted_width
-        
-        # Save to BytesIO
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
-        return output
+    @st.cache_resource(show_spinner=False)
+    def _state():
+        """Term vectors and watermark shared by every session and kept across reruns"""
+        return SimpleNamespace(lock=threading.Lock(), doc_terms={}, postings={}, watermark=None)
     
-    @staticmethod
-    def export_users(users):
-        """Export users to Excel"""
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Users"
-        
-        headers = ['User ID', 'Full Name', 'Username', 'Email', 'Role', 'Member Tier', 
-                  'Books Borrowed', 'Fine Balance', 'Status', 'Joined Date']
-        ws.append(headers)
-        
-        # Style headers
-        header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        header_font = Font(bold=True, color="FFFFFF")
-        
-        for cell in ws[1]:
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = Alignment(horizontal="center")
-        
-        for user in users:
-            ws.append([
-                user.get('user_id'),
-                user.get('full_name'),
-                user.get('username'),
-                user.get('email'),
-                user.get('role'),
-                user.get('member_tier'),
-                user.get('books_borrowed', 0),
-                user.get('fine_balance', 0),
-                user.get('status'),
-                user.get('created_at')
-            ])
-        
-        for column in ws.columns:
-            max_length = 0
-            column = [cell for cell in column]
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(cell.value)
-                except:
-                    pass
-            adjusted_width = (max_length + 2)
-            ws.column_dimensions[column[0].column_letter].width = adjusted_width
-        
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
-        return output
-
-class DataValidator:
-    """Data validation and integrity checker"""
+    @classmethod
+    def watermark(cls):
+        """Last catalog_changes id applied, None until the index is built"""
+        return cls._state().watermark
     
     @staticmethod
-    def validate_email(email):
-        """Validate email format"""
-        import re
-        pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        return re.match(pattern, email) is not None
+    def terms_for(book):
+        """Distinct keyword, genre and author terms of a book"""
+        terms = {f"kw:{keyword.strip()}" for keyword in str(book.get('keywords') or '').lower().split(',') if keyword.strip()}
+        if book.get('genre'):
+            terms.add(f"genre:{str(book['genre']).strip().lower()}")
+        if book.get('author'):
+            terms.add(f"author:{str(book['author']).strip().lower()}")
+        return terms
     
     @staticmethod
-    def validate_isbn(isbn):
-        """Validate ISBN-10 or ISBN-13"""
-        isbn = isbn.replace('-', '').replace(' ', '')
+    def _set_doc(state, book_id, terms):
+        for term in state.doc_terms.pop(book_id, ()):
+            postings = state.postings.get(term)
+            if postings is not None:
+                postings.discard(book_id)
+                if not postings:
+                    del state.postings[term]
+        if terms:
+            state.doc_terms[book_id] = terms
+            for term in terms:
+                state.postings.setdefault(term, set()).add(book_id)
+    
+    @classmethod
+    def refresh(cls):
+        """Bring in-memory term vectors up to date with the catalog_changes feed"""
+        state = cls._state()
+        with state.lock:
+            latest = Database.execute_query(
+                "SELECT COALESCE(MAX(change_id), 0) as change_id FROM catalog_changes",
+                fetch_one=True
+            )
+            if latest is None:
+                return False
+            latest_id = int(latest['change_id'])
+            if state.watermark is not None and latest_id <= state.watermark:
+                return True
+            
+            if state.watermark is None:
+                books = Database.execute_query("SELECT book_id, keywords, genre, author FROM books")
+                changed_ids = []
+                state.doc_terms, state.postings = {}, {}
+            else:
+                changed = Database.execute_query(
+                    "SELECT DISTINCT book_id FROM catalog_changes WHERE change_id > ? AND change_id <= ? AND change_type <> 'popularity'",
+                    (state.watermark, latest_id)
+                ) or []
+                changed_ids = [row['book_id'] for row in changed]
+                books = Database.execute_query(
+                    "SELECT book_id, keywords, genre, author FROM books WHERE book_id IN (SELECT value FROM json_each(?))",
+                    (json.dumps(changed_ids),)
+                )
+            if books is None:
+                return False
+            for book_id in changed_ids:
+                cls._set_doc(state, book_id, set())
+            for book in books:
+                cls._set_doc(state, book['book_id'], cls.terms_for(book))
+            state.watermark = latest_id
+            return True
+    
+    @classmethod
+    def neighbors(cls, book_id, top_k=None):
+        """Top-k (book_id, cosine score 0-100) by TF-IDF over shared terms"""
+        state = cls._state()
+        with state.lock:
+            terms = state.doc_terms.get(book_id)
+            if not terms:
+                return []
+            total_docs = len(state.doc_terms)
+            idf = {}
+            
+            def weight(term):
+                if term not in idf:
+                    idf[term] = math.log((1 + total_docs) / (1 + len(state.postings.get(term, ())))) + 1
+                return idf[term]
+            
+            def norm(terms_of):
+                return math.sqrt(sum(weight(term) ** 2 for term in terms_of))
+            
+            # Rare terms generate candidates exhaustively; very common ones contribute a bounded sample
+            candidates = set()
+            for term in sorted(terms, key=lambda term: len(state.postings.get(term, ()))):
+                postings = state.postings.get(term, ())
+                if len(postings) <= cls.MAX_POSTINGS:
+                    candidates |= postings
+                elif len(candidates) < cls.MAX_POSTINGS:
+                    candidates.update(heapq.nsmallest(cls.MAX_POSTINGS, postings))
+            candidates.discard(book_id)
+            
+            target_norm = norm(terms)
+            scored = []
+            for other_id in candidates:
+                other_terms = state.doc_terms[other_id]
+                dot = sum(weight(term) ** 2 for term in terms & other_terms)
+                scored.append((dot / (target_norm * norm(other_terms)) * 100, other_id))
+        return [(other_id, round(score, 2)) for score, other_id in heapq.nlargest(top_k or cls.TOP_K, scored)]
+    
+    @classmethod
+    def store(cls, book_ids):
+        """Recompute and persist neighbour lists for the given books"""
+        if not cls.refresh():
+            return False
+        lists = {book_id: cls.neighbors(book_id) for book_id in book_ids}
+        return RecommendationStore.replace_lists(cls.RECOMMENDATION_TYPE, lists, cls.watermark())
+    
+    @classmethod
+    def _save_watermark(cls, change_id):
+        return Database.execute_update(
+            """INSERT INTO index_watermarks (index_name, change_id, updated_at)
+               VALUES (?, ?, CURRENT_TIMESTAMP)
+               ON CONFLICT(index_name) DO UPDATE SET change_id = excluded.change_id, updated_at = CURRENT_TIMESTAMP""",
+            (cls.WATERMARK_NAME, change_id)
+        )
+    
+    @classmethod
+    def sync(cls):
+        """Flag stored neighbour lists affected by catalog changes since the persisted watermark"""
+        if not cls.refresh():
+            return False
+        state = Database.execute_query(
+            "SELECT change_id FROM index_watermarks WHERE index_name = ?",
+            (cls.WATERMARK_NAME,), fetch_one=True
+        )
+        latest_id = cls.watermark()
+        if state is None:
+            # Lists are filled by the refresher or rebuild()
+            return cls._save_watermark(latest_id)
+        if latest_id <= state['change_id']:
+            return True
         
-        if len(isbn) == 10:
-            return DataValidator._validate_isbn10(isbn)
-        elif len(isbn) == 13:
-            return DataValidator._validate_isbn13(isbn)
+        changed = Database.execute_query(
+            """SELECT DISTINCT book_id FROM catalog_changes
+               WHERE change_id > ? AND change_id <= ? AND change_type NOT IN ('inventory', 'popularity')""",
+            (state['change_id'], latest_id)
+        ) or []
+        changed_ids = json.dumps([row['book_id'] for row in changed])
+        affected = Database.execute_query(
+            """SELECT value as book_id FROM json_each(?)
+               UNION
+               SELECT book_id FROM book_recommendations
+               WHERE recommendation_type = ? AND recommended_book_id IN (SELECT value FROM json_each(?))""",
+            (changed_ids, cls.RECOMMENDATION_TYPE, changed_ids)
+        )
+        if affected is None:
+            return False
+        if RecommendationStore.mark_stale(cls.RECOMMENDATION_TYPE, [row['book_id'] for row in affected]):
+            return cls._save_watermark(latest_id)
         return False
     
-    @staticmethod
-    def _validate_isbn10(isbn):
-        """Validate ISBN-10"""
-        if not isbn[:-1].isdigit():
+    @classmethod
+    def rebuild(cls, batch_size=500):
+        """Offline full build of every book's neighbour list"""
+        if not cls.refresh():
             return False
+        state = cls._state()
+        latest_id = state.watermark
+        with state.lock:
+            book_ids = sorted(state.doc_terms)
+        for offset in range(0, len(book_ids), batch_size):
+            if not cls.store(book_ids[offset:offset + batch_size]):
+                return False
+        return cls._save_watermark(latest_id)
+    
+    @classmethod
+    def lookup(cls, book_id, limit=5):
+        """Stored content neighbours for a book"""
+        return RecommendationStore.lookup(cls.RECOMMENDATION_TYPE, book_id, limit)
+
+class CoBorrowRecommender:
+    """Item-to-item collaborative filtering from borrowing co-occurrence
+    
+    New borrowing rows are folded in by borrowing_id watermark: each first-time
+    (member, book) pair bumps co-borrow counts against the member's earlier books.
+    Scores are cosine-normalized by distinct borrowers so popular titles do not dominate.
+    """
+    
+    TOP_K = 10
+    BATCH_ROWS = 5000
+    RECOMMENDATION_TYPE = 'co_borrow'
+    WATERMARK_NAME = 'coborrow_recommendations'
+    BORROWED_BOOK_SQL = """
+        SELECT br.borrowing_id, br.user_id, COALESCE(br.book_id, bi.book_id) as book_id
+        FROM borrowing br
+        LEFT JOIN book_inventory bi ON br.inventory_id = bi.inventory_id
+    """
+    
+    _lock = threading.Lock()
+    
+    @classmethod
+    def _process_batch(cls, watermark):
+        """Fold the next batch of borrowings into pair counts; returns the new watermark or None"""
+        rows = Database.execute_query(
+            cls.BORROWED_BOOK_SQL + " WHERE br.borrowing_id > ? ORDER BY br.borrowing_id LIMIT ?",
+            (watermark, cls.BATCH_ROWS)
+        )
+        if rows is None:
+            return None
+        if not rows:
+            return watermark
         
-        total = sum((10 - i) * int(isbn[i]) for i in range(9))
-        check_digit = (11 - (total % 11)) % 11
+        user_ids = json.dumps(sorted({row['user_id'] for row in rows}))
+        history = Database.execute_query(
+            cls.BORROWED_BOOK_SQL + " WHERE br.user_id IN (SELECT value FROM json_each(?)) AND br.borrowing_id <= ?",
+            (user_ids, watermark)
+        )
+        if history is None:
+            return None
+        seen = {}
+        for row in history:
+            if row['book_id'] is not None:
+                seen.setdefault(row['user_id'], set()).add(row['book_id'])
         
-        return str(check_digit) == isbn[9] or (check_digit == 10 and isbn[9].upper() == 'X')
+        pair_delta = Counter()
+        count_delta = Counter()
+        for row in rows:
+            book_id = row['book_id']
+            user_books = seen.setdefault(row['user_id'], set())
+            if book_id is None or book_id in user_books:
+                continue
+            for other_id in user_books:
+                pair_delta[(book_id, other_id)] += 1
+                pair_delta[(other_id, book_id)] += 1
+            count_delta[book_id] += 1
+            user_books.add(book_id)
+        
+        # The fold-in, its watermark and the stale flags commit together, so a list that
+        # later fails to store stays flagged for the refresher instead of being skipped
+        new_watermark = rows[-1]['borrowing_id']
+        touched = sorted({book_id for book_id, _ in pair_delta} | set(count_delta))
+        stale_rows = [(book_id, cls.RECOMMENDATION_TYPE) for book_id in touched]
+        ok = Database.execute_batch([
+            ("""INSERT INTO book_coborrow_pairs (book_id, other_book_id, co_count) VALUES (?, ?, ?)
+                ON CONFLICT(book_id, other_book_id) DO UPDATE SET co_count = co_count + excluded.co_count""",
+             [(a, b, delta) for (a, b), delta in pair_delta.items()]),
+            ("""INSERT INTO book_borrower_counts (book_id, borrower_count) VALUES (?, ?)
+                ON CONFLICT(book_id) DO UPDATE SET borrower_count = borrower_count + excluded.borrower_count""",
+             list(count_delta.items())),
+            ("""INSERT INTO index_watermarks (index_name, change_id, updated_at)
+                VALUES (?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(index_name) DO UPDATE SET change_id = excluded.change_id, updated_at = CURRENT_TIMESTAMP""",
+             (cls.WATERMARK_NAME, new_watermark)),
+            ("""INSERT INTO book_recommendation_state (book_id, recommendation_type, is_stale) VALUES (?, ?, 1)
+                ON CONFLICT(book_id, recommendation_type) DO UPDATE SET is_stale = 1""",
+             stale_rows),
+            # A borrower count change rescales that book's score in every list it appears in
+            ("""INSERT INTO book_recommendation_state (book_id, recommendation_type, is_stale)
+                SELECT DISTINCT other_book_id, ?, 1 FROM book_coborrow_pairs
+                WHERE book_id IN (SELECT value FROM json_each(?))
+                ON CONFLICT(book_id, recommendation_type) DO UPDATE SET is_stale = 1""",
+             (cls.RECOMMENDATION_TYPE, json.dumps(sorted(count_delta)))),
+        ])
+        return new_watermark if ok else None
+    
+    @classmethod
+    def store(cls, book_ids):
+        """Recompute bounded top-k neighbour lists for the given books from pair counts"""
+        if not book_ids:
+            return True
+        pairs = Database.execute_query(
+            """SELECT p.book_id, p.other_book_id, p.co_count,
+                      ca.borrower_count as book_borrowers, cb.borrower_count as other_borrowers
+               FROM book_coborrow_pairs p
+               JOIN book_borrower_counts ca ON ca.book_id = p.book_id
+               JOIN book_borrower_counts cb ON cb.book_id = p.other_book_id
+               JOIN books ob ON ob.book_id = p.other_book_id
+               WHERE p.book_id IN (SELECT value FROM json_each(?))""",
+            (json.dumps(list(book_ids)),)
+        )
+        if pairs is None:
+            return False
+        scored = {book_id: [] for book_id in book_ids}
+        for pair in pairs:
+            score = 100.0 * pair['co_count'] / math.sqrt(max(1, pair['book_borrowers']) * max(1, pair['other_borrowers']))
+            scored[pair['book_id']].append((round(score, 2), pair['other_book_id']))
+        lists = {
+            book_id: [(other_id, score) for score, other_id in heapq.nlargest(cls.TOP_K, candidates)]
+            for book_id, candidates in scored.items()
+        }
+        state = Database.execute_query(
+            "SELECT change_id FROM index_watermarks WHERE index_name = ?",
+            (cls.WATERMARK_NAME,), fetch_one=True
+        )
+        return RecommendationStore.replace_lists(cls.RECOMMENDATION_TYPE, lists, state['change_id'] if state else 0)
+    
+    @classmethod
+    def sync(cls):
+        """Fold in all borrowings since the persisted watermark"""
+        with cls._lock:
+            state = Database.execute_query(
+                "SELECT change_id FROM index_watermarks WHERE index_name = ?",
+                (cls.WATERMARK_NAME,), fetch_one=True
+            )
+            watermark = state['change_id'] if state else 0
+            while True:
+                new_watermark = cls._process_batch(watermark)
+                if new_watermark is None:
+                    return False
+                if new_watermark == watermark:
+                    return True
+                watermark = new_watermark
+    
+    @classmethod
+    def lookup(cls, book_id, limit=5):
+        """Books most often borrowed by members who borrowed this one"""
+        return RecommendationStore.lookup(cls.RECOMMENDATION_TYPE, book_id, limit)
+
+class RecommendationRefresher:
+    """Background job that recomputes stale neighbour lists in batches"""
+    
+    BATCH_SIZE = 200
+    MAX_BATCHES = 20
     
     @staticmethod
-    def _validate_isbn13(isbn):
-        """Validate ISBN-13"""
-        if not isbn.isdigit():
+    def engines():
+        return [
+            (ContentSimilarityIndex, "SELECT book_id FROM books"),
+            (CoBorrowRecommender, "SELECT c.book_id FROM book_borrower_counts c JOIN books b ON b.book_id = c.book_id"),
+        ]
+    
+    @classmethod
+    def run_once(cls):
+        """Fold in new changes, then refresh up to MAX_BATCHES batches per engine"""
+        refreshed = {}
+        ContentSimilarityIndex.sync()
+        CoBorrowRecommender.sync()
+        for engine, universe_sql in cls.engines():
+            count = 0
+            for _ in range(cls.MAX_BATCHES):
+                book_ids = RecommendationStore.stale_books(engine.RECOMMENDATION_TYPE, universe_sql, cls.BATCH_SIZE)
+                if not book_ids:
+                    break
+                if not engine.store(book_ids):
+                    # Store one by one so a failing book stays stale without holding back the rest
+                    count += sum(1 for book_id in book_ids if engine.store([book_id]))
+                    break
+                count += len(book_ids)
+            refreshed[engine.RECOMMENDATION_TYPE] = count
+        return refreshed
+    
+class PopularityTracker:
+    """Exponentially decayed popularity and 7/30/90-day checkout counters per book
+    
+    The borrowing insert trigger adds a checkout to book_popularity and refreshes
+    books.popularity_score in the checkout transaction; a daily roll decays scores and
+    recomputes the window counters. popularity_score is the 0-100 mapping of the decayed
+    score, so popularity sorts read its index.
+    """
+    
+    HALF_LIFE_DAYS = 30
+    HALF_SATURATION = 5.0
+    WINDOWS = (7, 30, 90)
+    WATERMARK_NAME = 'popularity_roll'
+    SCORE_SQL = f"ROUND(100.0 * p.decayed_score / (p.decayed_score + {HALF_SATURATION}), 2)"
+    CHECKOUT_DAYS_SQL = """
+        SELECT COALESCE(br.book_id, bi.book_id) as book_id, br.checkout_day as day,
+               COUNT(*) as checkouts, MAX(br.checkout_date) as last_checkout_at
+        FROM borrowing br
+        LEFT JOIN book_inventory bi ON br.inventory_id = bi.inventory_id
+        WHERE br.checkout_day >= ? AND COALESCE(br.book_id, bi.book_id) IS NOT NULL
+        GROUP BY 1, 2
+    """
+    
+    @classmethod
+    def _window_counts(cls, rows, today):
+        counts = {}
+        for row in rows:
+            age = LoanDates.day_number(today) - row['day']
+            book_counts = counts.setdefault(row['book_id'], [0] * len(cls.WINDOWS))
+            for index, window in enumerate(cls.WINDOWS):
+                if age < window:
+                    book_counts[index] += row['checkouts']
+        return counts
+    
+    @classmethod
+    def decayed_for_score(cls, score):
+        """Decayed score that maps back to a 0-100 popularity_score"""
+        score = min(float(score or 0), 99.99)
+        return cls.HALF_SATURATION * score / (100.0 - score) if score > 0 else 0.0
+    
+    @classmethod
+    def roll(cls):
+        """Decay scores to today and recompute window counters; backfills from history on first run"""
+        today = datetime.utcnow().date()
+        state = Database.execute_query(
+            "SELECT change_id FROM index_watermarks WHERE index_name = ?",
+            (cls.WATERMARK_NAME,), fetch_one=True
+        )
+        if state is not None and state['change_id'] >= today.toordinal():
             return False
         
-        total = sum((3 if i % 2 else 1) * int(isbn[i]) for i in range(12))
-        check_digit = (10 - (total % 10)) % 10
+        if state is None:
+            rows = Database.execute_query(cls.CHECKOUT_DAYS_SQL, (LoanDates.day_number(date.min),))
+            scored = Database.execute_query(
+                "SELECT book_id, popularity_score FROM books WHERE COALESCE(popularity_score, 0) > 0"
+            )
+            if rows is None or scored is None:
+                return False
+            totals = {}
+            for row in rows:
+                age = LoanDates.day_number(today) - row['day']
+                total = totals.setdefault(row['book_id'], {'decayed': 0.0, 'total': 0, 'last': None})
+                total['decayed'] += row['checkouts'] * 0.5 ** (max(0, age) / cls.HALF_LIFE_DAYS)
+                total['total'] += row['checkouts']
+                total['last'] = max(total['last'] or '', row['last_checkout_at'])
+            # Existing (imported or curated) scores carry over as the decayed score they map to
+            for row in scored:
+                total = totals.setdefault(row['book_id'], {'decayed': 0.0, 'total': 0, 'last': None})
+                total['decayed'] = max(total['decayed'], cls.decayed_for_score(row['popularity_score']))
+            windows = cls._window_counts(rows, today)
+            statements = [
+                ("DELETE FROM book_popularity", None),
+                ("""INSERT INTO book_popularity
+                    (book_id, decayed_score, checkouts_7d, checkouts_30d, checkouts_90d, total_checkouts, last_checkout_at)
+                    SELECT ?, ?, ?, ?, ?, ?, ? WHERE EXISTS (SELECT 1 FROM books WHERE book_id = ?)""",
+                 [(book_id, total['decayed'], *windows.get(book_id, [0] * len(cls.WINDOWS)), total['total'], total['last'], book_id)
+                  for book_id, total in totals.items()]),
+            ]
+        else:
+            since = today - timedelta(days=max(cls.WINDOWS))
+            rows = Database.execute_query(cls.CHECKOUT_DAYS_SQL, (LoanDates.day_number(since),))
+            if rows is None:
+                return False
+            factor = 0.5 ** ((today.toordinal() - state['change_id']) / cls.HALF_LIFE_DAYS)
+            statements = [
+                ("UPDATE book_popularity SET decayed_score = decayed_score * ?", (factor,)),
+                ("UPDATE book_popularity SET checkouts_7d = 0, checkouts_30d = 0, checkouts_90d = 0 WHERE checkouts_90d > 0", None),
+                ("UPDATE book_popularity SET checkouts_7d = ?, checkouts_30d = ?, checkouts_90d = ? WHERE book_id = ?",
+                 [(*counts, book_id) for book_id, counts in cls._window_counts(rows, today).items()]),
+            ]
         
-        return check_digit == int(isbn[12])
+        statements.append((
+            f"""UPDATE books
+                SET popularity_score = (SELECT {cls.SCORE_SQL} FROM book_popularity p WHERE p.book_id = books.book_id)
+                WHERE book_id IN (SELECT book_id FROM book_popularity)
+                  AND popularity_score IS NOT (SELECT {cls.SCORE_SQL} FROM book_popularity p WHERE p.book_id = books.book_id)""",
+            None
+        ))
+        statements.append((
+            """INSERT INTO index_watermarks (index_name, change_id, updated_at)
+               VALUES (?, ?, CURRENT_TIMESTAMP)
+               ON CONFLICT(index_name) DO UPDATE SET change_id = excluded.change_id, updated_at = CURRENT_TIMESTAMP""",
+            (cls.WATERMARK_NAME, today.toordinal())
+        ))
+        return Database.execute_batch(statements)
     
     @staticmethod
-    def detect_duplicate_books(title, author, all_books):
-        """Detect duplicate books"""
-        for book in all_books:
-            if (fuzz.ratio(book.get('title', '').lower(), title.lower()) > 90 and
-                fuzz.ratio(book.get('author', '').lower(), author.lower()) > 90):
-                return book
-        return None
+    def top_books(limit=10, window=None):
+        """Most popular books by decayed score, or by checkouts in a 7/30/90-day window"""
+        if window in PopularityTracker.WINDOWS:
+            return Database.execute_query(
+                f"""
+                SELECT b.book_id, b.title, b.author, b.genre, b.isbn, b.popularity_score,
+                       p.checkouts_{window}d as window_checkouts, p.total_checkouts
+                FROM book_popularity p
+                JOIN books b ON b.book_id = p.book_id
+                ORDER BY p.checkouts_{window}d DESC, p.book_id DESC
+                LIMIT ?
+                """,
+                (limit,)
+            ) or []
+        return Database.execute_query(
+            """
+            SELECT b.book_id, b.title, b.author, b.genre, b.isbn, b.popularity_score,
+                   COALESCE(p.total_checkouts, 0) as total_checkouts
+            FROM books b
+            LEFT JOIN book_popularity p ON p.book_id = b.book_id
+            ORDER BY COALESCE(b.popularity_score, 0) DESC, b.book_id DESC
+            LIMIT ?
+            """,
+            (limit,)
+        ) or []
+
+class CatalogChangeFeed:
+    """Retention for the append-only catalog_changes feed
+    
+    A row is deleted once every consumer has read past it: the persisted watermarks
+    of the feed readers in index_watermarks, and the in-memory indexes of this
+    process. Built in-memory indexes are caught up first so an idle one does not pin
+    the feed; unbuilt ones load from books on first use and need no history.
+    """
     
     @staticmethod
-    def check_data_integrity():
-        """Check database integrity"""
-        issues = []
+    def persisted_consumers():
+        """index_watermarks names whose change_id is a catalog_changes position"""
+        return (
+            SpellingIndex.WATERMARK_NAME,
+            ContentSimilarityIndex.WATERMARK_NAME,
+            DataValidator.DEDUP_WATERMARK_NAME,
+        )
+    
+    @staticmethod
+    def memory_consumers():
+        """In-memory indexes following the feed with a process-local watermark"""
+        return (TrigramIndex, ContentSimilarityIndex, CatalogSnapshot, BitmapIndex)
+    
+    @classmethod
+    def floor(cls):
+        """Highest change_id every consumer has applied, None if it cannot be established"""
+        marks = []
+        for consumer in cls.memory_consumers():
+            if consumer.watermark() is None:
+                continue
+            if not consumer.refresh():
+                return None
+            marks.append(consumer.watermark())
         
-        try:
-            # Check for orphaned borrowing records
-            orphaned_borrowings = Database.execute_query("""
-                SELECT br.borrowing_id 
-                FROM borrowing br
-                LEFT JOIN book_inventory bi ON br.inventory_id = bi.inventory_id
-                WHERE bi.inventory_id IS NULL
-            """)
-            if orphaned_borrowings:
-                issues.append(f"Found {len(orphaned_borrowings)} orphaned borrowing records")
-            
-            # Check for orphaned book_statistics
-            orphaned_stats = Database.execute_query("""
-                SELECT bs.book_id 
-                FROM book_statistics bs
-                LEFT JOIN books b ON bs.book_id = b.book_id
-                WHERE b.book_id IS NULL
-            """)
-            if orphaned_stats:
-                issues.append(f"Found {len(orphaned_stats)} orphaned book statistics")
-            
-            # Check for negative values
-            negative_fines = Database.execute_query("""
-                SELECT user_id FROM users WHERE fine_balance < 0
-            """)
-            if negative_fines:
-                issues.append(f"Found {len(negative_fines)} users with negative fines")
-            
-            # Check for invalid dates
-            future_returns = Database.execute_query("""
-                SELECT borrowing_id FROM borrowing 
-                WHERE return_date > date('now') AND return_date IS NOT NULL
-            """)
-            if future_returns:
-                issues.append(f"Found {len(future_returns)} borrowings with future return dates")
-            
-            # Check for books without inventory
-            books_no_inventory = Database.execute_query("""
-                SELECT b.book_id, b.title 
-                FROM books b
-                LEFT JOIN book_inventory bi ON b.book_id = bi.book_id
-                WHERE bi.book_id IS NULL AND b.is_active = 1
-            """)
-            if books_no_inventory:
-                issues.append(f"Found {len(books_no_inventory)} active books without inventory records")
-            
-        except Exception as e:
-            issues.append(f"Error checking data integrity: {str(e)}")
+        rows = Database.execute_query(
+            "SELECT change_id FROM index_watermarks WHERE index_name IN (SELECT value FROM json_each(?))",
+            (json.dumps(cls.persisted_consumers()),)
+        )
+        if rows is None:
+            return None
+        marks.extend(int(row['change_id']) for row in rows)
+        if marks:
+            return min(marks)
         
-        return issues
+        latest = Database.execute_query(
+            "SELECT COALESCE(MAX(change_id), 0) as change_id FROM catalog_changes",
+            fetch_one=True
+        )
+        return int(latest['change_id']) if latest else None
+    
+    @classmethod
+    def prune(cls):
+        """Delete feed rows at or below the consumer floor, keeping the newest row so MAX(change_id) never moves back"""
+        floor = cls.floor()
+        if floor is None:
+            return False
+        return Database.execute_update(
+            """DELETE FROM catalog_changes
+               WHERE change_id <= ? AND change_id < (SELECT MAX(change_id) FROM catalog_changes)""",
+            (floor,)
+        )
 
-class UniqueIDGenerator:
-    """Generate unique IDs for users and books"""
+class MaintenanceScheduler:
+    """Single daemon thread running periodic jobs under scheduler_locks"""
+    
+    TICK_SECONDS = 60
+    HOLD_SECONDS = 600
+    THREAD_NAME = "litgrid-maintenance"
     
     @staticmethod
-    def generate_user_id():
-        """Generate unique user ID (e.g., USR-2025-001234)"""
-        year = datetime.now().year
-        random_num = secrets.randbelow(999999)
-        return f"USR-{year}-{random_num:06d}"
+    def jobs():
+        """(lock name, interval minutes, callable) for each periodic job"""
+        return [
+            ('recommendation_refresh', 5, RecommendationRefresher.run_once),
+            ('popularity_roll', 60, PopularityTracker.roll),
+            ('kpi_refresh', 5, KpiCounters.refresh),
+            ('copy_counter_reconcile', 60, CopyCounters.reconcile),
+            ('inventory_insights_refresh', 15, InventoryInsights.refresh),
+            ('catalog_changes_prune', 60, CatalogChangeFeed.prune),
+            # Trigger-maintained aggregates, recomputed daily in case anything bypassed the triggers
+            ('catalog_facets_reconcile', 1440, CatalogFacets.rebuild),
+            ('daily_stats_reconcile', 1440, DailyStats.rebuild),
+            ('kpi_counters_reconcile', 1440, KpiCounters.rebuild),
+            ('member_stats_reconcile', 1440, MemberStats.rebuild),
+        ]
+    
+    @classmethod
+    def run_due_jobs(cls):
+        for lock_name, interval_minutes, job in cls.jobs():
+            acquired, _ = AccountOpsEngine.acquire_scheduler_lock(
+                lock_name, interval_minutes=interval_minutes, hold_seconds=cls.HOLD_SECONDS
+            )
+            if not acquired:
+                continue
+            status_label, error_reason = 'success', None
+            try:
+                job()
+            except Exception as ex:
+                status_label, error_reason = 'failed', str(ex)
+            finally:
+                AccountOpsEngine.release_scheduler_lock(lock_name, status=status_label, error_reason=error_reason)
+    
+    @classmethod
+    def _loop(cls):
+        while True:
+            cls.run_due_jobs()
+            time.sleep(cls.TICK_SECONDS)
     
     @staticmethod
-    def generate_book_id():
-        """Generate unique book ID (e.g., BK-2025-001234)"""
-        year = datetime.now().year
-        random_num = secrets.randbelow(999999)
-        return f"BK-{year}-{random_num:06d}"
+    @st.cache_resource(show_spinner=False)
+    def _thread():
+        """The process-wide maintenance thread.
+        
+        Streamlit executes the script in a fresh module on every rerun, so a flag on the
+        class would be reset each time; the resource cache survives reruns and computes
+        this once. A thread that outlived a cache clear is reused instead of doubled.
+        """
+        for thread in threading.enumerate():
+            if thread.name == MaintenanceScheduler.THREAD_NAME and thread.is_alive():
+                return thread
+        thread = threading.Thread(target=MaintenanceScheduler._loop, name=MaintenanceScheduler.THREAD_NAME, daemon=True)
+        thread.start()
+        return thread
+    
+    @classmethod
+    def start(cls):
+        """Start the maintenance thread once per process"""
+        cls._thread()
 
-# Initialize utilities
-file_handler = FileHandler()
-pdf_handler = PDFHandler()
-barcode_qr = BarcodeQRGenerator()
-fuzzy_search = FuzzySearchEngine()
-recommendation_engine = RecommendationEngine()
-pseudonym_gen = PseudonymGenerator()
-backup_manager = BackupManager()
-excel_exporter = ExcelExporter()
-data_validator = DataValidator()
-unique_id_gen = UniqueIDGenerator()
+class TimeSeriesDownsampler:
+    """Largest-Triangle-Three-Buckets reduction of long line traces"""
 
-# ================================================================
-# V4.0 ENHANCED FEATURES - ALL INLINED
-# ================================================================
+    POINT_BUDGET = 1000
+    TRACE_TYPES = ('scatter', 'scattergl')
+    POINT_ATTRIBUTES = ('x', 'y', 'text', 'hovertext', 'customdata')
 
-class EnhancedBookManager:
-    """All book management enhancements"""
-    
     @staticmethod
-    def bulk_import_csv(csv_file) -> tuple:
-        """Bulk import books from CSV"""
+    def _numeric_x(x):
+        values = np.asarray(x)
         try:
-            df = pd.read_csv(csv_file)
-            required_columns = ['title', 'author', 'genre']
-            
-            if not all(col in df.columns for col in required_columns):
-                return False, "Missing required columns: title, author, genre"
-            
-            imported = 0
-            failed = 0
-            
-            for _, row in df.iterrows():
-                try:
-                    # Check if ISBN exists (if provided)
-                    isbn = row.get('isbn', '')
-                    if isbn:
-                        existing = Database.execute_query(
-                            "SELECT book_id FROM books WHERE isbn = ?",
-                            (isbn,), fetch_one=True
-                        )
-                        if existing:
-                            failed += 1
-                            continue
-                    
-                    # Insert book
-                    book_query = """
-                        INSERT INTO books 
-                        (isbn, title, publication_year, pages, language, keywords, is_active)
-                        VALUES (?, ?, ?, ?, ?, ?, 1)
-                    """
-                    values = (
-                        isbn or f"TEMP-{imported}-{row.get('title', '')[:10]}",
-                        row.get('title'),
-                        row.get('publication_year', None),
-                        row.get('page_count', None),
-                        row.get('language', 'English'),
-                        row.get('keywords', '')
-                    )
-                    
-                    if Database.execute_update(book_query, values):
-                        # Get the new book_id
-                        new_book = Database.execute_query(
-                            "SELECT book_id FROM books WHERE title = ? ORDER BY book_id DESC LIMIT 1",
-                            (row.get('title'),), fetch_one=True
-                        )
-                        
-                        if new_book:
-                            book_id = new_book['book_id']
-                            
-                            # Add author if provided
-                            author_name = row.get('author', '').strip()
-                            if author_name:
-                                # For now, just store author in books table
-                                Database.execute_update(
-                                    "UPDATE books SET author = ? WHERE book_id = ?",
-                                    (author_name, book_id)
-                                )
-                            
-                            # Add genre if provided
-                            genre_name = row.get('genre', '').strip()
-                            if genre_name:
-                                # Store genre in books table and link to genres table
-                                Database.execute_update(
-                                    "UPDATE books SET genre = ? WHERE book_id = ?",
-                                    (genre_name, book_id)
-                                )
-                                
-                                # Check if genre exists and link it
-                                genre = Database.execute_query(
-                                    "SELECT genre_id FROM genres WHERE genre_name = ?",
-                                    (genre_name,), fetch_one=True
-                                )
-                                
-                                if genre:
-                                    Database.execute_update(
-                                        "INSERT OR IGNORE INTO book_genres (book_id, genre_id) VALUES (?, ?)",
-                                        (book_id, genre['genre_id'])
-                                    )
-                            
-                            # Add inventory copies if specified
-                            total_copies = int(row.get('total_copies', 1))
-                            for i in range(total_copies):
-                                # Skip inventory creation for now as library_id may not exist
-                                pass
-                            
-                            imported += 1
-                except Exception as e:
-                    failed += 1
-            
-            return True, f"Imported: {imported}, Failed: {failed}"
-        except Exception as e:
-            return False, f"Error: {str(e)}"
+            return values.astype(np.float64)
+        except (TypeError, ValueError):
+            pass
+        try:
+            return pd.to_datetime(values).values.astype('datetime64[ns]').astype(np.int64).astype(np.float64)
+        except (TypeError, ValueError):
+            return np.arange(len(values), dtype=np.float64)
+
+    @staticmethod
+    def lttb_indices(x, y, threshold):
+        """Indices of the threshold points LTTB keeps (first and last always included)"""
+        n = len(y)
+        if threshold >= n or threshold < 3:
+            return np.arange(n)
+        x = TimeSeriesDownsampler._numeric_x(x)
+        y = np.nan_to_num(np.asarray(y, dtype=np.float64))
+
+        # threshold - 2 buckets over the interior points; step >= 1 keeps edges strictly increasing
+        edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+        counts = np.diff(edges)
+        avg_x = np.add.reduceat(x[:n - 1], edges[:-1]) / counts
+        avg_y = np.add.reduceat(y[:n - 1], edges[:-1]) / counts
+        # Third vertex of each bucket's triangle: the next bucket's mean, or the last point
+        next_x = np.append(avg_x[1:], x[-1])
+        next_y = np.append(avg_y[1:], y[-1])
+
+        selected = np.empty(threshold, dtype=np.int64)
+        selected[0], selected[-1] = 0, n - 1
+        a = 0
+        for bucket in range(threshold - 2):
+            lo, hi = edges[bucket], edges[bucket + 1]
+            area = np.abs(
+                (x[a] - next_x[bucket]) * (y[lo:hi] - y[a])
+                - (x[a] - x[lo:hi]) * (next_y[bucket] - y[a])
+            )
+            a = lo + int(np.argmax(area))
+            selected[bucket + 1] = a
+        return selected
+
+    @staticmethod
+    def downsample_figure(fig, budget=None):
+        """Reduce line traces longer than budget in place; other traces are left untouched"""
+        budget = budget or TimeSeriesDownsampler.POINT_BUDGET
+        for trace in fig.data:
+            if trace.type not in TimeSeriesDownsampler.TRACE_TYPES or trace.x is None or trace.y is None:
+                continue
+            if 'lines' not in (trace.mode or 'lines') or len(trace.y) <= budget:
+                continue
+            n = len(trace.y)
+            keep = TimeSeriesDownsampler.lttb_indices(trace.x, trace.y, budget)
+            # Every per-point array must be cut with the same indices
+            for owner, attributes in ((trace, TimeSeriesDownsampler.POINT_ATTRIBUTES), (trace.marker, ('color', 'size'))):
+                for attribute in attributes:
+                    values = owner[attribute]
+                    if values is not None and not isinstance(values, (str, int, float)) and len(values) == n:
+                        owner[attribute] = np.asarray(values)[keep]
+        return fig
+
+class FigureCache:
+    """LRU of built Plotly figures keyed by a fingerprint of their data and chart parameters"""
+
+    MAX_ENTRIES = 256
+
+    @staticmethod
+    @st.cache_resource(show_spinner=False)
+    def _state():
+        """The LRU itself, held in the resource cache so it outlives script reruns"""
+        return SimpleNamespace(entries=OrderedDict(), lock=threading.Lock())
+
+    @staticmethod
+    def fingerprint(data, params):
+        """Stable digest of the chart input (DataFrame, JSON-able value or str) and its parameters"""
+        digest = hashlib.blake2b(digest_size=16)
+        if isinstance(data, pd.DataFrame):
+            digest.update(json.dumps([str(c) for c in data.columns]).encode('utf-8'))
+            try:
+                digest.update(pd.util.hash_pandas_object(data, index=True).values.tobytes())
+            except TypeError:
+                # Unhashable cells (lists/dicts) fall back to the serialized frame
+                digest.update(data.to_json(orient='split', date_format='iso').encode('utf-8'))
+        elif isinstance(data, str):
+            digest.update(data.encode('utf-8'))
+        else:
+            digest.update(json.dumps(data, sort_keys=True, default=str).encode('utf-8'))
+        digest.update(json.dumps(params, sort_keys=True, default=str).encode('utf-8'))
+        return digest.hexdigest()
+
+    @classmethod
+    def figure(cls, name, data, build, **params):
+        """Cached build(data) for this chart name; params must cover every other input build uses.
+
+        The returned figure is shared, so callers must not mutate it.
+        """
+        key = (name, cls.fingerprint(data, params))
+        state = cls._state()
+        with state.lock:
+            fig = state.entries.get(key)
+            if fig is not None:
+                state.entries.move_to_end(key)
+                return fig
+        fig = TimeSeriesDownsampler.downsample_figure(build(data))
+        with state.lock:
+            state.entries[key] = fig
+            while len(state.entries) > cls.MAX_ENTRIES:
+                state.entries.popitem(last=False)
+        return fig
+
+    @staticmethod
+    def from_json(figure_json):
+        """Figure for serialized Plotly JSON, parsed and validated once per distinct payload"""
+        return FigureCache.figure('json', figure_json, lambda payload: go.Figure(json.loads(payload)))
+
+class ReportJobRunner:
+    """Run report definitions on a worker pool and share their TTL-cached results"""
+    
+    MAX_WORKERS = 4
+    DEFAULT_TTL_SECONDS = 900
+    POLL_SECONDS = 1.0
+    
+    _definitions = {}
     
     @staticmethod
-    def upload_book_cover(book_id: int, cover_file) -> bool:
-        """Upload book cover image"""
-        try:
-            # Validate file
-            if not file_handler.validate_file_size(cover_file, max_size_mb=5):
-                return False
-            
-            # Convert to bytes
-            image_bytes = cover_file.getvalue()
-            
-            # For now, just skip cover upload since book_covers table may not exist
-            # This is a non-critical feature
-            return True
-            
-            Database.execute_update(query, values)
-            return True
-        except:
-            return False
+    @st.cache_resource(show_spinner=False)
+    def _state():
+        """Worker pool and job bookkeeping shared by every session and kept across reruns"""
+        return SimpleNamespace(
+            executor=ThreadPoolExecutor(max_workers=ReportJobRunner.MAX_WORKERS, thread_name_prefix="litgrid-report"),
+            jobs={},
+            progress={},
+            lock=threading.Lock(),
+        )
+    
+    @classmethod
+    def report(cls, name, ttl_seconds=None):
+        """Decorator registering builder(params, progress) -> list of render blocks"""
+        def register(builder):
+            cls._definitions[name] = (builder, ttl_seconds or cls.DEFAULT_TTL_SECONDS)
+            return builder
+        return register
     
     @staticmethod
-    def get_book_cover(book_id: int):
-        """Get book cover image"""
-        try:
-            # Skip cover retrieval for now
-            result = None
-            return result[0]['cover_image'] if result else None
-        except:
-            return None
+    def require(rows, what):
+        """Return a query result, raising if the query failed so the job is not stored as empty"""
+        if rows is None:
+            raise RuntimeError(f"Could not load {what}")
+        return rows
     
     @staticmethod
-    def track_book_condition(book_id: int, condition: str, notes: str, user_id: int):
-        """Track book condition"""
-        try:
-            query = """
-                INSERT INTO book_conditions 
-                (book_id, condition_status, condition_notes, checked_by)
-                VALUES (%s, %s, %s, %s)
-            """
-            Database.execute_update(query, (book_id, condition, notes, user_id))
-            return True
-        except:
-            return False
+    def cache_key(name, params):
+        payload = json.dumps({'report': name, 'params': params}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
     
     @staticmethod
-    def get_book_condition_history(book_id: int):
-        """Get book condition history"""
-        try:
-            return Database.execute_query("""
-                SELECT bc.*, u.full_name as checker_name
-                FROM book_conditions bc
-                LEFT JOIN users u ON bc.checked_by = u.user_id
-                WHERE bc.book_id = %s
-                ORDER BY bc.check_date DESC
-            """, (book_id,))
-        except:
-            return []
+    def _serialize(blocks):
+        """Blocks to JSON: figures as Plotly JSON, tables as split-oriented frames"""
+        serialized = []
+        for block in blocks:
+            block = dict(block)
+            if block['kind'] == 'figure':
+                block['figure'] = TimeSeriesDownsampler.downsample_figure(block['figure']).to_json()
+            elif block['kind'] == 'table':
+                block['table'] = block['table'].to_json(orient='split', date_format='iso')
+            serialized.append(block)
+        return json.dumps(serialized)
     
     @staticmethod
-    def create_author_profile(name: str, bio: str = "", birth_year: int = None,
-                            nationality: str = "", website: str = ""):
-        """Create author profile"""
-        try:
-            query = """
-                INSERT INTO author_profiles 
-                (author_name, author_bio, birth_year, nationality, website)
-                VALUES (%s, %s, %s, %s, %s)
+    def _cached(key):
+        return Database.execute_query(
             """
-            Database.execute_update(query, (name, bio, birth_year, nationality, website))
-            return True
-        except:
-            return False
+            SELECT report_name, result_json, created_at, expires_at FROM report_results
+            WHERE cache_key = ? AND expires_at > CURRENT_TIMESTAMP
+            """,
+            (key,), fetch_one=True
+        )
     
-    @staticmethod
-    def get_author_profile(author_name: str):
-        """Get author profile"""
+    @classmethod
+    def _run(cls, key, name, params):
+        builder, ttl_seconds = cls._definitions[name]
+        state = cls._state()
+        
+        def progress(fraction, text=""):
+            state.progress[key] = (min(max(float(fraction), 0.0), 1.0), text)
+        
         try:
-            result = Database.execute_query(
-                "SELECT * FROM author_profiles WHERE author_name = %s",
-                (author_name,)
-            )
-            return result[0] if result else None
-        except:
-            return None
+            result_json = cls._serialize(builder(params, progress))
+            stored = Database.execute_batch([
+                ("DELETE FROM report_results WHERE expires_at <= CURRENT_TIMESTAMP", None),
+                ("""
+                    INSERT INTO report_results (cache_key, report_name, params_json, result_json, created_at, expires_at)
+                    VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP, datetime('now', ?))
+                    ON CONFLICT(cache_key) DO UPDATE SET
+                        result_json = excluded.result_json,
+                        created_at = excluded.created_at,
+                        expires_at = excluded.expires_at
+                """, (key, name, json.dumps(params, sort_keys=True, default=str), result_json, f"+{int(ttl_seconds)} seconds")),
+            ])
+            if not stored:
+                raise RuntimeError("Could not store report result")
+            return result_json
+        finally:
+            state.progress.pop(key, None)
+    
+    @classmethod
+    def submit(cls, name, params):
+        """Return the job key, starting a computation only if no fresh result or identical job exists"""
+        if name not in cls._definitions:
+            raise ValueError(f"Unknown report: {name}")
+        key = cls.cache_key(name, params)
+        if cls._cached(key):
+            return key
+        state = cls._state()
+        with state.lock:
+            future = state.jobs.get(key)
+            if future is None or future.done():
+                state.progress[key] = (0.0, "Queued")
+                state.jobs[key] = state.executor.submit(cls._run, key, name, params)
+        return key
+    
+    @classmethod
+    def status(cls, key):
+        """{'state': running|done|failed|missing, ...} for a job key"""
+        state = cls._state()
+        with state.lock:
+            future = state.jobs.get(key)
+            if future is not None and future.done() and future.exception() is None:
+                # The result now lives in report_results; failures stay until resubmitted
+                del state.jobs[key]
+                future = None
+            fraction, text = state.progress.get(key, (0.0, "Working"))
+        if future is not None and not future.done():
+            return {'state': 'running', 'progress': fraction, 'text': text}
+        if future is not None:
+            return {'state': 'failed', 'error': str(future.exception())}
+        cached = cls._cached(key)
+        if not cached:
+            return {'state': 'missing'}
+        return {
+            'state': 'done',
+            'blocks': json.loads(cached['result_json']),
+            'created_at': cached['created_at'],
+            'expires_at': cached['expires_at'],
+        }
+
+class PseudonymGenerator:
+    """Generate random pseudonyms for anonymous mode"""
+    
+    ADJECTIVES = ['Swift', 'Silent', 'Brave', 'Wise', 'Noble', 'Mystic', 'Shadow', 'Golden', 
+                  'Silver', 'Crystal', 'Emerald', 'Crimson', 'Azure', 'Starlight', 'Moonlit']
+    
+    NOUNS = ['Reader', 'Scholar', 'Sage', 'Wanderer', 'Seeker', 'Guardian', 'Keeper', 'Voyager',
+             'Explorer', 'Dreamer', 'Thinker', 'Watcher', 'Phoenix', 'Dragon', 'Raven']
     
     @staticmethod
-    def export_catalog_excel(books: List[Dict]):
-        """Export catalog to Excel"""
-        return excel_exporter.export_books(books)
+    def generate():
+        """Generate random pseudonym"""
+        import random
+        adj = random.choice(PseudonymGenerator.ADJECTIVES)
+        noun = random.choice(PseudonymGenerator.NOUNS)
+        number = random.randint(100, 999)
+        return f"{adj}{noun}{number}"
 
-class EnhancedSearchFilter:
-    """Advanced search and filtering"""
+class BackupManager:
+    """Backup and restore utilities"""
     
     @staticmethod
-    def fuzzy_search_books(query: str, threshold: int = 60):
-        """Fuzzy search with typo tolerance"""
+    def create_backup(backup_name=None):
+        """Create database backup as ZIP"""
+        if not backup_name:
+            backup_name = f"litgrid_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+        
+        backup_dir = "backups"
+        if not os.path.exists(backup_dir):
+            os.makedirs(backup_dir)
+        
+        backup_path = os.path.join(backup_dir, backup_name)
+        
         try:
-            all_books = Database.execute_query("SELECT * FROM books")
-            return fuzzy_search.search_books(query, all_books, threshold)
-        except:
-            return []
+            with zipfile.ZipFile(backup_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+                # Export tables to CSV and add to ZIP
+                tables = ['users', 'books', 'transactions', 'fines', 'roles', 'member_tiers',
+                         'book_covers', 'user_photos', 'pdf_library', 'privacy_settings',
+                         'user_profiles', 'book_reviews', 'author_profiles']
+                
+                for table in tables:
+                    try:
+                        query = f"SELECT * FROM {table}"
+                        data = Database.execute_query(query)
+                        if data:
+                            # Convert to CSV
+                            csv_buffer = io.StringIO()
+                            if data:
+                                keys = data[0].keys()
+                                dict_writer = csv.DictWriter(csv_buffer, keys)
+                                dict_writer.writeheader()
+                                dict_writer.writerows(data)
+                            
+                            # Add to ZIP
+                            zipf.writestr(f"{table}.csv", csv_buffer.getvalue())
+                    except:
+                        pass
+            
+            return backup_path, os.path.getsize(backup_path)
+        except Exception as e:
+            return None, 0
     
     @staticmethod
-    def advanced_multi_field_filter(title: str = "", author: str = "", genre: str = "",
-                                   year_from: int = None, year_to: int = None,
-                                   available_only: bool = False, min_pages: int = None,
-                                   max_pages: int = None, language: str = ""):
-        """Advanced multi-field filter"""
+    def restore_backup(zip_path):
+        """Restore from backup ZIP"""
         try:
-            conditions = []
-            params = []
-            
-            if title:
-                conditions.append("title LIKE %s")
-                params.append(f"%{title}%")
-            
-            if author:
-                conditions.append("author LIKE %s")
-                params.append(f"%{author}%")
-            
-            if genre:
-                conditions.append("genre = %s")
-                params.append(genre)
-            
-            if year_from:
-                conditions.append("publication_year >= %s")
-                params.append(year_from)
-            
-            if year_to:
-                conditions.append("publication_year <= %s")
-                params.append(year_to)
-            
-            if available_only:
-                conditions.append("available_copies > 0")
-            
-            if min_pages:
-                conditions.append("page_count >= %s")
-                params.append(min_pages)
-            
-            if max_pages:
-                conditions.append("page_count <= %s")
-                params.append(max_pages)
-            
-            if language:
-                conditions.append("language = %s")
-                params.append(language)
-            
-            where_clause = " AND ".join(conditions) if conditions else "1=1"
-            query = f"SELECT * FROM books WHERE {where_clause}"
-            
-            return Database.execute_query(query, tuple(params))
+            with zipfile.ZipFile(zip_path, 'r') as zipf:
+                # Extract and restore each table
+                for filename in zipf.namelist():
+                    if filename.endswith('.csv'):
+                        table_name = filename.replace('.csv', '')
+                        csv_data = zipf.read(filename).decode('utf-8')
+                        # Process CSV and insert into database
+                        # Implementation depends on specific requirements
+                        pass
+            return True
         except:
-            return []
+            return False
+
+class ExcelExporter:
+    """Export data to Excel"""
+    
+    @staticmethod
+    def export_books(books):
+        """Export books to Excel"""
+        wb = Workbook()
+        ws = wb.active
+        ws.title = "Books Catalog"
+        
+        # Headers
+        headers = ['Book ID', 'Title', 'Author', 'Genre', 'ISBN', 'Year', 'Pages', 
+                  'Available', 'Total Copies', 'Status']
+        ws.append(headers)
+        
+        # Style headers
+        header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+        header_font = Font(bold=True, color="FFFFFF")
+        
+        for cell in ws[1]:
+            cell.fill = header_fill
+            cell.font = header_font
+            cell.alignment = Alignment(horizontal="center")
+        
+        # Data
+        for book in books:
+            ws.append([
+                book.get('book_id'),
+                book.get('title'),
+                book.get('author'),
+                book.get('genre'),
+                book.get('isbn'),
+                book.get('publication_year'),
+                book.get('page_count'),
+                book.get('available_copies'),
+                book.get('total_copies'),
+                book.get('status')
+            ])
+        
+        # Auto-adjust column widths
+        for column in ws.columns:
+            max_length = 0
+            column = [cell for cell in column]
+            for cell in column:
+                try:
+                    if len(str(cell.value)) > max_length:
+                        max_length = len(cell.value)
+                except:
+                    pass
+            adjusted_width = (max_length + 2)
+            ws.column_dimensions[column[0].column_letter].width = adjusted_width
+        
+        # Save to BytesIO
+        output = BytesIO()
+        wb.save(output)
+        output.seek(0)
+        return output
     
     @staticmethod
-    def sort_by_popularity():
-        """Sort books by popularity (borrow count)"""
-        try:
-            return Database.execute_query("""
-                SELECT b.book_id, b.title, b.isbn, b.is_active,
-                       COUNT(t.transaction_id) as borrow_count
-                FROM books b
-                LEFT JOIN transactions t ON b.book_id = t.book_id
-                WHERE b.is_active = 1
-                GROUP BY b.book_id, b.title, b.isbn, b.is_active
-                ORDER BY borrow_count DESC
-                LIMIT 100
-            """)
-        except:
-            return []
-    
+    def export_users(users):
+        """Export users to Excel"""
+        wb = Workbook()
+        ws = wb.active
+        ws.title = "Users"
+        
+        headers = ['User ID', 'Full Name', 'Username', 'Email', 'Role', 'Member Tier', 
+                  'Books Borrowed', 'Fine Balance', 'Status', 'Joined Date']
+        ws.append(headers)
+        
+        # Style headers
+        header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+        header_font = Font(bold=True, color="FFFFFF")
+        
+        for cell in ws[1]:
+            cell.fill = header_fill
+            cell.font = header_font
+            cell.alignment = Alignment(horizontal="center")
+        
+        for user in users:
+            ws.append([
+                user.get('user_id'),
+                user.get('full_name'),
+                user.get('username'),
+                user.get('email'),
+                user.get('role'),
+                user.get('member_tier'),
+                user.get('books_borrowed', 0),
+                user.get('fine_balance', 0),
+                user.get('status'),
+                user.get('created_at')
+            ])
+        
+        for column in ws.columns:
+            max_length = 0
+            column = [cell for cell in column]
+            for cell in column:
+                try:
+                    if len(str(cell.value)) > max_length:
+                        max_length = len(cell.value)
+                except:
+                    pass
+            adjusted_width = (max_length + 2)
+            ws.column_dimensions[column[0].column_letter].width = adjusted_width
+        
+        output = BytesIO()
+        wb.save(output)
+        output.seek(0)
+        return output
+
+class DataValidator:
+    """Data validation and integrity checker"""
+    
+    @staticmethod
+    def validate_email(email):
+        """Validate email format"""
+        import re
+        pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
+        return re.match(pattern, email) is not None
+    
+    @staticmethod
+    def validate_isbn(isbn):
+        """Validate ISBN-10 or ISBN-13"""
+        isbn = isbn.replace('-', '').replace(' ', '')
+        
+        if len(isbn) == 10:
+            return DataValidator._validate_isbn10(isbn)
+        elif len(isbn) == 13:
+            return DataValidator._validate_isbn13(isbn)
+        return False
+    
+    @staticmethod
+    def _validate_isbn10(isbn):
+        """Validate ISBN-10"""
+        if not isbn[:-1].isdigit():
+            return False
+        
+        total = sum((10 - i) * int(isbn[i]) for i in range(9))
+        check_digit = (11 - (total % 11)) % 11
+        
+        return str(check_digit) == isbn[9] or (check_digit == 10 and isbn[9].upper() == 'X')
+    
+    @staticmethod
+    def _validate_isbn13(isbn):
+        """Validate ISBN-13"""
+        if not isbn.isdigit():
+            return False
+        
+        total = sum((3 if i % 2 else 1) * int(isbn[i]) for i in range(12))
+        check_digit = (10 - (total % 10)) % 10
+        
+        return check_digit == int(isbn[12])
+    
+    DUPLICATE_CANDIDATES = 25
+    DEDUP_WATERMARK_NAME = 'book_duplicate_keys'
+    _dedup_lock = threading.Lock()
+    
+    @staticmethod
+    def canonical_isbn(isbn):
+        """ISBN-13 digits for an ISBN-10 or ISBN-13, or None if it is neither"""
+        digits = re.sub(r'[^0-9Xx]', '', str(isbn or '')).upper()
+        if len(digits) == 10 and digits[:9].isdigit():
+            core = '978' + digits[:9]
+        elif len(digits) == 13 and digits.isdigit():
+            return digits
+        else:
+            return None
+        total = sum((3 if i % 2 else 1) * int(core[i]) for i in range(12))
+        return core + str((10 - (total % 10)) % 10)
+    
+    @staticmethod
+    def title_author_fingerprint(title, author):
+        """Order-insensitive normalized key for title+author"""
+        def tokens(text):
+            folded = unicodedata.normalize('NFKD', str(text or '')).encode('ascii', 'ignore').decode('ascii')
+            return ' '.join(sorted(set(re.findall(r'[a-z0-9]+', folded.lower()))))
+        title_tokens = tokens(title)
+        return f"{title_tokens}|{tokens(author)}" if title_tokens else None
+    
+    @staticmethod
+    def duplicate_keys(title, author, isbns=()):
+        """Lookup keys for a book: one fingerprint key plus one key per canonical ISBN"""
+        keys = set()
+        fingerprint = DataValidator.title_author_fingerprint(title, author)
+        if fingerprint:
+            keys.add(f"ta:{fingerprint}")
+        for isbn in isbns:
+            canonical = DataValidator.canonical_isbn(isbn)
+            if canonical:
+                keys.add(f"isbn:{canonical}")
+        return keys
+    
+    @staticmethod
+    def refresh_duplicate_keys():
+        """Bring book_duplicate_keys up to date with the catalog change feed"""
+        with DataValidator._dedup_lock:
+            state = Database.execute_query(
+                "SELECT change_id FROM index_watermarks WHERE index_name = ?",
+                (DataValidator.DEDUP_WATERMARK_NAME,), fetch_one=True
+            )
+            latest = Database.execute_query(
+                "SELECT COALESCE(MAX(change_id), 0) as change_id FROM catalog_changes",
+                fetch_one=True
+            )
+            if latest is None:
+                return False
+            latest_id = int(latest['change_id'])
+            if state is not None and latest_id <= state['change_id']:
+                return True
+            
+            if state is None:
+                books = Database.execute_query("SELECT book_id, title, author, isbn, isbn_10, isbn_13 FROM books")
+                statements = [("DELETE FROM book_duplicate_keys", None)]
+            else:
+                changed = Database.execute_query(
+                    "SELECT DISTINCT book_id FROM catalog_changes WHERE change_id > ? AND change_id <= ? AND change_type <> 'popularity'",
+                    (state['change_id'], latest_id)
+                ) or []
+                changed_ids = json.dumps([row['book_id'] for row in changed])
+                books = Database.execute_query(
+                    """SELECT book_id, title, author, isbn, isbn_10, isbn_13 FROM books
+                       WHERE book_id IN (SELECT value FROM json_each(?))""",
+                    (changed_ids,)
+                )
+                statements = [("DELETE FROM book_duplicate_keys WHERE book_id IN (SELECT value FROM json_each(?))", (changed_ids,))]
+            if books is None:
+                return False
+            
+            statements.append((
+                "INSERT OR IGNORE INTO book_duplicate_keys (dedup_key, book_id) VALUES (?, ?)",
+                [
+                    (key, book['book_id'])
+                    for book in books
+                    for key in DataValidator.duplicate_keys(
+                        book['title'], book['author'], (book['isbn'], book['isbn_10'], book['isbn_13'])
+                    )
+                ]
+            ))
+            statements.append((
+                """INSERT INTO index_watermarks (index_name, change_id, updated_at)
+                   VALUES (?, ?, CURRENT_TIMESTAMP)
+                   ON CONFLICT(index_name) DO UPDATE SET change_id = excluded.change_id, updated_at = CURRENT_TIMESTAMP""",
+                (DataValidator.DEDUP_WATERMARK_NAME, latest_id)
+            ))
+            return Database.execute_batch(statements)
+    
+    @staticmethod
+    def detect_duplicate_books(title, author, isbn=None):
+        """Detect duplicate books via fingerprint/ISBN keys, then a short fuzzy candidate list"""
+        DataValidator.refresh_duplicate_keys()
+        keys = DataValidator.duplicate_keys(title, author, (isbn,))
+        if keys:
+            match = Database.execute_query(
+                """SELECT b.book_id, b.title, b.author, b.isbn, b.isbn_10, b.isbn_13
+                   FROM book_duplicate_keys k
+                   JOIN books b ON b.book_id = k.book_id
+                   WHERE k.dedup_key IN (SELECT value FROM json_each(?))
+                   ORDER BY k.dedup_key LIKE 'isbn:%' DESC, b.book_id
+                   LIMIT 1""",
+                (json.dumps(sorted(keys)),), fetch_one=True
+            )
+            if match:
+                return match
+        
+        candidate_ids = TrigramIndex.candidates(f"{title} {author}", limit=DataValidator.DUPLICATE_CANDIDATES)
+        if not candidate_ids:
+            return None
+        candidates = Database.execute_query(
+            """SELECT book_id, title, author, isbn, isbn_10, isbn_13 FROM books
+               WHERE book_id IN (SELECT value FROM json_each(?))""",
+            (json.dumps(candidate_ids),)
+        ) or []
+        for book in candidates:
+            if (fuzz.ratio(str(book.get('title') or '').lower(), str(title or '').lower()) > 90 and
+                fuzz.ratio(str(book.get('author') or '').lower(), str(author or '').lower()) > 90):
+                return book
+        return None
+    
+    @staticmethod
+    def is_other_edition(book, isbn):
+        """True when a duplicate match and the new record both carry ISBNs and none are shared"""
+        canonical = DataValidator.canonical_isbn(isbn)
+        existing = {DataValidator.canonical_isbn(book.get(field)) for field in ('isbn', 'isbn_10', 'isbn_13')}
+        existing.discard(None)
+        return bool(canonical and existing and canonical not in existing)
+    
+    @staticmethod
+    def check_data_integrity():
+        """Check database integrity"""
+        issues = []
+        
+        try:
+            # Check for orphaned borrowing records
+            orphaned_borrowings = Database.execute_query("""
+                SELECT br.borrowing_id 
+                FROM borrowing br
+                LEFT JOIN book_inventory bi ON br.inventory_id = bi.inventory_id
+                WHERE bi.inventory_id IS NULL
+            """)
+            if orphaned_borrowings:
+                issues.append(f"Found {len(orphaned_borrowings)} orphaned borrowing records")
+            
+            # Check for orphaned book_statistics
+            orphaned_stats = Database.execute_query("""
+                SELECT bs.book_id 
+                FROM book_statistics bs
+                LEFT JOIN books b ON bs.book_id = b.book_id
+                WHERE b.book_id IS NULL
+            """)
+            if orphaned_stats:
+                issues.append(f"Found {len(orphaned_stats)} orphaned book statistics")
+            
+            # Check for negative values
+            negative_fines = Database.execute_query("""
+                SELECT user_id FROM users WHERE fine_balance < 0
+            """)
+            if negative_fines:
+                issues.append(f"Found {len(negative_fines)} users with negative fines")
+            
+            # Check for invalid dates
+            future_returns = Database.execute_query(f"""
+                SELECT borrowing_id FROM borrowing 
+                WHERE return_day > {LoanDates.TODAY}
+            """)
+            if future_returns:
+                issues.append(f"Found {len(future_returns)} borrowings with future return dates")
+            
+            # Check for books without inventory
+            books_no_inventory = Database.execute_query("""
+                SELECT b.book_id, b.title 
+                FROM books b
+                LEFT JOIN book_inventory bi ON b.book_id = bi.book_id
+                WHERE bi.book_id IS NULL AND b.is_active = 1
+            """)
+            if books_no_inventory:
+                issues.append(f"Found {len(books_no_inventory)} active books without inventory records")
+            
+        except Exception as e:
+            issues.append(f"Error checking data integrity: {str(e)}")
+        
+        return issues
+
+class UniqueIDGenerator:
+    """Generate unique IDs for users and books"""
+    
+    @staticmethod
+    def generate_user_id():
+        """Generate unique user ID (e.g., USR-2025-001234)"""
+        year = datetime.now().year
+        random_num = secrets.randbelow(999999)
+        return f"USR-{year}-{random_num:06d}"
+    
+    @staticmethod
+    def generate_book_id():
+        """Generate unique book ID (e.g., BK-2025-001234)"""
+        year = datetime.now().year
+        random_num = secrets.randbelow(999999)
+        return f"BK-{year}-{random_num:06d}"
+
+# Initialize utilities
+file_handler = FileHandler()
+pdf_handler = PDFHandler()
+barcode_qr = BarcodeQRGenerator()
+fuzzy_search = FuzzySearchEngine()
+recommendation_engine = RecommendationEngine()
+pseudonym_gen = PseudonymGenerator()
+backup_manager = BackupManager()
+excel_exporter = ExcelExporter()
+data_validator = DataValidator()
+unique_id_gen = UniqueIDGenerator()
+
+# ================================================================
+# V4.0 ENHANCED FEATURES - ALL INLINED
+# ================================================================
+
+class EnhancedBookManager:
+    """All book management enhancements"""
+    
+    @staticmethod
+    def bulk_import_csv(csv_file) -> tuple:
+        """Bulk import books from CSV"""
+        try:
+            df = pd.read_csv(csv_file)
+            required_columns = ['title', 'author', 'genre']
+            
+            if not all(col in df.columns for col in required_columns):
+                return False, "Missing required columns: title, author, genre"
+            
+            imported = 0
+            failed = 0
+            other_editions = 0
+            
+            for _, csv_row in df.iterrows():
+                try:
+                    # Empty CSV cells arrive as NaN, treat them as missing
+                    row = {key: (None if pd.isna(value) else value) for key, value in csv_row.items()}
+                    title = str(row.get('title') or '').strip()
+                    author_name = str(row.get('author') or '').strip()
+                    isbn = str(row.get('isbn') or '').strip() or None
+                    
+                    # Check if ISBN exists (if provided), including non-canonical ones like LOCAL-1
+                    if isbn:
+                        existing = Database.execute_query(
+                            "SELECT book_id FROM books WHERE isbn = ?",
+                            (isbn,), fetch_one=True
+                        )
+                        if existing:
+                            failed += 1
+                            continue
+                    
+                    # Skip rows matching an existing book; a title/author match with a different ISBN is another edition
+                    duplicate = DataValidator.detect_duplicate_books(title, author_name, isbn)
+                    if duplicate:
+                        if not DataValidator.is_other_edition(duplicate, isbn):
+                            failed += 1
+                            continue
+                        other_editions += 1
+                    
+                    # Insert book
+                    book_query = """
+                        INSERT INTO books 
+                        (isbn, title, author, publication_year, pages, language, keywords, is_active)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, 1)
+                    """
+                    values = (
+                        isbn or f"TEMP-{imported}-{title[:10]}",
+                        title,
+                        author_name or 'Unknown',
+                        row.get('publication_year'),
+                        row.get('page_count'),
+                        row.get('language') or 'English',
+                        row.get('keywords') or ''
+                    )
+                    
+                    if Database.execute_update(book_query, values):
+                        # Get the new book_id
+                        new_book = Database.execute_query(
+                            "SELECT book_id FROM books WHERE title = ? ORDER BY book_id DESC LIMIT 1",
+                            (title,), fetch_one=True
+                        )
+                        
+                        if new_book:
+                            book_id = new_book['book_id']
+                            
+                            # Add genre if provided
+                            genre_name = str(row.get('genre') or '').strip()
+                            if genre_name:
+                                # Store genre in books table and link to genres table
+                                Database.execute_update(
+                                    "UPDATE books SET genre = ? WHERE book_id = ?",
+                                    (genre_name, book_id)
+                                )
+                                
+                                # Check if genre exists and link it
+                                genre = Database.execute_query(
+                                    "SELECT genre_id FROM genres WHERE genre_name = ?",
+                                    (genre_name,), fetch_one=True
+                                )
+                                
+                                if genre:
+                                    Database.execute_update(
+                                        "INSERT OR IGNORE INTO book_genres (book_id, genre_id) VALUES (?, ?)",
+                                        (book_id, genre['genre_id'])
+                                    )
+                            
+                            # Add inventory copies if specified
+                            total_copies = int(row.get('total_copies') or 1)
+                            for i in range(total_copies):
+                                # Skip inventory creation for now as library_id may not exist
+                                pass
+                            
+                            imported += 1
+                    else:
+                        failed += 1
+                except Exception as e:
+                    failed += 1
+            
+            message = f"Imported: {imported}, Failed: {failed}"
+            if other_editions:
+                message += f", Possible other editions of existing books: {other_editions}"
+            return True, message
+        except Exception as e:
+            return False, f"Error: {str(e)}"
+    
+    @staticmethod
+    def upload_book_cover(book_id: int, cover_file) -> bool:
+        """Upload book cover image"""
+        try:
+            # Validate file
+            if not file_handler.validate_file_size(cover_file, max_size_mb=5):
+                return False
+            
+            # Convert to bytes
+            image_bytes = cover_file.getvalue()
+            
+            # For now, just skip cover upload since book_covers table may not exist
+            # This is a non-critical feature
+            return True
+            
+            Database.execute_update(query, values)
+            return True
+        except:
+            return False
+    
+    @staticmethod
+    def get_book_cover(book_id: int):
+        """Get book cover image"""
+        try:
+            # Skip cover retrieval for now
+            result = None
+            return result[0]['cover_image'] if result else None
+        except:
+            return None
+    
+    @staticmethod
+    def track_book_condition(book_id: int, condition: str, notes: str, user_id: int):
+        """Track book condition"""
+        try:
+            query = """
+                INSERT INTO book_conditions 
+                (book_id, condition_status, condition_notes, checked_by)
+                VALUES (%s, %s, %s, %s)
+            """
+            Database.execute_update(query, (book_id, condition, notes, user_id))
+            return True
+        except:
+            return False
+    
+    @staticmethod
+    def get_book_condition_history(book_id: int):
+        """Get book condition history"""
+        try:
+            return Database.execute_query("""
+                SELECT bc.*, u.full_name as checker_name
+                FROM book_conditions bc
+                LEFT JOIN users u ON bc.checked_by = u.user_id
+                WHERE bc.book_id = %s
+                ORDER BY bc.check_date DESC
+            """, (book_id,))
+        except:
+            return []
+    
+    @staticmethod
+    def create_author_profile(name: str, bio: str = "", birth_year: int = None,
+                            nationality: str = "", website: str = ""):
+        """Create author profile"""
+        try:
+            query = """
+                INSERT INTO author_profiles 
+                (author_name, author_bio, birth_year, nationality, website)
+                VALUES (%s, %s, %s, %s, %s)
+            """
+            Database.execute_update(query, (name, bio, birth_year, nationality, website))
+            return True
+        except:
+            return False
+    
+    @staticmethod
+    def get_author_profile(author_name: str):
+        """Get author profile"""
+        try:
+            result = Database.execute_query(
+                "SELECT * FROM author_profiles WHERE author_name = %s",
+                (author_name,)
+            )
+            return result[0] if result else None
+        except:
+            return None
+    
+    @staticmethod
+    def export_catalog_excel(books: List[Dict]):
+        """Export catalog to Excel"""
+        return excel_exporter.export_books(books)
+
+class EnhancedSearchFilter:
+    """Advanced search and filtering"""
+    
+    @staticmethod
+    def fuzzy_search_books(query: str, threshold: int = 60):
+        """Fuzzy search with typo tolerance"""
+        try:
+            ranked = fuzzy_search.search_catalog(query, threshold)
+            if not ranked:
+                return []
+            
+            books = Database.execute_query(
+                "SELECT * FROM books WHERE book_id IN (SELECT value FROM json_each(%s))",
+                (json.dumps([book_id for book_id, score in ranked]),)
+            ) or []
+            books_by_id = {book['book_id']: book for book in books}
+            return [books_by_id[book_id] for book_id, score in ranked if book_id in books_by_id]
+        except:
+            return []
+    
+    @staticmethod
+    def filtered_fuzzy_search(query: str, where_clause: str = "1=1", params: tuple = (),
+                              threshold: int = 60, limit: int = 100, offset: int = 0,
+                              columns: str = "b.*"):
+        """Fuzzy search over the books matching a structured filter.
+        
+        where_clause is a condition on books aliased as b. Filters run in SQL first,
+        only the surviving rows are fuzzy-scored, and the requested page is returned
+        ordered by score as (rows, matched_ids) with every match's id in score order.
+        """
+        try:
+            matching_ids = TrigramIndex.matching_ids(query)
+            if not matching_ids:
+                return [], []
+            
+            survivors = Database.execute_query(
+                f"""
+                SELECT b.book_id, b.title, b.author, b.genre, b.isbn
+                FROM books b
+                WHERE {where_clause} AND b.book_id IN (SELECT value FROM json_each(%s))
+                ORDER BY b.book_id
+                """,
+                tuple(params) + (json.dumps(matching_ids),)
+            ) or []
+            
+            ranked = fuzzy_search.search_books(query, survivors, threshold)
+            matched_ids = [book['book_id'] for book in ranked]
+            return CatalogPager.fetch_by_ids(columns, matched_ids[offset:offset + limit]), matched_ids
+        except:
+            return [], []
+    
+    @staticmethod
+    def advanced_multi_field_filter(title: str = "", author: str = "", genre: str = "",
+                                   year_from: int = None, year_to: int = None,
+                                   available_only: bool = False, min_pages: int = None,
+                                   max_pages: int = None, language: str = ""):
+        """Advanced multi-field filter"""
+        try:
+            conditions = []
+            params = []
+            
+            if title:
+                conditions.append("title LIKE %s")
+                params.append(f"%{title}%")
+            
+            if author:
+                conditions.append("author LIKE %s")
+                params.append(f"%{author}%")
+            
+            if genre:
+                conditions.append("genre = %s")
+                params.append(genre)
+            
+            if year_from:
+                conditions.append("publication_year >= %s")
+                params.append(year_from)
+            
+            if year_to:
+                conditions.append("publication_year <= %s")
+                params.append(year_to)
+            
+            if available_only:
+                conditions.append("available_copies > 0")
+            
+            if min_pages:
+                conditions.append("page_count >= %s")
+                params.append(min_pages)
+            
+            if max_pages:
+                conditions.append("page_count <= %s")
+                params.append(max_pages)
+            
+            if language:
+                conditions.append("language = %s")
+                params.append(language)
+            
+            where_clause = " AND ".join(conditions) if conditions else "1=1"
+            query = f"SELECT * FROM books WHERE {where_clause}"
+            
+            return Database.execute_query(query, tuple(params))
+        except:
+            return []
+    
+    @staticmethod
+    def sort_by_popularity():
+        """Sort books by popularity (decayed checkout score)"""
+        try:
+            return Database.execute_query("""
+                SELECT b.book_id, b.title, b.isbn, b.is_active,
+                       COALESCE(p.total_checkouts, 0) as borrow_count
+                FROM books b
+                LEFT JOIN book_popularity p ON p.book_id = b.book_id
+                WHERE b.is_active = 1
+                ORDER BY COALESCE(b.popularity_score, 0) DESC, b.book_id DESC
+                LIMIT 100
+            """)
+        except:
+            return []
+    
+    @staticmethod
+    def sort_by_date_added(order='DESC'):
+        """Sort books by date added"""
+        try:
+            if order.upper() not in ('ASC', 'DESC'):
+                order = 'DESC'
+            return Database.execute_query(f"""
+                SELECT b.book_id, b.title, b.created_at as date_added
+                FROM books b
+                WHERE b.is_active = 1
+                ORDER BY b.created_at {order}
+                LIMIT 100
+            """)
+        except Exception as e:
+            print(f"Error in sort_by_date_added: {e}")
+            return []
+    
+    @staticmethod
+    def keyword_search(keywords: List[str]):
+        """Keyword-based search"""
+        try:
+            conditions = []
+            params = []
+            
+            for keyword in keywords:
+                conditions.append("(title LIKE %s OR author LIKE %s OR keywords LIKE %s OR genre LIKE %s)")
+                params.extend([f"%{keyword}%"] * 4)
+            
+            where_clause = " OR ".join(conditions)
+            query = f"SELECT * FROM books WHERE {where_clause}"
+            
+            return Database.execute_query(query, tuple(params))
+        except:
+            return []
+
+class CatalogPager:
+    """Keyset (seek) pagination for catalog listings"""
+    
+    # sort mode -> (sort key expression, direction); book_id breaks ties
+    SORT_MODES = {
+        'title_asc': ("COALESCE(b.title, '')", 'ASC'),
+        'title_desc': ("COALESCE(b.title, '')", 'DESC'),
+        'year_desc': ("COALESCE(b.publication_year, 0)", 'DESC'),
+        'year_asc': ("COALESCE(b.publication_year, 0)", 'ASC'),
+        'popularity_desc': ("COALESCE(b.popularity_score, 0)", 'DESC'),
+        'popularity_asc': ("COALESCE(b.popularity_score, 0)", 'ASC'),
+        'added_desc': ("COALESCE(b.created_at, '')", 'DESC'),
+        'added_asc': ("COALESCE(b.created_at, '')", 'ASC'),
+    }
+    PAGE_SIZES = [10, 25, 50, 100]
+    
+    @staticmethod
+    def fetch_page(columns, where_clause="1=1", params=(), sort_mode='title_asc',
+                   page_size=25, cursor=None):
+        """Fetch one page after cursor, return (rows, next_cursor)"""
+        sort_expr, direction = CatalogPager.SORT_MODES.get(sort_mode, CatalogPager.SORT_MODES['title_asc'])
+        params = list(params)
+        
+        query = f"SELECT {columns}, {sort_expr} as seek_key FROM books b WHERE {where_clause}"
+        if cursor:
+            operator = '>' if direction == 'ASC' else '<'
+            # The single-column bound lets SQLite seek the expression index
+            query += f" AND {sort_expr} {operator}= ? AND ({sort_expr}, b.book_id) {operator} (?, ?)"
+            params.extend([cursor[0]] + list(cursor))
+        query += f" ORDER BY {sort_expr} {direction}, b.book_id {direction} LIMIT ?"
+        params.append(int(page_size) + 1)
+        
+        rows = Database.execute_query(query, tuple(params)) or []
+        next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            next_cursor = [rows[-1]['seek_key'], rows[-1]['book_id']]
+        for row in rows:
+            row.pop('seek_key', None)
+        return rows, next_cursor
+    
+    @staticmethod
+    def fetch_by_ids(columns, book_ids):
+        """Fetch rows for book_ids, keeping the given order"""
+        if not book_ids:
+            return []
+        rows = Database.execute_query(
+            f"SELECT {columns} FROM books b WHERE b.book_id IN (SELECT value FROM json_each(%s))",
+            (json.dumps(list(book_ids)),)
+        ) or []
+        rows_by_id = {row['book_id']: row for row in rows}
+        return [rows_by_id[book_id] for book_id in book_ids if book_id in rows_by_id]
+    
+    @staticmethod
+    def get_state(state_key, signature):
+        """Cursor stack for a listing, reset whenever its filters change"""
+        state = st.session_state.get(state_key)
+        if not state or state.get('signature') != signature:
+            state = {'signature': signature, 'cursors': [None]}
+            st.session_state[state_key] = state
+        return state
+    
+    @staticmethod
+    def render_controls(state_key, state, has_next):
+        """Previous/next buttons for a cursor stack"""
+        page_number = len(state['cursors'])
+        prev_col, page_col, next_col = st.columns([1, 2, 1], gap="small")
+        with prev_col:
+            if st.button("◀ Previous", key=f"{state_key}_prev", disabled=page_number <= 1, use_container_width=True):
+                state['cursors'].pop()
+                st.rerun()
+        with page_col:
+            st.caption(f"Page {page_number}")
+        with next_col:
+            if st.button("Next ▶", key=f"{state_key}_next", disabled=not has_next, use_container_width=True):
+                state['cursors'].append(state['next_cursor'])
+                st.rerun()
+
+def _like_contains(text):
+    """Matcher for SQLite's value LIKE '%text%': % and _ wildcards, ASCII-only case folding"""
+    pattern = "".join(
+        '.*' if char == '%' else '.' if char == '_' else re.escape(char)
+        for char in str(text)
+    )
+    matcher = re.compile(f".*{pattern}.*", re.ASCII | re.IGNORECASE | re.DOTALL)
+    return lambda value: value is not None and matcher.fullmatch(str(value)) is not None
+
+class CatalogSnapshot:
+    """Optional in-process columnar catalog snapshot for browse filters and sorts.
+    
+    Each book costs a few dozen bytes: fixed-width NumPy columns plus codes
+    into an interned string table for genre and language. The snapshot is kept
+    current from the catalog_changes feed; text search still goes to SQL.
+    
+    Title keys are the first TITLE_KEY_BYTES of the UTF-8 title, which sorts like
+    SQLite's BINARY collation; rows whose key fills the width carry a title_tie rank
+    so titles sharing a prefix still order by the full title, as the SQL pager does.
+    """
+    
+    TITLE_KEY_BYTES = 16
+    NULL_TS = -(2 ** 63)
+    # CatalogPager sort mode -> (column, direction)
+    SORT_KEYS = {
+        'title_asc': ('title_key', 'ASC'),
+        'title_desc': ('title_key', 'DESC'),
+        'year_desc': ('publication_year', 'DESC'),
+        'year_asc': ('publication_year', 'ASC'),
+        'popularity_desc': ('popularity_score', 'DESC'),
+        'popularity_asc': ('popularity_score', 'ASC'),
+        'added_desc': ('created_ts', 'DESC'),
+        'added_asc': ('created_ts', 'ASC'),
+    }
+    # sort key column -> secondary rank column ordered before book_id
+    TIE_COLUMNS = {'title_key': 'title_tie'}
+    SNAPSHOT_SQL = """
+        SELECT b.book_id, b.title, TRIM(b.genre) as genre,
+               COALESCE(NULLIF(TRIM(b.language), ''), 'Unknown') as language_name,
+               CASE WHEN typeof(b.publication_year) = 'integer' AND b.publication_year BETWEEN -2147483648 AND 2147483647
+                    THEN b.publication_year ELSE 0 END as publication_year,
+               COALESCE(b.popularity_score, 0) as popularity_score,
+               COALESCE(b.is_available, 0) as is_available,
+               COALESCE(CAST(ROUND((julianday(b.created_at) - 2440587.5) * 86400) AS INTEGER), -9223372036854775808) as created_ts,
+               b.total_copies, b.available_copies
+        FROM books b
+    """
+    
+    @staticmethod
+    @st.cache_resource(show_spinner=False)
+    def _state():
+        """Columns, string table and watermark shared by every session and kept across reruns"""
+        return SimpleNamespace(lock=threading.Lock(), columns=None, strings=[], string_codes={}, watermark=None)
+    
+    @classmethod
+    def watermark(cls):
+        """Last catalog_changes id applied, None until the index is built"""
+        return cls._state().watermark
+    
+    @staticmethod
+    def _intern(state, value):
+        value = value or ''
+        code = state.string_codes.get(value)
+        if code is None:
+            code = len(state.strings)
+            state.strings.append(value)
+            state.string_codes[value] = code
+        return code
+    
+    @classmethod
+    def _build_columns(cls, state, rows):
+        title_keys = [(row['title'] or '').encode('utf-8')[:cls.TITLE_KEY_BYTES] for row in rows]
+        return {
+            'book_id': np.fromiter((row['book_id'] for row in rows), dtype=np.int64, count=len(rows)),
+            'title_key': np.array(title_keys, dtype=f"S{cls.TITLE_KEY_BYTES}"),
+            'title_tie': np.zeros(len(rows), dtype=np.int32),
+            'genre_code': np.fromiter((cls._intern(state, row['genre']) for row in rows), dtype=np.int32, count=len(rows)),
+            'language_code': np.fromiter((cls._intern(state, row['language_name']) for row in rows), dtype=np.int32, count=len(rows)),
+            'publication_year': np.fromiter((row['publication_year'] for row in rows), dtype=np.int32, count=len(rows)),
+            'popularity_score': np.fromiter((row['popularity_score'] for row in rows), dtype=np.float64, count=len(rows)),
+            'is_available': np.fromiter((bool(row['is_available']) for row in rows), dtype=np.bool_, count=len(rows)),
+            'created_ts': np.fromiter((row['created_ts'] for row in rows), dtype=np.int64, count=len(rows)),
+            'total_copies': np.fromiter((row['total_copies'] for row in rows), dtype=np.int32, count=len(rows)),
+            'available_copies': np.fromiter((row['available_copies'] for row in rows), dtype=np.int32, count=len(rows)),
+        }
+    
+    @classmethod
+    def _title_groups(cls, rows):
+        """Book ids of full-width title keys, grouped by key and ordered by (title, book_id)"""
+        groups = {}
+        for row in rows:
+            title = (row['title'] or '').encode('utf-8')
+            if len(title) >= cls.TITLE_KEY_BYTES:
+                groups.setdefault(title[:cls.TITLE_KEY_BYTES], []).append((title, row['book_id']))
+        return [[book_id for title, book_id in sorted(members)] for members in groups.values()]
+    
+    @classmethod
+    def _regroup_titles(cls, keys):
+        """Reload the full-width title groups for keys from SQL, ordered like the pager"""
+        rows = Database.execute_query(
+            """
+            SELECT hex(substr(CAST(COALESCE(title, '') AS BLOB), 1, ?)) as key_hex, book_id
+            FROM books
+            WHERE hex(substr(CAST(COALESCE(title, '') AS BLOB), 1, ?)) IN (SELECT value FROM json_each(?))
+            ORDER BY COALESCE(title, ''), book_id
+            """,
+            (cls.TITLE_KEY_BYTES, cls.TITLE_KEY_BYTES, json.dumps([key.hex().upper() for key in keys]))
+        )
+        if rows is None:
+            return None
+        groups = {}
+        for row in rows:
+            groups.setdefault(row['key_hex'], []).append(row['book_id'])
+        return list(groups.values())
+    
+    @staticmethod
+    def _apply_title_ties(columns, groups):
+        """Set title_tie to each book's position within its title group"""
+        position = {book_id: rank for members in groups for rank, book_id in enumerate(members)}
+        if not position:
+            return
+        book_ids = columns['book_id']
+        rows = np.flatnonzero(np.isin(book_ids, np.fromiter(position, dtype=np.int64, count=len(position))))
+        columns['title_tie'][rows] = [position[book_id] for book_id in book_ids[rows].tolist()]
+    
+    @classmethod
+    def refresh(cls):
+        """Apply catalog changes since the last watermark; full load on first use"""
+        state = cls._state()
+        with state.lock:
+            latest = Database.execute_query(
+                "SELECT COALESCE(MAX(change_id), 0) as change_id FROM catalog_changes",
+                fetch_one=True
+            )
+            if latest is None:
+                return False
+            latest_id = int(latest['change_id'])
+            
+            if state.columns is None:
+                rows = Database.execute_query(cls.SNAPSHOT_SQL)
+                if rows is None:
+                    return False
+                columns = cls._build_columns(state, rows)
+                cls._apply_title_ties(columns, cls._title_groups(rows))
+                state.columns = columns
+                state.watermark = latest_id
+                return True
+            
+            if latest_id <= state.watermark:
+                return True
+            
+            changed = Database.execute_query(
+                "SELECT DISTINCT book_id FROM catalog_changes WHERE change_id > ? AND change_id <= ?",
+                (state.watermark, latest_id)
+            )
+            if changed is None:
+                return False
+            changed_ids = [row['book_id'] for row in changed]
+            rows = Database.execute_query(
+                cls.SNAPSHOT_SQL + " WHERE b.book_id IN (SELECT value FROM json_each(?))",
+                (json.dumps(changed_ids),)
+            )
+            if rows is None:
+                return False
+            
+            keep = ~np.isin(state.columns['book_id'], np.array(changed_ids, dtype=np.int64))
+            fresh = cls._build_columns(state, rows)
+            columns = {
+                name: np.concatenate([column[keep], fresh[name]])
+                for name, column in state.columns.items()
+            }
+            full_keys = {key for key in fresh['title_key'].tolist() if len(key) >= cls.TITLE_KEY_BYTES}
+            if full_keys:
+                groups = cls._regroup_titles(full_keys)
+                if groups is None:
+                    return False
+                cls._apply_title_ties(columns, groups)
+            state.columns = columns
+            state.watermark = latest_id
+            return True
+    
+    @staticmethod
+    def _codes_containing(state, text):
+        """Interned codes whose string matches LIKE '%text%'"""
+        matches = _like_contains(text)
+        return np.array(
+            [code for code, value in enumerate(state.strings) if value and matches(value)],
+            dtype=np.int32
+        )
+    
+    @classmethod
+    def query_page(cls, filters, sort_mode='title_asc', page_size=25, cursor=None):
+        """Filter and sort with vectorized masks; returns (book_ids, next_cursor) or None"""
+        if not cls.refresh():
+            return None
+        
+        state = cls._state()
+        with state.lock:
+            cols = state.columns
+            book_ids = cols['book_id']
+            mask = np.ones(len(book_ids), dtype=np.bool_)
+            
+            if filters.get('is_available') is not None:
+                mask &= cols['is_available'] == bool(filters['is_available'])
+            if filters.get('genre'):
+                mask &= cols['genre_code'] == state.string_codes.get(filters['genre'], -1)
+            if filters.get('genre_contains'):
+                mask &= np.isin(cols['genre_code'], cls._codes_containing(state, filters['genre_contains']))
+            if filters.get('language_contains'):
+                mask &= np.isin(cols['language_code'], cls._codes_containing(state, filters['language_contains']))
+            if filters.get('year_from'):
+                mask &= cols['publication_year'] >= int(filters['year_from'])
+            if filters.get('year_to'):
+                mask &= cols['publication_year'] <= int(filters['year_to'])
+            if filters.get('min_available_copies'):
+                mask &= cols['available_copies'] >= int(filters['min_available_copies'])
+            if filters.get('min_total_copies'):
+                mask &= cols['total_copies'] >= int(filters['min_total_copies'])
+            if filters.get('has_available_copy'):
+                mask &= cols['available_copies'] > 0
+            if filters.get('has_checked_out_copy'):
+                mask &= cols['total_copies'] > cols['available_copies']
+            if filters.get('popularity_min') is not None:
+                mask &= cols['popularity_score'] >= float(filters['popularity_min'])
+            if filters.get('popularity_max') is not None:
+                mask &= cols['popularity_score'] <= float(filters['popularity_max'])
+            if filters.get('added_from') or filters.get('added_to'):
+                created_day = cols['created_ts'] // 86400
+                epoch = date(1970, 1, 1)
+                mask &= cols['created_ts'] != cls.NULL_TS
+                if filters.get('added_from'):
+                    mask &= created_day >= (filters['added_from'] - epoch).days
+                if filters.get('added_to'):
+                    mask &= created_day <= (filters['added_to'] - epoch).days
+            
+            key_name, direction = cls.SORT_KEYS.get(sort_mode, cls.SORT_KEYS['title_asc'])
+            keys = cols[key_name]
+            tie_name = cls.TIE_COLUMNS.get(key_name)
+            ties = cols[tie_name] if tie_name else np.zeros(len(book_ids), dtype=np.int32)
+            if cursor:
+                last_key, last_tie, last_id = keys.dtype.type(cursor[0]), int(cursor[1]), int(cursor[2])
+                if direction == 'ASC':
+                    after_tie = (ties > last_tie) | ((ties == last_tie) & (book_ids > last_id))
+                    mask &= (keys > last_key) | ((keys == last_key) & after_tie)
+                else:
+                    after_tie = (ties < last_tie) | ((ties == last_tie) & (book_ids < last_id))
+                    mask &= (keys < last_key) | ((keys == last_key) & after_tie)
+            
+            matched = np.flatnonzero(mask)
+            order = np.lexsort((book_ids[matched], ties[matched], keys[matched]))
+            if direction == 'DESC':
+                order = order[::-1]
+            page = matched[order[:int(page_size) + 1]]
+            
+            next_cursor = None
+            if len(page) > page_size:
+                page = page[:page_size]
+                last = page[-1]
+                next_cursor = [keys[last].item(), int(ties[last]), int(book_ids[last])]
+            return book_ids[page].tolist(), next_cursor
+
+class BitmapIndex:
+    """Per-value bitsets over book ids for low-cardinality catalog filters.
+    
+    Bitsets are Python ints (bit n set = book_id n is in the set), so AND/OR run
+    in C over machine words. Kept current from the catalog_changes feed.
+    """
+    
+    MAX_INLINE_IDS = 20000
+    BITMAP_SQL = """
+        SELECT b.book_id, b.is_available, b.genre,
+               COALESCE(NULLIF(TRIM(b.language), ''), 'Unknown') as language_name,
+               b.available_copies > 0 as has_available,
+               b.total_copies > b.available_copies as has_checked_out
+        FROM books b
+    """
+    
+    @staticmethod
+    @st.cache_resource(show_spinner=False)
+    def _state():
+        """Bitsets and watermark shared by every session and kept across reruns"""
+        return SimpleNamespace(lock=threading.Lock(), bitmaps={}, watermark=None)
+    
+    @classmethod
+    def watermark(cls):
+        """Last catalog_changes id applied, None until the index is built"""
+        return cls._state().watermark
+    
+    @staticmethod
+    def ids_to_bits(book_ids):
+        """Pack book ids into an int bitset"""
+        if not book_ids:
+            return 0
+        flags = np.zeros(max(book_ids) + 1, dtype=np.bool_)
+        flags[np.asarray(book_ids, dtype=np.int64)] = True
+        return int.from_bytes(np.packbits(flags, bitorder='little').tobytes(), 'little')
+    
+    @staticmethod
+    def bits_to_ids(bits):
+        """Unpack an int bitset into sorted book ids"""
+        if not bits:
+            return []
+        packed = np.frombuffer(bits.to_bytes((bits.bit_length() + 7) // 8, 'little'), dtype=np.uint8)
+        return np.flatnonzero(np.unpackbits(packed, bitorder='little')).tolist()
+    
+    @staticmethod
+    def _keys_for(row):
+        keys = [('genre', row['genre']), ('language', row['language_name'])]
+        if row['is_available'] is not None:
+            keys.append(('active', int(bool(row['is_available']))))
+        if row['has_available']:
+            keys.append(('inventory', 'has_available'))
+        if row['has_checked_out']:
+            keys.append(('inventory', 'has_checked_out'))
+        return [key for key in keys if key[1] is not None]
+    
+    @classmethod
+    def _add_rows(cls, state, rows):
+        members = {}
+        for row in rows:
+            for key in cls._keys_for(row):
+                members.setdefault(key, []).append(row['book_id'])
+        for key, book_ids in members.items():
+            state.bitmaps[key] = state.bitmaps.get(key, 0) | cls.ids_to_bits(book_ids)
+    
+    @classmethod
+    def refresh(cls):
+        """Apply catalog changes since the last watermark; full build on first use"""
+        state = cls._state()
+        with state.lock:
+            latest = Database.execute_query(
+                "SELECT COALESCE(MAX(change_id), 0) as change_id FROM catalog_changes",
+                fetch_one=True
+            )
+            if latest is None:
+                return False
+            latest_id = int(latest['change_id'])
+            
+            if state.watermark is None:
+                rows = Database.execute_query(cls.BITMAP_SQL)
+                if rows is None:
+                    return False
+                state.bitmaps = {}
+                cls._add_rows(state, rows)
+                state.watermark = latest_id
+                return True
+            
+            if latest_id <= state.watermark:
+                return True
+            
+            changed = Database.execute_query(
+                "SELECT DISTINCT book_id FROM catalog_changes WHERE change_id > ? AND change_id <= ? AND change_type <> 'popularity'",
+                (state.watermark, latest_id)
+            )
+            rows = Database.execute_query(
+                cls.BITMAP_SQL + " WHERE b.book_id IN (SELECT value FROM json_each(?))",
+                (json.dumps([row['book_id'] for row in changed or []]),)
+            )
+            if changed is None or rows is None:
+                return False
+            
+            # Clear the changed books from every bitset, then re-add their current state
+            cleared = ~cls.ids_to_bits([row['book_id'] for row in changed])
+            state.bitmaps = {key: bits & cleared for key, bits in state.bitmaps.items()}
+            cls._add_rows(state, rows)
+            state.bitmaps = {key: bits for key, bits in state.bitmaps.items() if bits}
+            state.watermark = latest_id
+            return True
+    
+    @staticmethod
+    def _union_containing(state, attribute, text):
+        """OR of the bitsets whose value matches LIKE '%text%'"""
+        matches = _like_contains(text)
+        bits = 0
+        for (key_attribute, value), value_bits in state.bitmaps.items():
+            if key_attribute == attribute and matches(value):
+                bits |= value_bits
+        return bits
+    
+    @classmethod
+    def matching_ids(cls, genre_contains="", language_contains="", status="All"):
+        """AND of the requested predicates as sorted book ids, or None if none apply"""
+        status_keys = {
+            "Active": ('active', 1),
+            "Inactive": ('active', 0),
+            "Available Copies Only": ('inventory', 'has_available'),
+            "Checked Out Only": ('inventory', 'has_checked_out'),
+        }
+        if not (genre_contains or language_contains or status in status_keys):
+            return None
+        if not cls.refresh():
+            return None
+        
+        state = cls._state()
+        with state.lock:
+            result = None
+            if genre_contains:
+                result = cls._union_containing(state, 'genre', genre_contains)
+            if language_contains:
+                bits = cls._union_containing(state, 'language', language_contains)
+                result = bits if result is None else result & bits
+            if status in status_keys:
+                bits = state.bitmaps.get(status_keys[status], 0)
+                result = bits if result is None else result & bits
+        return cls.bits_to_ids(result)
+
+class CatalogFacets:
+    """Materialized facet counts for catalog filters"""
+    
+    # facet -> value expression over a books row aliased {row}
+    FACET_EXPRESSIONS = {
+        'genre': "COALESCE(NULLIF(TRIM({row}.genre), ''), 'Unknown')",
+        'language': "COALESCE(NULLIF(TRIM({row}.language), ''), 'Unknown')",
+        'decade': "CASE WHEN {row}.publication_year IS NULL THEN 'Unknown' ELSE (({row}.publication_year / 10) * 10) || 's' END",
+        'availability': (
+            "CASE WHEN EXISTS (SELECT 1 FROM book_inventory fi WHERE fi.book_id = {row}.book_id AND fi.is_available = 1) "
+            "THEN 'available' ELSE 'unavailable' END"
+        ),
+    }
+    AVAILABILITY_LABELS = {'available': 'Copies Available', 'unavailable': 'No Copy Available'}
+    
+    @staticmethod
+    def rebuild_sql():
+        """Single INSERT recomputing every facet count from books"""
+        selects = [
+            f"SELECT '{facet}', {expr.format(row='b')}, COUNT(*) FROM books b GROUP BY 2"
+            for facet, expr in CatalogFacets.FACET_EXPRESSIONS.items()
+        ]
+        return "INSERT INTO catalog_facets (facet, value, book_count) " + " UNION ALL ".join(selects)
+    
+    @staticmethod
+    def rebuild():
+        """Recompute the materialized counts in one transaction (reconciliation)"""
+        return Database.execute_batch([
+            ("DELETE FROM catalog_facets", None),
+            (CatalogFacets.rebuild_sql(), None),
+        ])
+    
+    @staticmethod
+    def global_counts(facet):
+        """Materialized counts for one facet as [{'value', 'book_count'}]"""
+        return Database.execute_query(
+            """
+            SELECT value, book_count FROM catalog_facets
+            WHERE facet = ? AND book_count > 0
+            ORDER BY value
+            """,
+            (facet,)
+        ) or []
+    
+    @staticmethod
+    def filtered_counts(where_clause="1=1", params=()):
+        """Facet counts for the books matching where_clause, computed in one pass"""
+        expressions = [expr.format(row='b') for expr in CatalogFacets.FACET_EXPRESSIONS.values()]
+        facets = list(CatalogFacets.FACET_EXPRESSIONS)
+        aliases = [f"facet_{facet}" for facet in facets]
+        select_list = ", ".join(f"{expr} as {alias}" for expr, alias in zip(expressions, aliases))
+        rows = Database.execute_query(
+            f"""
+            SELECT {select_list}, COUNT(*) as book_count
+            FROM books b
+            WHERE {where_clause}
+            GROUP BY {", ".join(aliases)}
+            """,
+            tuple(params)
+        ) or []
+        
+        counts = {facet: Counter() for facet in facets}
+        for row in rows:
+            for facet, alias in zip(facets, aliases):
+                counts[facet][row[alias]] += row['book_count']
+        return counts
+    
+    @staticmethod
+    def render_counts(counts, top_n=8):
+        """Compact facet summary for a result set"""
+        for facet, values in counts.items():
+            if not values:
+                continue
+            labels = [
+                f"{CatalogFacets.AVAILABILITY_LABELS.get(value, value)} ({count})"
+                for value, count in values.most_common(top_n)
+            ]
+            st.caption(f"**{facet.title()}:** " + " · ".join(labels))
+
+class DailyStats:
+    """Per-day report aggregates kept current by triggers on borrowing and users"""
+
+    COUNTERS = ('checkouts', 'returns', 'new_members', 'active_members', 'fines_amount', 'fines_count')
+    BOOK_SQL = "COALESCE({row}.book_id, (SELECT book_id FROM book_inventory WHERE inventory_id = {row}.inventory_id))"
+    # Blank tiers count under the users.member_tier column default
+    TIER_SQL = "COALESCE(NULLIF(TRIM({row}.member_tier), ''), 'bronze')"
+
+    @staticmethod
+    def _upsert(day, dimension, value, counters, sources=(), where="1", grouped=False):
+        """INSERT ... ON CONFLICT adding counters onto the (day, dimension, value) row"""
+        exprs = [str(counters.get(column, 0)) for column in DailyStats.COUNTERS]
+        if grouped:
+            exprs = [f"SUM({expr})" for expr in exprs]
+        from_clause = f" FROM {', '.join(sources)}" if sources else ""
+        group_clause = " GROUP BY 1, 2, 3" if grouped else ""
+        return (
+            f"INSERT INTO daily_stats (day, dimension, dimension_value, {', '.join(DailyStats.COUNTERS)}) "
+            f"SELECT {day}, {dimension}, {value}, {', '.join(exprs)}{from_clause} "
+            f"WHERE {day} IS NOT NULL AND {where}{group_clause} "
+            f"ON CONFLICT (day, dimension, dimension_value) DO UPDATE SET "
+            + ", ".join(f"{column} = {column} + excluded.{column}" for column in DailyStats.COUNTERS)
+            + ";"
+        )
+
+    @staticmethod
+    def row_sql(kind, row, sign=1):
+        """Statements adding (sign=1) or removing (sign=-1) one row's contribution.
+
+        row is NEW/OLD inside a trigger, or a table alias (br / u) to aggregate the
+        whole table, which is how the backfill is built.
+        """
+        grouped = row not in ('NEW', 'OLD')
+        if kind == 'checkout':
+            day = f"date({row}.checkout_date)"
+            table = [f"borrowing {row}"] if grouped else []
+            genre_sources = table + ["book_genres bg JOIN genres g ON g.genre_id = bg.genre_id"]
+            book_match = f"bg.book_id = {DailyStats.BOOK_SQL.format(row=row)}"
+            return [
+                DailyStats._upsert(day, "'all'", "''", {'checkouts': sign}, table, grouped=grouped),
+                DailyStats._upsert(day, "'genre'", "g.genre_name", {'checkouts': sign}, genre_sources, book_match, grouped),
+            ]
+        if kind == 'return':
+            fine = f"COALESCE({row}.fine_amount, 0)"
+            counters = {'returns': sign, 'fines_amount': f"{sign} * {fine}", 'fines_count': f"{sign} * ({fine} > 0)"}
+            table = [f"borrowing {row}"] if grouped else []
+            return [DailyStats._upsert(f"date({row}.return_date)", "'all'", "''", counters, table, grouped=grouped)]
+        if kind == 'member':
+            day = f"date({row}.created_at)"
+            is_member = f"{row}.role = 'member'"
+            active = f"{sign} * (COALESCE({row}.is_active, 0) = 1)"
+            table = [f"users {row}"] if grouped else []
+            tier = DailyStats.TIER_SQL.format(row=row)
+            # Tier totals span all days, so members without a join date land on the '' day
+            tier_day = f"COALESCE({day}, '')"
+            return [
+                DailyStats._upsert(day, "'all'", "''", {'new_members': sign}, table, is_member, grouped),
+                DailyStats._upsert(tier_day, "'tier'", tier, {'new_members': sign, 'active_members': active}, table, is_member, grouped),
+            ]
+        raise ValueError(f"Unknown daily stats source: {kind}")
+
+    @staticmethod
+    def rebuild_statements():
+        """Statements recomputing daily_stats from borrowing and users"""
+        return (
+            ["DELETE FROM daily_stats"]
+            + DailyStats.row_sql('checkout', 'br')
+            + DailyStats.row_sql('return', 'br')
+            + DailyStats.row_sql('member', 'u')
+        )
+
+    @staticmethod
+    def rebuild():
+        """Recompute the aggregates in one transaction (reconciliation)"""
+        return Database.execute_batch([(sql, None) for sql in DailyStats.rebuild_statements()])
+
+    @staticmethod
+    def totals(start_day, end_day):
+        """Library-wide counters summed over [start_day, end_day], None if the query fails"""
+        row = Database.execute_query(
+            """
+            SELECT COALESCE(SUM(checkouts), 0) as checkouts,
+                   COALESCE(SUM(returns), 0) as returns,
+                   COALESCE(SUM(new_members), 0) as new_members,
+                   COALESCE(SUM(fines_amount), 0) as fines_amount,
+                   COALESCE(SUM(fines_count), 0) as fines_count
+            FROM daily_stats
+            WHERE day BETWEEN ? AND ? AND dimension = 'all'
+            """,
+            (str(start_day), str(end_day)), fetch_one=True
+        )
+        return row
+
+    @staticmethod
+    def daily(start_day, end_day, column):
+        """[{'date', column}] for the days in range where column is non-zero, None if the query fails"""
+        if column not in DailyStats.COUNTERS:
+            raise ValueError(f"Unknown daily stats column: {column}")
+        return Database.execute_query(
+            f"""
+            SELECT day as date, {column}, fines_count
+            FROM daily_stats
+            WHERE day BETWEEN ? AND ? AND dimension = 'all' AND {column} <> 0
+            ORDER BY day
+            """,
+            (str(start_day), str(end_day))
+        )
+
+    @staticmethod
+    def series(start_day, end_day, columns):
+        """Library-wide rows for every recorded day in range, oldest first"""
+        unknown = [column for column in columns if column not in DailyStats.COUNTERS]
+        if unknown:
+            raise ValueError(f"Unknown daily stats column: {unknown[0]}")
+        return Database.execute_query(
+            f"""
+            SELECT day as date, {', '.join(columns)}
+            FROM daily_stats
+            WHERE day BETWEEN ? AND ? AND dimension = 'all'
+            ORDER BY day
+            """,
+            (str(start_day), str(end_day))
+        ) or []
+
+    @staticmethod
+    def monthly(column, months=12):
+        """[{'month', 'total'}] for the latest months with a non-zero column, None if the query fails"""
+        if column not in DailyStats.COUNTERS:
+            raise ValueError(f"Unknown daily stats column: {column}")
+        return Database.execute_query(
+            f"""
+            SELECT substr(day, 1, 7) as month, SUM({column}) as total
+            FROM daily_stats
+            WHERE dimension = 'all'
+            GROUP BY substr(day, 1, 7)
+            HAVING SUM({column}) <> 0
+            ORDER BY month DESC
+            LIMIT ?
+            """,
+            (months,)
+        )
+
+    @staticmethod
+    def dimension_totals(dimension, column):
+        """{dimension_value: total} of column across all days"""
+        if column not in DailyStats.COUNTERS:
+            raise ValueError(f"Unknown daily stats column: {column}")
+        rows = Database.execute_query(
+            f"""
+            SELECT dimension_value, SUM({column}) as total
+            FROM daily_stats
+            WHERE dimension = ?
+            GROUP BY dimension_value
+            """,
+            (dimension,)
+        ) or []
+        return {row['dimension_value']: row['total'] for row in rows}
+
+class LoanDates:
+    """Integer day numbers (days since 1970-01-01, UTC) stored beside the free-form loan date text"""
+
+    EPOCH = date(1970, 1, 1)
+    TODAY = "CAST(julianday(date('now')) - 2440587.5 AS INTEGER)"
+    BACKFILL_CHUNK = 5000
+    # table -> (primary key, {day column: source text column})
+    COLUMNS = {
+        'borrowing': ('borrowing_id', {
+            'checkout_day': 'checkout_date', 'due_day': 'due_date', 'return_day': 'return_date'
+        }),
+        'transactions': ('transaction_id', {
+            'transaction_day': 'transaction_date', 'due_day': 'due_date', 'return_day': 'return_date'
+        }),
+    }
+
+    @staticmethod
+    def day_sql(*modifiers):
+        """SQL day number of date(<modifiers>): a column, or constants such as "'now'", "'-30 days'" """
+        return f"CAST(julianday(date({', '.join(modifiers)})) - 2440587.5 AS INTEGER)"
+
+    @staticmethod
+    def now_sql(*modifiers):
+        """SQL day number of date('now', <modifiers>), e.g. now_sql('-30 days') or now_sql('start of month')"""
+        return LoanDates.day_sql("'now'", *(f"'{modifier}'" for modifier in modifiers))
+
+    @staticmethod
+    def day_number(value=None):
+        """Python day number for a date, datetime or ISO string (today when omitted)"""
+        if value is None:
+            value = datetime.now(ZoneInfo("UTC")).date()
+        elif isinstance(value, str):
+            value = date.fromisoformat(value.strip()[:10])
+        elif isinstance(value, datetime):
+            value = value.date()
+        return (value - LoanDates.EPOCH).days
+
+    @staticmethod
+    def from_day_number(day):
+        return LoanDates.EPOCH + timedelta(days=int(day))
+
+    @staticmethod
+    def assignments(table):
+        pk, columns = LoanDates.COLUMNS[table]
+        return ', '.join(f"{day} = {LoanDates.day_sql(source)}" for day, source in columns.items())
+
+    @staticmethod
+    def trigger_sql():
+        """Triggers keeping the day columns in step with inserts and date edits"""
+        triggers = {}
+        for table, (pk, columns) in LoanDates.COLUMNS.items():
+            update = f"UPDATE {table} SET {LoanDates.assignments(table)} WHERE {pk} = NEW.{pk};"
+            triggers[f'trg_{table}_days_insert'] = f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_days_insert
+                AFTER INSERT ON {table}
+                BEGIN
+                    {update}
+                END
+            '''
+            triggers[f'trg_{table}_days_update'] = f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_days_update
+                AFTER UPDATE OF {', '.join(columns.values())} ON {table}
+                BEGIN
+                    {update}
+                END
+            '''
+        return triggers
+
+    @staticmethod
+    def backfill(conn, table):
+        """Fill the day columns in primary-key chunks, committing between chunks to keep write locks short"""
+        pk, columns = LoanDates.COLUMNS[table]
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT MIN({pk}), MAX({pk}) FROM {table}")
+        low, high = cursor.fetchone()
+        if low is None:
+            return
+        sql = f"UPDATE {table} SET {LoanDates.assignments(table)} WHERE {pk} >= ? AND {pk} < ?"
+        for start in range(low, high + 1, LoanDates.BACKFILL_CHUNK):
+            cursor.execute(sql, (start, start + LoanDates.BACKFILL_CHUNK))
+            conn.commit()
+
+class KpiCounters:
+    """Single-row dashboard KPIs: trigger-maintained counts plus job-refreshed time metrics"""
+
+    # table -> {counter column: contribution of one row aliased {row}}
+    CONTRIBUTIONS = {
+        'users': {
+            'total_users': "1",
+            'active_users': "{row}.is_active = 1",
+            'total_members': "{row}.role = 'member'",
+            'active_members': "{row}.role = 'member' AND {row}.is_active = 1",
+            'total_admins': "{row}.role IN ('admin', 'librarian')",
+            'users_with_fines': "{row}.fine_balance > 0",
+            'fine_balance_total': "{row}.fine_balance",
+        },
+        'books': {
+            'total_books': "1",
+            'available_books': "{row}.is_available = 1",
+        },
+        'book_inventory': {
+            'total_inventory': "1",
+            'available_inventory': "{row}.is_available = 1",
+        },
+        'borrowing': {
+            'total_borrowings': "1",
+            'active_borrowings': "{row}.return_date IS NULL",
+            'returned_borrowings': "{row}.return_date IS NOT NULL",
+            'on_time_returns': "{row}.return_date IS NOT NULL AND {row}.return_day <= {row}.due_day",
+        },
+        'fines': {
+            'fines_paid': "CASE WHEN {row}.status = 'paid' THEN {row}.fine_amount END",
+            'fines_pending': "CASE WHEN {row}.status = 'pending' THEN {row}.fine_amount END",
+        },
+    }
+    # counter column -> (table, column) whose distinct non-NULL values it counts. A row
+    # contributes 1 while no other row shares its value, which keeps trigger deltas exact.
+    DISTINCT_COUNTS = {
+        'distinct_authors': ('books', 'author'),
+        'distinct_genres': ('books', 'genre'),
+    }
+    # Columns whose updates can move a row between counters
+    TRACKED_COLUMNS = {
+        'users': ('role', 'is_active', 'fine_balance'),
+        'books': ('is_available', 'author', 'genre'),
+        'book_inventory': ('is_available',),
+        'borrowing': ('return_date', 'return_day', 'due_day'),
+        'fines': ('status', 'fine_amount'),
+    }
+    # Metrics that drift with the clock (or need DISTINCT) are recomputed by the refresh job
+    REFRESHED = {
+        'overdue_borrowings': f"SELECT COUNT(*) FROM borrowing WHERE return_date IS NULL AND due_day < {LoanDates.TODAY}",
+        'active_borrowers_7d': f"SELECT COUNT(DISTINCT user_id) FROM borrowing WHERE checkout_day >= {LoanDates.now_sql('-7 days')}",
+        'active_borrowers_30d': f"SELECT COUNT(DISTINCT user_id) FROM borrowing WHERE checkout_day >= {LoanDates.now_sql('-30 days')}",
+    }
+
+    @staticmethod
+    def _contribution(expr, row):
+        return f"COALESCE({expr.format(row=row)}, 0)"
+
+    @staticmethod
+    def contributions(table):
+        """{counter column: contribution expression} for one table, distinct counters included"""
+        contributions = dict(KpiCounters.CONTRIBUTIONS[table])
+        for column, (source, value) in KpiCounters.DISTINCT_COUNTS.items():
+            if source == table:
+                contributions[column] = (
+                    f"{{row}}.{value} IS NOT NULL AND NOT EXISTS "
+                    f"(SELECT 1 FROM {table} o WHERE o.{value} = {{row}}.{value} AND o.rowid <> {{row}}.rowid)"
+                )
+        return contributions
+
+    @staticmethod
+    def delta_sql(table, added_row=None, removed_row=None):
+        """UPDATE adding one row's contribution and/or removing another's"""
+        assignments = []
+        for column, expr in KpiCounters.contributions(table).items():
+            delta = []
+            if added_row:
+                delta.append(f"+ {KpiCounters._contribution(expr, added_row)}")
+            if removed_row:
+                delta.append(f"- {KpiCounters._contribution(expr, removed_row)}")
+            assignments.append(f"{column} = {column} {' '.join(delta)}")
+        return f"UPDATE kpi_counters SET {', '.join(assignments)} WHERE kpi_id = 1;"
+
+    @staticmethod
+    def trigger_sql():
+        """{trigger name: CREATE TRIGGER} keeping the counters in step with their tables"""
+        triggers = {}
+        for table, columns in KpiCounters.TRACKED_COLUMNS.items():
+            changed = " OR ".join(f"OLD.{column} IS NOT NEW.{column}" for column in columns)
+            events = {
+                'insert': ("AFTER INSERT", "", KpiCounters.delta_sql(table, added_row='NEW')),
+                'update': (f"AFTER UPDATE OF {', '.join(columns)}", f"WHEN {changed}",
+                           KpiCounters.delta_sql(table, added_row='NEW', removed_row='OLD')),
+                'delete': ("AFTER DELETE", "", KpiCounters.delta_sql(table, removed_row='OLD')),
+            }
+            for event, (timing, condition, body) in events.items():
+                name = f"trg_kpi_{table}_{event}"
+                triggers[name] = f'''
+                CREATE TRIGGER IF NOT EXISTS {name}
+                {timing} ON {table}
+                {condition}
+                BEGIN
+                    {body}
+                END
+            '''
+        return triggers
+
+    @staticmethod
+    def refresh_sql():
+        """UPDATE recomputing the clock-dependent metrics"""
+        assignments = [f"{column} = ({query})" for column, query in KpiCounters.REFRESHED.items()]
+        return f"UPDATE kpi_counters SET {', '.join(assignments)}, refreshed_at = CURRENT_TIMESTAMP WHERE kpi_id = 1"
+
+    @staticmethod
+    def rebuild_sql():
+        """UPDATE recomputing every trigger-maintained counter from its table"""
+        assignments = [
+            f"{column} = (SELECT COALESCE(SUM({KpiCounters._contribution(expr, 't')}), 0) FROM {table} t)"
+            for table, contributions in KpiCounters.CONTRIBUTIONS.items()
+            for column, expr in contributions.items()
+        ] + [
+            f"{column} = (SELECT COUNT(DISTINCT {value}) FROM {table})"
+            for column, (table, value) in KpiCounters.DISTINCT_COUNTS.items()
+        ]
+        return f"UPDATE kpi_counters SET {', '.join(assignments)} WHERE kpi_id = 1"
+
+    @staticmethod
+    def refresh():
+        """Recompute overdue and other time-based metrics (scheduler job)"""
+        return Database.execute_update(KpiCounters.refresh_sql())
+
+    @staticmethod
+    def rebuild():
+        """Recompute all counters (reconciliation)"""
+        return Database.execute_batch([(KpiCounters.rebuild_sql(), None), (KpiCounters.refresh_sql(), None)])
+
+    @staticmethod
+    def get():
+        """The KPI row as a dict, with zeros if it cannot be read"""
+        row = Database.execute_query("SELECT * FROM kpi_counters WHERE kpi_id = 1", fetch_one=True)
+        if row:
+            return row
+        columns = [column for contributions in KpiCounters.CONTRIBUTIONS.values() for column in contributions]
+        return {column: 0 for column in columns + list(KpiCounters.DISTINCT_COUNTS) + list(KpiCounters.REFRESHED)}
+
+class LoanKpiEngine:
+    """Every loan metric from one conditional-aggregation pass over borrowing"""
+
+    # metric -> CASE condition over the LoanDates day columns, so idx_borrowing_open_due,
+    # idx_borrowing_checkout_day and idx_borrowing_return_day can serve the ranges
+    COUNT_METRICS = {
+        'active_loans': "return_date IS NULL",
+        'overdue_loans': "return_date IS NULL AND due_day < :today",
+        'due_today': "return_date IS NULL AND due_day = :today",
+        'due_soon': "return_date IS NULL AND due_day BETWEEN :today AND :soon_end",
+        'due_this_week': "return_date IS NULL AND due_day BETWEEN :today AND :week_end",
+        'today_checkouts': "checkout_day = :today",
+        'today_returns': "return_day = :today",
+        'window_checkouts': "checkout_day >= :window_start",
+        'window_returns': "return_day >= :window_start",
+    }
+    SUM_METRICS = {
+        'today_fines': ("fine_amount", "return_day = :today"),
+        'window_fines': ("fine_amount", "return_day >= :window_start"),
+    }
+
+    @staticmethod
+    def bounds(due_soon_days=3, window_days=0):
+        """Named day-number parameters for the metric conditions (UTC days, like SQLite's 'now')
+
+        The window_* metrics cover the last window_days days (today only by default);
+        window_days=None asks for all time, which has to scan every loan.
+        """
+        today = LoanDates.day_number()
+        window_start = today - int(window_days) if window_days is not None else LoanDates.day_number(date.min)
+        return {
+            'today': today,
+            'soon_end': today + int(due_soon_days),
+            'week_end': today + 7,
+            'window_start': window_start,
+            'scan_start': min(today, window_start),
+        }
+
+    @staticmethod
+    def query_sql(user_filter=False):
+        columns = [
+            f"COALESCE(SUM(CASE WHEN {condition} THEN 1 ELSE 0 END), 0) as {name}"
+            for name, condition in LoanKpiEngine.COUNT_METRICS.items()
+        ] + [
+            f"COALESCE(SUM(CASE WHEN {condition} THEN COALESCE({column}, 0) ELSE 0 END), 0) as {name}"
+            for name, (column, condition) in LoanKpiEngine.SUM_METRICS.items()
+        ]
+        # Only open loans and rows touched inside the window can contribute
+        where = "(return_date IS NULL OR checkout_day >= :scan_start OR return_day >= :scan_start)"
+        if user_filter:
+            where += " AND user_id = :user_id"
+        return f"SELECT {', '.join(columns)} FROM borrowing WHERE {where}"
+
+    @staticmethod
+    def compute(due_soon_days=3, window_days=0, user_id=None):
+        """{metric: value} for the whole library, or for one member when user_id is given"""
+        params = LoanKpiEngine.bounds(due_soon_days, window_days)
+        if user_id is not None:
+            params['user_id'] = user_id
+        row = Database.execute_query(LoanKpiEngine.query_sql(user_id is not None), params, fetch_one=True)
+        if not row:
+            row = {name: 0 for name in list(LoanKpiEngine.COUNT_METRICS) + list(LoanKpiEngine.SUM_METRICS)}
+        return row
+
+class MemberStats:
+    """Per-member borrowing totals, reading days and genre counts kept in step by borrowing triggers"""
+
+    # counter column -> contribution of one borrowing row aliased {row}; reading days are
+    # stored as closed-loan days plus the open loans' checkout days so "today" is applied on read
+    CONTRIBUTIONS = {
+        'total_borrowed': "1",
+        'total_returned': "{row}.return_day IS NOT NULL",
+        'currently_borrowed': "{row}.return_day IS NULL",
+        'closed_reading_days': "{row}.return_day - {row}.checkout_day",
+        'open_dated_loans': "{row}.return_day IS NULL AND {row}.checkout_day IS NOT NULL",
+        'open_checkout_day_sum': "CASE WHEN {row}.return_day IS NULL THEN {row}.checkout_day END",
+        'total_fines': "{row}.fine_amount",
+    }
+    # The day columns are written by the LoanDates triggers, so date edits arrive through them
+    TRACKED_COLUMNS = ('user_id', 'checkout_day', 'return_day', 'fine_amount')
+    LAST_ACTIVITY_SQL = "MAX({row}.checkout_date, COALESCE({row}.return_date, ''))"
+    GENRE_SQL = "COALESCE((SELECT genre FROM books WHERE book_id = {row}.book_id), '')"
+
+    @staticmethod
+    def delta_sql(row, sign):
+        """Upsert adding (sign 1) or removing (sign -1) one borrowing row's contribution"""
+        columns = list(MemberStats.CONTRIBUTIONS)
+        values = [f"{sign} * COALESCE({expr.format(row=row)}, 0)" for expr in MemberStats.CONTRIBUTIONS.values()]
+        last_activity = MemberStats.LAST_ACTIVITY_SQL.format(row=row) if sign > 0 else "NULL"
+        updates = [f"{column} = {column} + excluded.{column}" for column in columns]
+        return f'''INSERT INTO member_stats (user_id, {', '.join(columns)}, last_activity_at, updated_at)
+                    VALUES ({row}.user_id, {', '.join(values)}, {last_activity}, CURRENT_TIMESTAMP)
+                    ON CONFLICT(user_id) DO UPDATE SET {', '.join(updates)},
+                        last_activity_at = NULLIF(MAX(COALESCE(last_activity_at, ''), COALESCE(excluded.last_activity_at, '')), ''),
+                        updated_at = excluded.updated_at;'''
+
+    @staticmethod
+    def genre_delta_sql(row, sign):
+        return f'''INSERT INTO member_genre_stats (user_id, genre, borrow_count)
+                    VALUES ({row}.user_id, {MemberStats.GENRE_SQL.format(row=row)}, {sign})
+                    ON CONFLICT(user_id, genre) DO UPDATE SET borrow_count = borrow_count + excluded.borrow_count;'''
+
+    @staticmethod
+    def last_activity_sql(row):
+        """Recompute a member's last activity after one of their loans left them"""
+        return f'''UPDATE member_stats
+                    SET last_activity_at = (SELECT MAX({MemberStats.LAST_ACTIVITY_SQL.format(row='br')})
+                                            FROM borrowing br WHERE br.user_id = {row}.user_id)
+                    WHERE user_id = {row}.user_id;'''
+
+    @staticmethod
+    def trigger_sql():
+        """{trigger name: CREATE TRIGGER} for borrowing inserts, loan changes, deletes and genre edits"""
+        changed = " OR ".join(f"OLD.{column} IS NOT NEW.{column}" for column in MemberStats.TRACKED_COLUMNS)
+        return {
+            'trg_member_stats_borrowing_insert': f'''
+                CREATE TRIGGER IF NOT EXISTS trg_member_stats_borrowing_insert
+                AFTER INSERT ON borrowing
+                BEGIN
+                    {MemberStats.delta_sql('NEW', 1)}
+                    {MemberStats.genre_delta_sql('NEW', 1)}
+                END
+            ''',
+            'trg_member_stats_borrowing_update': f'''
+                CREATE TRIGGER IF NOT EXISTS trg_member_stats_borrowing_update
+                AFTER UPDATE OF {', '.join(MemberStats.TRACKED_COLUMNS)} ON borrowing
+                WHEN {changed}
+                BEGIN
+                    {MemberStats.delta_sql('OLD', -1)}
+                    {MemberStats.delta_sql('NEW', 1)}
+                END
+            ''',
+            'trg_member_stats_borrowing_owner': f'''
+                CREATE TRIGGER IF NOT EXISTS trg_member_stats_borrowing_owner
+                AFTER UPDATE OF user_id, book_id ON borrowing
+                WHEN OLD.user_id IS NOT NEW.user_id OR OLD.book_id IS NOT NEW.book_id
+                BEGIN
+                    {MemberStats.genre_delta_sql('OLD', -1)}
+                    {MemberStats.genre_delta_sql('NEW', 1)}
+                    {MemberStats.last_activity_sql('OLD')}
+                END
+            ''',
+            'trg_member_stats_borrowing_delete': f'''
+                CREATE TRIGGER IF NOT EXISTS trg_member_stats_borrowing_delete
+                AFTER DELETE ON borrowing
+                BEGIN
+                    {MemberStats.delta_sql('OLD', -1)}
+                    {MemberStats.genre_delta_sql('OLD', -1)}
+                    {MemberStats.last_activity_sql('OLD')}
+                END
+            ''',
+            'trg_member_stats_books_genre': '''
+                CREATE TRIGGER IF NOT EXISTS trg_member_stats_books_genre
+                AFTER UPDATE OF genre ON books
+                WHEN OLD.genre IS NOT NEW.genre
+                BEGIN
+                    INSERT INTO member_genre_stats (user_id, genre, borrow_count)
+                    SELECT user_id, COALESCE(OLD.genre, ''), -COUNT(*) FROM borrowing WHERE book_id = OLD.book_id GROUP BY user_id
+                    ON CONFLICT(user_id, genre) DO UPDATE SET borrow_count = borrow_count + excluded.borrow_count;
+                    INSERT INTO member_genre_stats (user_id, genre, borrow_count)
+                    SELECT user_id, COALESCE(NEW.genre, ''), COUNT(*) FROM borrowing WHERE book_id = NEW.book_id GROUP BY user_id
+                    ON CONFLICT(user_id, genre) DO UPDATE SET borrow_count = borrow_count + excluded.borrow_count;
+                END
+            ''',
+        }
+
+    @staticmethod
+    def rebuild_statements():
+        """Statements recomputing both tables from borrowing"""
+        columns = list(MemberStats.CONTRIBUTIONS)
+        sums = [f"SUM(COALESCE({expr.format(row='t')}, 0))" for expr in MemberStats.CONTRIBUTIONS.values()]
+        return [
+            "DELETE FROM member_stats",
+            f'''INSERT INTO member_stats (user_id, {', '.join(columns)}, last_activity_at)
+                SELECT t.user_id, {', '.join(sums)}, MAX({MemberStats.LAST_ACTIVITY_SQL.format(row='t')})
+                FROM borrowing t GROUP BY t.user_id''',
+            "DELETE FROM member_genre_stats",
+            f'''INSERT INTO member_genre_stats (user_id, genre, borrow_count)
+                SELECT t.user_id, {MemberStats.GENRE_SQL.format(row='t')} as genre, COUNT(*)
+                FROM borrowing t GROUP BY t.user_id, genre''',
+        ]
+
+    @staticmethod
+    def rebuild():
+        """Recompute every member's row (reconciliation)"""
+        return Database.execute_batch([(sql, None) for sql in MemberStats.rebuild_statements()])
+
+    @staticmethod
+    def get(user_id):
+        """One member's stats with reading days and favourite genre resolved, zeros if none yet"""
+        row = Database.execute_query(f"""
+            SELECT ms.*,
+                   ms.closed_reading_days + ms.open_dated_loans * {LoanDates.TODAY} - ms.open_checkout_day_sum as reading_days,
+                   (SELECT g.genre FROM member_genre_stats g
+                    WHERE g.user_id = ms.user_id AND g.genre != '' AND g.borrow_count > 0
+                    ORDER BY g.borrow_count DESC LIMIT 1) as favorite_genre
+            FROM member_stats ms
+            WHERE ms.user_id = ?
+        """, (user_id,), fetch_one=True)
+        if row:
+            return row
+        stats = {column: 0 for column in MemberStats.CONTRIBUTIONS}
+        stats.update({'user_id': user_id, 'reading_days': 0, 'favorite_genre': None, 'last_activity_at': None})
+        return stats
+
+    @staticmethod
+    def genres(user_id, limit=8):
+        """[{genre, count}] for one member, most borrowed first"""
+        return Database.execute_query("""
+            SELECT CASE WHEN genre = '' THEN 'Unknown' ELSE genre END as genre, borrow_count as count
+            FROM member_genre_stats
+            WHERE user_id = ? AND borrow_count > 0
+            ORDER BY borrow_count DESC
+            LIMIT ?
+        """, (user_id, int(limit))) or []
+
+class CopyCounters:
+    """books.total_copies / available_copies kept in step with book_inventory by triggers"""
+
+    TOTAL_SQL = "(SELECT COUNT(*) FROM book_inventory bi WHERE bi.book_id = {row}.book_id)"
+    AVAILABLE_SQL = "(SELECT COUNT(*) FROM book_inventory bi WHERE bi.book_id = {row}.book_id AND bi.is_available = 1)"
+
+    @staticmethod
+    def delta_sql(row, sign):
+        """UPDATE adding (sign 1) or removing (sign -1) one inventory row's copy"""
+        return (f"UPDATE books SET total_copies = total_copies + ({sign}), "
+                f"available_copies = available_copies + ({sign}) * COALESCE({row}.is_available = 1, 0) "
+                f"WHERE book_id = {row}.book_id;")
+
+    @staticmethod
+    def trigger_sql():
+        """{trigger name: CREATE TRIGGER} for copy inserts, moves/availability changes and deletes"""
+        return {
+            'trg_copy_counters_insert': f'''
+                CREATE TRIGGER IF NOT EXISTS trg_copy_counters_insert
+                AFTER INSERT ON book_inventory
+                BEGIN
+                    {CopyCounters.delta_sql('NEW', 1)}
+                END
+            ''',
+            'trg_copy_counters_update': f'''
+                CREATE TRIGGER IF NOT EXISTS trg_copy_counters_update
+                AFTER UPDATE OF book_id, is_available ON book_inventory
+                WHEN OLD.book_id IS NOT NEW.book_id OR OLD.is_available IS NOT NEW.is_available
+                BEGIN
+                    {CopyCounters.delta_sql('OLD', -1)}
+                    {CopyCounters.delta_sql('NEW', 1)}
+                END
+            ''',
+            'trg_copy_counters_delete': f'''
+                CREATE TRIGGER IF NOT EXISTS trg_copy_counters_delete
+                AFTER DELETE ON book_inventory
+                BEGIN
+                    {CopyCounters.delta_sql('OLD', -1)}
+                END
+            ''',
+        }
+
+    @staticmethod
+    def rebuild_sql(where="1=1"):
+        """UPDATE recounting the copy columns of the books matching where"""
+        return (f"UPDATE books SET total_copies = {CopyCounters.TOTAL_SQL.format(row='books')}, "
+                f"available_copies = {CopyCounters.AVAILABLE_SQL.format(row='books')} WHERE {where}")
+
+    @staticmethod
+    def drifted():
+        """Book ids whose stored counters disagree with book_inventory"""
+        rows = Database.execute_query("""
+            SELECT b.book_id
+            FROM books b
+            LEFT JOIN (
+                SELECT book_id, COUNT(*) as total, SUM(is_available = 1) as available
+                FROM book_inventory GROUP BY book_id
+            ) inv ON inv.book_id = b.book_id
+            WHERE b.total_copies IS NOT COALESCE(inv.total, 0)
+               OR b.available_copies IS NOT COALESCE(inv.available, 0)
+        """) or []
+        return [row['book_id'] for row in rows]
+
+    @staticmethod
+    def reconcile():
+        """Verify the counters and repair any drifted books (scheduler job); returns the repaired count"""
+        book_ids = CopyCounters.drifted()
+        if book_ids:
+            # Repairs bypass the book_inventory triggers, so log them to the change feed here
+            Database.execute_batch([
+                (CopyCounters.rebuild_sql("book_id IN (SELECT value FROM json_each(?))"), (json.dumps(book_ids),)),
+                ("INSERT INTO catalog_changes (book_id, change_type) VALUES (?, 'inventory')",
+                 [(book_id,) for book_id in book_ids]),
+            ])
+        return len(book_ids)
+
+class InventoryInsights:
+    """Per-title stock, utilization and demand rollup behind the Manage Books insight tabs"""
+
+    UNDERUTILIZED_LOANS = 2
+    HIGH_PRESSURE_SHARE = 0.2
+    # One grouped pass over loans instead of per-title correlated counts
+    LOANS_SQL = f"""
+        SELECT bi.book_id,
+               COUNT(*) as total_loans,
+               SUM(CASE WHEN br.return_date IS NULL THEN 1 ELSE 0 END) as current_loans,
+               SUM(CASE WHEN br.return_date IS NULL AND br.due_day < {LoanDates.TODAY} THEN 1 ELSE 0 END) as overdue_loans,
+               SUM(CASE WHEN br.checkout_day >= {LoanDates.now_sql('-30 days')} THEN 1 ELSE 0 END) as loans_30d,
+               AVG(COALESCE(br.return_day, {LoanDates.TODAY}) - br.checkout_day) as avg_loan_days
+        FROM borrowing br
+        JOIN book_inventory bi ON br.inventory_id = bi.inventory_id
+        GROUP BY bi.book_id
+    """
+
+    @staticmethod
+    def refresh_statements():
+        copies = "NULLIF(b.total_copies, 0)"
+        popularity = "COALESCE(b.popularity_score, 0)"
+        return [
+            "DELETE FROM inventory_insights",
+            f"""
+            INSERT INTO inventory_insights (
+                book_id, total_copies, available_copies, current_loans, overdue_loans, total_loans, loans_30d,
+                avg_loan_days, popularity, utilization, demand_ratio, demand_score,
+                is_out_of_stock, is_high_pressure, is_underutilized, computed_at
+            )
+            SELECT b.book_id, b.total_copies, b.available_copies,
+                   COALESCE(l.current_loans, 0), COALESCE(l.overdue_loans, 0),
+                   COALESCE(l.total_loans, 0), COALESCE(l.loans_30d, 0),
+                   ROUND(COALESCE(l.avg_loan_days, 0), 1), {popularity},
+                   COALESCE(1.0 * COALESCE(l.current_loans, 0) / {copies}, 0),
+                   COALESCE(1.0 * COALESCE(l.loans_30d, 0) / {copies}, COALESCE(l.loans_30d, 0)),
+                   ROUND(COALESCE(l.total_loans, 0) * {popularity} / (ROUND(COALESCE(l.avg_loan_days, 0), 1) + 1), 2),
+                   b.available_copies = 0,
+                   b.available_copies <= b.total_copies * {InventoryInsights.HIGH_PRESSURE_SHARE},
+                   COALESCE(l.total_loans, 0) < {InventoryInsights.UNDERUTILIZED_LOANS},
+                   CURRENT_TIMESTAMP
+            FROM books b
+            LEFT JOIN ({InventoryInsights.LOANS_SQL}) l ON l.book_id = b.book_id
+            """,
+        ]
+
+    @staticmethod
+    def refresh():
+        """Recompute the rollup (scheduler job and the Refresh button)"""
+        return Database.execute_batch([(sql, None) for sql in InventoryInsights.refresh_statements()])
+
     @staticmethod
-    def sort_by_date_added(order='DESC'):
-        """Sort books by date added"""
-        try:
-            if order.upper() not in ('ASC', 'DESC'):
-                order = 'DESC'
-            return Database.execute_query(f"""
-                SELECT b.book_id, b.title, b.created_at as date_added
-                FROM books b
-                WHERE b.is_active = 1
-                ORDER BY b.created_at {order}
-                LIMIT 100
-            """)
-        except Exception as e:
-            print(f"Error in sort_by_date_added: {e}")
-            return []
+    def last_computed():
+        row = Database.execute_query("SELECT MAX(computed_at) as computed_at FROM inventory_insights", fetch_one=True)
+        return row['computed_at'] if row else None
+
+class MemberDirectory:
+    """Prefix autocomplete over member username, email and name tokens"""
+    
+    _fts_available = None
+    
+    @classmethod
+    def _has_index(cls):
+        if cls._fts_available is None:
+            row = Database.execute_query(
+                "SELECT 1 as found FROM sqlite_master WHERE name = 'member_search'",
+                fetch_one=True
+            )
+            cls._fts_available = bool(row)
+        return cls._fts_available
     
     @staticmethod
-    def keyword_search(keywords: List[str]):
-        """Keyword-based search"""
-        try:
-            conditions = []
-            params = []
-            
-            for keyword in keywords:
-                conditions.append("(title LIKE %s OR author LIKE %s OR keywords LIKE %s OR genre LIKE %s)")
-                params.extend([f"%{keyword}%"] * 4)
-            
-            where_clause = " OR ".join(conditions)
-            query = f"SELECT * FROM books WHERE {where_clause}"
-            
-            return Database.execute_query(query, tuple(params))
-        except:
+    def _prefix_query(text):
+        """Turn typed text into an FTS5 prefix query matching every token"""
+        tokens = re.findall(r'\w+', str(text or '').lower())
+        return " ".join(f'"{token}"*' for token in tokens)
+    
+    @classmethod
+    def match_clause(cls, text, id_column="user_id"):
+        """SQL condition and params restricting a users query to autocomplete matches"""
+        fts_query = cls._prefix_query(text)
+        if cls._has_index() and fts_query:
+            return (
+                f"{id_column} IN (SELECT rowid FROM member_search WHERE member_search MATCH ?)",
+                [fts_query]
+            )
+        
+        prefix = id_column.rsplit('.', 1)[0] + '.' if '.' in id_column else ''
+        pattern = f"%{text}%"
+        return (
+            f"({prefix}username LIKE ? OR {prefix}email LIKE ? OR {prefix}full_name LIKE ?)",
+            [pattern, pattern, pattern]
+        )
+    
+    @classmethod
+    def lookup(cls, text, limit=20):
+        """Top members for the typed prefix, best match first"""
+        fts_query = cls._prefix_query(text)
+        if not fts_query:
             return []
+        
+        if cls._has_index():
+            return Database.execute_query(
+                """
+                SELECT u.user_id, u.username, u.full_name, u.email, u.fine_balance
+                FROM member_search ms
+                JOIN users u ON u.user_id = ms.rowid
+                WHERE member_search MATCH ?
+                ORDER BY ms.rank
+                LIMIT ?
+                """,
+                (fts_query, int(limit))
+            ) or []
+        
+        pattern = f"%{text}%"
+        return Database.execute_query(
+            "SELECT user_id, username, full_name, email, fine_balance FROM users WHERE username LIKE ? OR email LIKE ? OR full_name LIKE ? LIMIT ?",
+            (pattern, pattern, pattern, int(limit))
+        ) or []
 
 class EnhancedUserManager:
     """Enhanced user management"""
@@ -1981,36 +5054,15 @@ class SmartUtilities:
     def get_book_recommendations(book_id: int, max_results: int = 5):
         """Get book recommendations"""
         try:
-            # Check if recommendations exist
-            existing = Database.execute_query("""
-                SELECT r.*, b.title, b.author, b.genre
-                FROM book_recommendations r
-                JOIN books b ON r.recommended_book_id = b.book_id
-                WHERE r.book_id = %s
-                ORDER BY r.similarity_score DESC
-                LIMIT %s
-            """, (book_id, max_results))
-            
-            if existing:
-                return existing
-            
-            # Generate recommendations
-            all_books = Database.execute_query("SELECT * FROM books")
-            recommendations = recommendation_engine.get_similar_books(book_id, all_books, max_results)
-            
-            # Save recommendations
-            for rec in recommendations:
-                try:
-                    query = """
-                        INSERT INTO book_recommendations 
-                        (book_id, recommended_book_id, similarity_score, recommendation_type)
-                        VALUES (%s, %s, %s, 'genre')
-                    """
-                    Database.execute_update(query, (book_id, rec['book_id'], 50))
-                except:
-                    pass
-            
-            return recommendations
+            return ContentSimilarityIndex.lookup(book_id, max_results)
+        except:
+            return []
+    
+    @staticmethod
+    def get_also_borrowed(book_id: int, max_results: int = 5):
+        """Get 'members who borrowed this also borrowed' recommendations"""
+        try:
+            return CoBorrowRecommender.lookup(book_id, max_results)
         except:
             return []
     
@@ -2343,21 +5395,20 @@ class EnhancedBorrowingManager:
             if status == 'approved':
                 # Get current due date and extend it
                 current_borrowing = Database.execute_query("""
-                    SELECT due_date FROM borrowing WHERE borrowing_id = ?
+                    SELECT due_day FROM borrowing WHERE borrowing_id = ?
                 """, (renewal['borrowing_id'],))
                 
                 if current_borrowing:
-                    current_due = current_borrowing[0]['due_date']
-                    # Parse the due date string and add requested days
-                    from datetime import datetime
-                    current_due_date = datetime.strptime(current_due, '%Y-%m-%d').date()
-                    new_due_date = current_due_date + timedelta(days=renewal.get('requested_days', 14))
+                    current_due_day = current_borrowing[0]['due_day']
+                    if current_due_day is None:
+                        current_due_day = LoanDates.day_number()
+                    new_due_date = LoanDates.from_day_number(current_due_day + int(renewal.get('requested_days') or 14))
                     
                     Database.execute_update("""
                         UPDATE borrowing
                         SET due_date = ?
                         WHERE borrowing_id = ?
-                    """, (new_due_date, renewal['borrowing_id']))
+                    """, (new_due_date.isoformat(), renewal['borrowing_id']))
             
             # Update renewal request
             Database.execute_update("""
@@ -2392,13 +5443,13 @@ class EnhancedBorrowingManager:
     def get_borrowing_trends():
         """Get borrowing trends"""
         try:
-            trends = Database.execute_query("""
+            trends = Database.execute_query(f"""
                 SELECT 
-                    DATE_FORMAT(borrow_date, '%Y-%m') as month,
+                    strftime('%Y-%m', transaction_date) as month,
                     COUNT(*) as borrow_count
                 FROM transactions
-                WHERE borrow_date >= DATE_SUB(datetime('now'), INTERVAL 12 MONTH)
-                GROUP BY DATE_FORMAT(borrow_date, '%Y-%m')
+                WHERE transaction_day >= {LoanDates.now_sql('-12 months')}
+                GROUP BY month
                 ORDER BY month
             """)
             
@@ -2410,42 +5461,15 @@ class EnhancedBorrowingManager:
     def get_borrowing_status_dashboard():
         """Get borrowing status dashboard"""
         try:
+            loans = LoanKpiEngine.compute()
             stats = {
-                'active_borrows': 0,
-                'overdue': 0,
-                'due_today': 0,
-                'due_this_week': 0,
+                'active_borrows': loans['active_loans'],
+                'overdue': loans['overdue_loans'],
+                'due_today': loans['due_today'],
+                'due_this_week': loans['due_this_week'],
                 'renewal_requests': 0
             }
             
-            # Active borrows
-            result = Database.execute_query("""
-                SELECT COUNT(*) as count FROM transactions WHERE status = 'borrowed'
-            """)
-            stats['active_borrows'] = result[0]['count'] if result else 0
-            
-            # Overdue
-            result = Database.execute_query("""
-                SELECT COUNT(*) as count FROM transactions 
-                WHERE status = 'borrowed' AND due_date < date('now')
-            """)
-            stats['overdue'] = result[0]['count'] if result else 0
-            
-            # Due today
-            result = Database.execute_query("""
-                SELECT COUNT(*) as count FROM transactions 
-                WHERE status = 'borrowed' AND due_date = date('now')
-            """)
-            stats['due_today'] = result[0]['count'] if result else 0
-            
-            # Due this week
-            result = Database.execute_query("""
-                SELECT COUNT(*) as count FROM transactions 
-                WHERE status = 'borrowed' 
-                AND due_date BETWEEN date('now') AND DATE_ADD(date('now'), INTERVAL 7 DAY)
-            """)
-            stats['due_this_week'] = result[0]['count'] if result else 0
-            
             # Renewal requests
             result = Database.execute_query("""
                 SELECT COUNT(*) as count FROM renewal_requests WHERE status = 'pending'
@@ -2471,6 +5495,7 @@ class Config:
     FINE_PER_DAY = 5.00
     MAX_RENEWALS = 2
     MAX_MEMBER_ACCOUNTS = 10
+    CATALOG_SNAPSHOT_ENABLED = os.getenv('LITGRID_CATALOG_SNAPSHOT', '0') == '1'  # in-memory browse snapshot
 
     # Hidden admin credentials (obfuscated)
     _x1 = base64.b64decode(b'bGEtYi1pYg==').decode()  # username
@@ -2522,7 +5547,8 @@ class Config:
                 'DEFAULT_BORROWING_DAYS': Config.DEFAULT_BORROWING_DAYS,
                 'FINE_PER_DAY': Config.FINE_PER_DAY,
                 'MAX_RENEWALS': Config.MAX_RENEWALS,
-                'MAX_MEMBER_ACCOUNTS': Config.MAX_MEMBER_ACCOUNTS
+                'MAX_MEMBER_ACCOUNTS': Config.MAX_MEMBER_ACCOUNTS,
+                'CATALOG_SNAPSHOT_ENABLED': Config.CATALOG_SNAPSHOT_ENABLED
             }
             
             with open(Config.CONFIG_FILE, 'w') as f:
@@ -2541,7 +5567,8 @@ class Config:
             'DEFAULT_BORROWING_DAYS': Config.DEFAULT_BORROWING_DAYS,
             'FINE_PER_DAY': Config.FINE_PER_DAY,
             'MAX_RENEWALS': Config.MAX_RENEWALS,
-            'MAX_MEMBER_ACCOUNTS': Config.MAX_MEMBER_ACCOUNTS
+            'MAX_MEMBER_ACCOUNTS': Config.MAX_MEMBER_ACCOUNTS,
+            'CATALOG_SNAPSHOT_ENABLED': Config.CATALOG_SNAPSHOT_ENABLED
         }
 
 class EmailService:
@@ -2602,15 +5629,15 @@ class EmailService:
     def send_bulk_reminders():
         """Send reminders for all due/overdue books"""
         # Get books due within 3 days or overdue
-        borrowings = Database.execute_query("""
+        borrowings = Database.execute_query(f"""
             SELECT br.borrowing_id, b.title, u.full_name, u.email, br.due_date,
-                   julianday(br.due_date) - julianday(date('now')) as days_until_due
+                   br.due_day - {LoanDates.TODAY} as days_until_due
             FROM borrowing br
             JOIN book_inventory bi ON br.inventory_id = bi.inventory_id
             JOIN books b ON bi.book_id = b.book_id
             JOIN users u ON br.user_id = u.user_id
             WHERE br.return_date IS NULL
-              AND julianday(br.due_date) - julianday(date('now')) <= 3
+              AND br.due_day <= {LoanDates.now_sql('+3 days')}
         """)
         
         sent_count = 0
@@ -3115,6 +6142,149 @@ class Database:
                     UNIQUE(book_id, user_id)
                 )
             ''',
+            'book_recommendations': '''
+                CREATE TABLE IF NOT EXISTS book_recommendations (
+                    book_id INTEGER NOT NULL,
+                    recommendation_type TEXT NOT NULL,
+                    recommended_book_id INTEGER NOT NULL,
+                    similarity_score REAL NOT NULL DEFAULT 0,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    updated_at DATETIME,
+                    PRIMARY KEY (book_id, recommendation_type, recommended_book_id),
+                    FOREIGN KEY (book_id) REFERENCES books(book_id) ON DELETE CASCADE,
+                    FOREIGN KEY (recommended_book_id) REFERENCES books(book_id) ON DELETE CASCADE
+                )
+            ''',
+            'book_recommendation_state': '''
+                CREATE TABLE IF NOT EXISTS book_recommendation_state (
+                    book_id INTEGER NOT NULL,
+                    recommendation_type TEXT NOT NULL,
+                    source_version INTEGER NOT NULL DEFAULT 0,
+                    is_stale INTEGER NOT NULL DEFAULT 1,
+                    computed_at DATETIME,
+                    PRIMARY KEY (book_id, recommendation_type)
+                )
+            ''',
+            'book_popularity': '''
+                CREATE TABLE IF NOT EXISTS book_popularity (
+                    book_id INTEGER PRIMARY KEY,
+                    decayed_score REAL NOT NULL DEFAULT 0,
+                    checkouts_7d INTEGER NOT NULL DEFAULT 0,
+                    checkouts_30d INTEGER NOT NULL DEFAULT 0,
+                    checkouts_90d INTEGER NOT NULL DEFAULT 0,
+                    total_checkouts INTEGER NOT NULL DEFAULT 0,
+                    last_checkout_at DATETIME,
+                    FOREIGN KEY (book_id) REFERENCES books(book_id) ON DELETE CASCADE
+                )
+            ''',
+            'book_coborrow_pairs': '''
+                CREATE TABLE IF NOT EXISTS book_coborrow_pairs (
+                    book_id INTEGER NOT NULL,
+                    other_book_id INTEGER NOT NULL,
+                    co_count INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (book_id, other_book_id)
+                ) WITHOUT ROWID
+            ''',
+            'book_borrower_counts': '''
+                CREATE TABLE IF NOT EXISTS book_borrower_counts (
+                    book_id INTEGER PRIMARY KEY,
+                    borrower_count INTEGER NOT NULL DEFAULT 0
+                )
+            ''',
+            'daily_stats': '''
+                CREATE TABLE IF NOT EXISTS daily_stats (
+                    day TEXT NOT NULL,
+                    dimension TEXT NOT NULL,
+                    dimension_value TEXT NOT NULL DEFAULT '',
+                    checkouts INTEGER NOT NULL DEFAULT 0,
+                    returns INTEGER NOT NULL DEFAULT 0,
+                    new_members INTEGER NOT NULL DEFAULT 0,
+                    active_members INTEGER NOT NULL DEFAULT 0,
+                    fines_amount REAL NOT NULL DEFAULT 0,
+                    fines_count INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (day, dimension, dimension_value)
+                ) WITHOUT ROWID
+            ''',
+            'kpi_counters': '''
+                CREATE TABLE IF NOT EXISTS kpi_counters (
+                    kpi_id INTEGER PRIMARY KEY CHECK (kpi_id = 1),
+                    total_users INTEGER NOT NULL DEFAULT 0,
+                    active_users INTEGER NOT NULL DEFAULT 0,
+                    total_members INTEGER NOT NULL DEFAULT 0,
+                    active_members INTEGER NOT NULL DEFAULT 0,
+                    total_admins INTEGER NOT NULL DEFAULT 0,
+                    users_with_fines INTEGER NOT NULL DEFAULT 0,
+                    fine_balance_total REAL NOT NULL DEFAULT 0,
+                    total_books INTEGER NOT NULL DEFAULT 0,
+                    available_books INTEGER NOT NULL DEFAULT 0,
+                    total_inventory INTEGER NOT NULL DEFAULT 0,
+                    available_inventory INTEGER NOT NULL DEFAULT 0,
+                    total_borrowings INTEGER NOT NULL DEFAULT 0,
+                    active_borrowings INTEGER NOT NULL DEFAULT 0,
+                    returned_borrowings INTEGER NOT NULL DEFAULT 0,
+                    on_time_returns INTEGER NOT NULL DEFAULT 0,
+                    fines_paid REAL NOT NULL DEFAULT 0,
+                    fines_pending REAL NOT NULL DEFAULT 0,
+                    overdue_borrowings INTEGER NOT NULL DEFAULT 0,
+                    active_borrowers_7d INTEGER NOT NULL DEFAULT 0,
+                    active_borrowers_30d INTEGER NOT NULL DEFAULT 0,
+                    distinct_authors INTEGER NOT NULL DEFAULT 0,
+                    distinct_genres INTEGER NOT NULL DEFAULT 0,
+                    refreshed_at DATETIME
+                )
+            ''',
+            'member_stats': '''
+                CREATE TABLE IF NOT EXISTS member_stats (
+                    user_id INTEGER PRIMARY KEY,
+                    total_borrowed INTEGER NOT NULL DEFAULT 0,
+                    total_returned INTEGER NOT NULL DEFAULT 0,
+                    currently_borrowed INTEGER NOT NULL DEFAULT 0,
+                    closed_reading_days INTEGER NOT NULL DEFAULT 0,
+                    open_dated_loans INTEGER NOT NULL DEFAULT 0,
+                    open_checkout_day_sum INTEGER NOT NULL DEFAULT 0,
+                    total_fines REAL NOT NULL DEFAULT 0,
+                    last_activity_at DATETIME,
+                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            ''',
+            'member_genre_stats': '''
+                CREATE TABLE IF NOT EXISTS member_genre_stats (
+                    user_id INTEGER NOT NULL,
+                    genre TEXT NOT NULL DEFAULT '',
+                    borrow_count INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (user_id, genre)
+                ) WITHOUT ROWID
+            ''',
+            'inventory_insights': '''
+                CREATE TABLE IF NOT EXISTS inventory_insights (
+                    book_id INTEGER PRIMARY KEY,
+                    total_copies INTEGER NOT NULL DEFAULT 0,
+                    available_copies INTEGER NOT NULL DEFAULT 0,
+                    current_loans INTEGER NOT NULL DEFAULT 0,
+                    overdue_loans INTEGER NOT NULL DEFAULT 0,
+                    total_loans INTEGER NOT NULL DEFAULT 0,
+                    loans_30d INTEGER NOT NULL DEFAULT 0,
+                    avg_loan_days REAL NOT NULL DEFAULT 0,
+                    popularity REAL NOT NULL DEFAULT 0,
+                    utilization REAL NOT NULL DEFAULT 0,
+                    demand_ratio REAL NOT NULL DEFAULT 0,
+                    demand_score REAL NOT NULL DEFAULT 0,
+                    is_out_of_stock INTEGER NOT NULL DEFAULT 0,
+                    is_high_pressure INTEGER NOT NULL DEFAULT 0,
+                    is_underutilized INTEGER NOT NULL DEFAULT 0,
+                    computed_at DATETIME
+                )
+            ''',
+            'report_results': '''
+                CREATE TABLE IF NOT EXISTS report_results (
+                    cache_key TEXT PRIMARY KEY,
+                    report_name TEXT NOT NULL,
+                    params_json TEXT NOT NULL,
+                    result_json TEXT NOT NULL,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    expires_at DATETIME NOT NULL
+                )
+            ''',
             'sync_log': '''
                 CREATE TABLE IF NOT EXISTS sync_log (
                     sync_id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -3394,12 +6564,75 @@ class Database:
                     revoked_at DATETIME,
                     FOREIGN KEY (user_id) REFERENCES users(user_id)
                 )
+            ''',
+            'catalog_facets': '''
+                CREATE TABLE IF NOT EXISTS catalog_facets (
+                    facet TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    book_count INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (facet, value)
+                )
+            ''',
+            'catalog_changes': '''
+                CREATE TABLE IF NOT EXISTS catalog_changes (
+                    change_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    book_id INTEGER NOT NULL,
+                    change_type TEXT NOT NULL,
+                    changed_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            ''',
+            'index_watermarks': '''
+                CREATE TABLE IF NOT EXISTS index_watermarks (
+                    index_name TEXT PRIMARY KEY,
+                    change_id INTEGER NOT NULL DEFAULT 0,
+                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            ''',
+            'spelling_words': '''
+                CREATE TABLE IF NOT EXISTS spelling_words (
+                    word TEXT PRIMARY KEY,
+                    frequency INTEGER NOT NULL DEFAULT 0
+                )
+            ''',
+            'spelling_deletes': '''
+                CREATE TABLE IF NOT EXISTS spelling_deletes (
+                    delete_key TEXT NOT NULL,
+                    word TEXT NOT NULL,
+                    PRIMARY KEY (delete_key, word)
+                ) WITHOUT ROWID
+            ''',
+            'book_duplicate_keys': '''
+                CREATE TABLE IF NOT EXISTS book_duplicate_keys (
+                    dedup_key TEXT NOT NULL,
+                    book_id INTEGER NOT NULL,
+                    PRIMARY KEY (dedup_key, book_id)
+                ) WITHOUT ROWID
+            ''',
+            'spelling_sources': '''
+                CREATE TABLE IF NOT EXISTS spelling_sources (
+                    book_id INTEGER PRIMARY KEY,
+                    tokens TEXT NOT NULL DEFAULT ''
+                )
             '''
         }
         
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'catalog_facets'")
+        catalog_facets_exists = cursor.fetchone() is not None
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'daily_stats'")
+        daily_stats_exists = cursor.fetchone() is not None
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'kpi_counters'")
+        kpi_counters_exists = cursor.fetchone() is not None
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'member_stats'")
+        member_stats_exists = cursor.fetchone() is not None
+
         for table_name, table_sql in tables.items():
             cursor.execute(table_sql)
 
+        cursor.execute("PRAGMA table_info(borrowing)")
+        loan_days_exist = 'due_day' in [row[1] for row in cursor.fetchall()]
+        cursor.execute("PRAGMA table_info(books)")
+        copy_counters_exist = 'available_copies' in [row[1] for row in cursor.fetchall()]
+
         def ensure_column(table_name, column_name, column_def):
             try:
                 cursor.execute(f"PRAGMA table_info({table_name})")
@@ -3421,11 +6654,360 @@ class Database:
         ensure_column('account_deletion_requests', 'decision_reason', 'TEXT')
         ensure_column('account_dynamic_preferences', 'profile_theme', "TEXT DEFAULT 'adaptive'")
         ensure_column('user_sessions', 'geo_hint', 'TEXT')
+        ensure_column('book_recommendations', 'updated_at', 'DATETIME')
         ensure_column('user_sessions', 'trusted_device', 'INTEGER DEFAULT 0')
         ensure_column('user_sessions', 'trust_label', 'TEXT')
         ensure_column('user_sessions', 'step_up_verified_until', 'DATETIME')
         ensure_column('user_sessions', 'risk_score', 'INTEGER DEFAULT 0')
         ensure_column('user_sessions', 'risk_reasons', 'TEXT')
+        for table_name, (pk, day_columns) in LoanDates.COLUMNS.items():
+            for day_column in day_columns:
+                ensure_column(table_name, day_column, 'INTEGER')
+        ensure_column('books', 'popularity_score', 'INTEGER DEFAULT 0')
+        ensure_column('borrowing', 'book_id', 'INTEGER')
+        ensure_column('books', 'isbn_10', 'TEXT')
+        ensure_column('books', 'isbn_13', 'TEXT')
+        ensure_column('books', 'total_copies', 'INTEGER NOT NULL DEFAULT 0')
+        ensure_column('books', 'available_copies', 'INTEGER NOT NULL DEFAULT 0')
+
+        # Change feed consumed incrementally by the in-memory catalog indexes
+        triggers = {
+            'trg_books_change_insert': '''
+                CREATE TRIGGER IF NOT EXISTS trg_books_change_insert
+                AFTER INSERT ON books
+                BEGIN
+                    INSERT INTO catalog_changes (book_id, change_type) VALUES (NEW.book_id, 'insert');
+                END
+            ''',
+            'trg_books_change_update': '''
+                CREATE TRIGGER IF NOT EXISTS trg_books_change_update
+                AFTER UPDATE ON books
+                WHEN OLD.popularity_score IS NEW.popularity_score
+                 AND OLD.total_copies IS NEW.total_copies
+                 AND OLD.available_copies IS NEW.available_copies
+                BEGIN
+                    INSERT INTO catalog_changes (book_id, change_type) VALUES (NEW.book_id, 'update');
+                END
+            ''',
+            'trg_books_change_popularity': '''
+                CREATE TRIGGER IF NOT EXISTS trg_books_change_popularity
+                AFTER UPDATE OF popularity_score ON books
+                WHEN OLD.popularity_score IS NOT NEW.popularity_score
+                BEGIN
+                    INSERT INTO catalog_changes (book_id, change_type) VALUES (NEW.book_id, 'popularity');
+                END
+            ''',
+            'trg_borrowing_popularity': f'''
+                CREATE TRIGGER IF NOT EXISTS trg_borrowing_popularity
+                AFTER INSERT ON borrowing
+                BEGIN
+                    INSERT INTO book_popularity
+                        (book_id, decayed_score, checkouts_7d, checkouts_30d, checkouts_90d, total_checkouts, last_checkout_at)
+                    SELECT borrowed.book_id, 1, 1, 1, 1, 1, COALESCE(NEW.checkout_date, CURRENT_TIMESTAMP)
+                    FROM (SELECT COALESCE(NEW.book_id, (SELECT book_id FROM book_inventory WHERE inventory_id = NEW.inventory_id)) as book_id) borrowed
+                    WHERE borrowed.book_id IS NOT NULL
+                    ON CONFLICT(book_id) DO UPDATE SET
+                        decayed_score = decayed_score + 1,
+                        checkouts_7d = checkouts_7d + 1,
+                        checkouts_30d = checkouts_30d + 1,
+                        checkouts_90d = checkouts_90d + 1,
+                        total_checkouts = total_checkouts + 1,
+                        last_checkout_at = excluded.last_checkout_at;
+                    UPDATE books
+                    SET popularity_score = (
+                        SELECT {PopularityTracker.SCORE_SQL} FROM book_popularity p WHERE p.book_id = books.book_id
+                    )
+                    WHERE book_id = COALESCE(NEW.book_id, (SELECT book_id FROM book_inventory WHERE inventory_id = NEW.inventory_id));
+                END
+            ''',
+            'trg_books_change_delete': '''
+                CREATE TRIGGER IF NOT EXISTS trg_books_change_delete
+                AFTER DELETE ON books
+                BEGIN
+                    INSERT INTO catalog_changes (book_id, change_type) VALUES (OLD.book_id, 'delete');
+                END
+            ''',
+            'trg_inventory_change_insert': '''
+                CREATE TRIGGER IF NOT EXISTS trg_inventory_change_insert
+                AFTER INSERT ON book_inventory
+                BEGIN
+                    INSERT INTO catalog_changes (book_id, change_type) VALUES (NEW.book_id, 'inventory');
+                END
+            ''',
+            'trg_inventory_change_update': '''
+                CREATE TRIGGER IF NOT EXISTS trg_inventory_change_update
+                AFTER UPDATE OF book_id, is_available ON book_inventory
+                BEGIN
+                    INSERT INTO catalog_changes (book_id, change_type) VALUES (NEW.book_id, 'inventory');
+                END
+            ''',
+            'trg_inventory_change_delete': '''
+                CREATE TRIGGER IF NOT EXISTS trg_inventory_change_delete
+                AFTER DELETE ON book_inventory
+                BEGIN
+                    INSERT INTO catalog_changes (book_id, change_type) VALUES (OLD.book_id, 'inventory');
+                END
+            '''
+        }
+
+        # Popularity-only updates are logged separately so content indexes can skip them, and
+        # copy counter updates are already logged as 'inventory' by the book_inventory triggers
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'trg_books_change_update'")
+        existing_trigger = cursor.fetchone()
+        if existing_trigger and 'available_copies' not in existing_trigger[0]:
+            cursor.execute("DROP TRIGGER trg_books_change_update")
+
+        for trigger_name, trigger_sql in triggers.items():
+            cursor.execute(trigger_sql)
+
+        # Facet count maintenance on books / book_inventory
+        def facet_delta(facet, row, delta):
+            value_expr = CatalogFacets.FACET_EXPRESSIONS[facet].format(row=row)
+            return f'''
+                    INSERT INTO catalog_facets (facet, value, book_count) VALUES ('{facet}', {value_expr}, {delta})
+                    ON CONFLICT (facet, value) DO UPDATE SET book_count = book_count + ({delta});'''
+
+        def availability_delta(value, delta):
+            return f'''
+                    INSERT INTO catalog_facets (facet, value, book_count) VALUES ('availability', '{value}', {delta})
+                    ON CONFLICT (facet, value) DO UPDATE SET book_count = book_count + ({delta});'''
+
+        attribute_facets = ('genre', 'language', 'decade')
+        available_copies_sql = "(SELECT COUNT(*) FROM book_inventory WHERE book_id = {row}.book_id AND is_available = 1)"
+        facet_triggers = {
+            'trg_facets_books_insert': f'''
+                CREATE TRIGGER IF NOT EXISTS trg_facets_books_insert
+                AFTER INSERT ON books
+                BEGIN{''.join(facet_delta(f, 'NEW', 1) for f in attribute_facets + ('availability',))}
+                END
+            ''',
+            'trg_facets_books_update': f'''
+                CREATE TRIGGER IF NOT EXISTS trg_facets_books_update
+                AFTER UPDATE OF genre, language, publication_year ON books
+                BEGIN{''.join(facet_delta(f, 'OLD', -1) + facet_delta(f, 'NEW', 1) for f in attribute_facets)}
+                END
+            ''',
+            'trg_facets_books_delete': f'''
+                CREATE TRIGGER IF NOT EXISTS trg_facets_books_delete
+                AFTER DELETE ON books
+                BEGIN{''.join(facet_delta(f, 'OLD', -1) for f in attribute_facets + ('availability',))}
+                END
+            ''',
+            # A title moves between availability buckets only when its first copy
+            # becomes available or its last available copy goes away
+            'trg_facets_inventory_insert': f'''
+                CREATE TRIGGER IF NOT EXISTS trg_facets_inventory_insert
+                AFTER INSERT ON book_inventory
+                WHEN NEW.is_available = 1 AND {available_copies_sql.format(row='NEW')} = 1
+                BEGIN{availability_delta('unavailable', -1)}{availability_delta('available', 1)}
+                END
+            ''',
+            'trg_facets_inventory_update': f'''
+                CREATE TRIGGER IF NOT EXISTS trg_facets_inventory_update
+                AFTER UPDATE OF is_available ON book_inventory
+                WHEN OLD.is_available != NEW.is_available
+                 AND {available_copies_sql.format(row='NEW')} = NEW.is_available
+                BEGIN{availability_delta('unavailable', '1 - 2 * NEW.is_available')}{availability_delta('available', '2 * NEW.is_available - 1')}
+                END
+            ''',
+            'trg_facets_inventory_delete': f'''
+                CREATE TRIGGER IF NOT EXISTS trg_facets_inventory_delete
+                AFTER DELETE ON book_inventory
+                WHEN OLD.is_available = 1 AND {available_copies_sql.format(row='OLD')} = 0
+                 AND EXISTS (SELECT 1 FROM books WHERE book_id = OLD.book_id)
+                BEGIN{availability_delta('available', -1)}{availability_delta('unavailable', 1)}
+                END
+            '''
+        }
+
+        for trigger_name, trigger_sql in facet_triggers.items():
+            cursor.execute(trigger_sql)
+
+        # Sortable day numbers for the loan dates, filled in chunks the first time the columns appear
+        for trigger_name, trigger_sql in LoanDates.trigger_sql().items():
+            cursor.execute(trigger_sql)
+
+        if not loan_days_exist:
+            for table_name in LoanDates.COLUMNS:
+                LoanDates.backfill(conn, table_name)
+
+        # Per-title copy counters replacing correlated book_inventory counts
+        for trigger_name, trigger_sql in CopyCounters.trigger_sql().items():
+            cursor.execute(trigger_sql)
+
+        if not copy_counters_exist:
+            cursor.execute(CopyCounters.rebuild_sql())
+
+        if not catalog_facets_exists:
+            cursor.execute(CatalogFacets.rebuild_sql())
+
+        # Report aggregates: each trigger removes the OLD row's contribution and adds the NEW one.
+        # Triggers whose definition changed are replaced and the table is rebuilt to match.
+        def daily_stats_sql(*parts):
+            return ''.join(f'''
+                    {sql}''' for kind, row, sign in parts for sql in DailyStats.row_sql(kind, row, sign))
+
+        daily_stats_triggers = {
+            'trg_daily_stats_borrowing_insert': f'''
+                CREATE TRIGGER IF NOT EXISTS trg_daily_stats_borrowing_insert
+                AFTER INSERT ON borrowing
+                BEGIN{daily_stats_sql(('checkout', 'NEW', 1), ('return', 'NEW', 1))}
+                END
+            ''',
+            'trg_daily_stats_borrowing_checkout': f'''
+                CREATE TRIGGER IF NOT EXISTS trg_daily_stats_borrowing_checkout
+                AFTER UPDATE OF checkout_date, book_id, inventory_id ON borrowing
+                WHEN OLD.checkout_date IS NOT NEW.checkout_date
+                  OR OLD.book_id IS NOT NEW.book_id
+                  OR OLD.inventory_id IS NOT NEW.inventory_id
+                BEGIN{daily_stats_sql(('checkout', 'OLD', -1), ('checkout', 'NEW', 1))}
+                END
+            ''',
+            'trg_daily_stats_borrowing_return': f'''
+                CREATE TRIGGER IF NOT EXISTS trg_daily_stats_borrowing_return
+                AFTER UPDATE OF return_date, fine_amount ON borrowing
+                WHEN OLD.return_date IS NOT NEW.return_date OR OLD.fine_amount IS NOT NEW.fine_amount
+                BEGIN{daily_stats_sql(('return', 'OLD', -1), ('return', 'NEW', 1))}
+                END
+            ''',
+            'trg_daily_stats_borrowing_delete': f'''
+                CREATE TRIGGER IF NOT EXISTS trg_daily_stats_borrowing_delete
+                AFTER DELETE ON borrowing
+                BEGIN{daily_stats_sql(('checkout', 'OLD', -1), ('return', 'OLD', -1))}
+                END
+            ''',
+            'trg_daily_stats_users_insert': f'''
+                CREATE TRIGGER IF NOT EXISTS trg_daily_stats_users_insert
+                AFTER INSERT ON users
+                BEGIN{daily_stats_sql(('member', 'NEW', 1))}
+                END
+            ''',
+            'trg_daily_stats_users_update': f'''
+                CREATE TRIGGER IF NOT EXISTS trg_daily_stats_users_update
+                AFTER UPDATE OF role, is_active, member_tier, created_at ON users
+                WHEN OLD.role IS NOT NEW.role OR OLD.is_active IS NOT NEW.is_active
+                  OR OLD.member_tier IS NOT NEW.member_tier OR OLD.created_at IS NOT NEW.created_at
+                BEGIN{daily_stats_sql(('member', 'OLD', -1), ('member', 'NEW', 1))}
+                END
+            ''',
+            'trg_daily_stats_users_delete': f'''
+                CREATE TRIGGER IF NOT EXISTS trg_daily_stats_users_delete
+                AFTER DELETE ON users
+                BEGIN{daily_stats_sql(('member', 'OLD', -1))}
+                END
+            '''
+        }
+
+        daily_stats_triggers_changed = False
+        for trigger_name, trigger_sql in daily_stats_triggers.items():
+            cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = ?", (trigger_name,))
+            existing_trigger = cursor.fetchone()
+            if existing_trigger is None or existing_trigger[0].split() != trigger_sql.replace('IF NOT EXISTS ', '').split():
+                if existing_trigger is not None:
+                    cursor.execute(f"DROP TRIGGER {trigger_name}")
+                daily_stats_triggers_changed = True
+            cursor.execute(trigger_sql)
+
+        if not daily_stats_exists or daily_stats_triggers_changed:
+            for statement in DailyStats.rebuild_statements():
+                cursor.execute(statement)
+
+        # Dashboard KPI row, kept in step with users/books/inventory/borrowing/fines. Triggers
+        # whose definition changed are replaced, and the row is then rebuilt under the new rules.
+        kpi_triggers_changed = False
+        for trigger_name, trigger_sql in KpiCounters.trigger_sql().items():
+            cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = ?", (trigger_name,))
+            existing_trigger = cursor.fetchone()
+            if existing_trigger is None or existing_trigger[0].split() != trigger_sql.replace('IF NOT EXISTS ', '').split():
+                if existing_trigger is not None:
+                    cursor.execute(f"DROP TRIGGER {trigger_name}")
+                kpi_triggers_changed = True
+            cursor.execute(trigger_sql)
+
+        if not kpi_counters_exists or kpi_triggers_changed:
+            cursor.execute("INSERT OR IGNORE INTO kpi_counters (kpi_id) VALUES (1)")
+            cursor.execute(KpiCounters.rebuild_sql())
+            cursor.execute(KpiCounters.refresh_sql())
+
+        # Per-member analytics row, updated inside each checkout/return statement
+        for trigger_name, trigger_sql in MemberStats.trigger_sql().items():
+            cursor.execute(trigger_sql)
+
+        if not member_stats_exists:
+            for statement in MemberStats.rebuild_statements():
+                cursor.execute(statement)
+
+        # Seek indexes backing keyset pagination of the catalog
+        indexes = {
+            'idx_books_seek_title': "CREATE INDEX IF NOT EXISTS idx_books_seek_title ON books (COALESCE(title, ''), book_id)",
+            'idx_books_seek_year': "CREATE INDEX IF NOT EXISTS idx_books_seek_year ON books (COALESCE(publication_year, 0), book_id)",
+            'idx_books_seek_popularity': "CREATE INDEX IF NOT EXISTS idx_books_seek_popularity ON books (COALESCE(popularity_score, 0), book_id)",
+            'idx_books_seek_added': "CREATE INDEX IF NOT EXISTS idx_books_seek_added ON books (COALESCE(created_at, ''), book_id)",
+            'idx_books_author': "CREATE INDEX IF NOT EXISTS idx_books_author ON books (author)",
+            'idx_books_genre': "CREATE INDEX IF NOT EXISTS idx_books_genre ON books (genre)",
+            'idx_book_duplicate_keys_book': "CREATE INDEX IF NOT EXISTS idx_book_duplicate_keys_book ON book_duplicate_keys (book_id)",
+            'idx_book_recommendations_target': "CREATE INDEX IF NOT EXISTS idx_book_recommendations_target ON book_recommendations (recommended_book_id, recommendation_type)",
+            'idx_borrowing_user': "CREATE INDEX IF NOT EXISTS idx_borrowing_user ON borrowing (user_id, borrowing_id)",
+            'idx_borrowing_checkout_date': "CREATE INDEX IF NOT EXISTS idx_borrowing_checkout_date ON borrowing (checkout_date)",
+            'idx_borrowing_open_due': "CREATE INDEX IF NOT EXISTS idx_borrowing_open_due ON borrowing (return_date, due_day)",
+            'idx_borrowing_checkout_day': "CREATE INDEX IF NOT EXISTS idx_borrowing_checkout_day ON borrowing (checkout_day, user_id)",
+            'idx_borrowing_return_day': "CREATE INDEX IF NOT EXISTS idx_borrowing_return_day ON borrowing (return_day)",
+            'idx_transactions_day': "CREATE INDEX IF NOT EXISTS idx_transactions_day ON transactions (transaction_day)",
+            'idx_transactions_user_type_day': "CREATE INDEX IF NOT EXISTS idx_transactions_user_type_day ON transactions (user_id, transaction_type, transaction_day)",
+            'idx_book_popularity_7d': "CREATE INDEX IF NOT EXISTS idx_book_popularity_7d ON book_popularity (checkouts_7d, book_id)",
+            'idx_book_popularity_30d': "CREATE INDEX IF NOT EXISTS idx_book_popularity_30d ON book_popularity (checkouts_30d, book_id)",
+            'idx_book_popularity_90d': "CREATE INDEX IF NOT EXISTS idx_book_popularity_90d ON book_popularity (checkouts_90d, book_id)",
+            'idx_inventory_insights_stock': "CREATE INDEX IF NOT EXISTS idx_inventory_insights_stock ON inventory_insights (available_copies, total_copies)",
+            'idx_inventory_insights_demand': "CREATE INDEX IF NOT EXISTS idx_inventory_insights_demand ON inventory_insights (total_loans, current_loans)",
+        }
+
+        for index_name, index_sql in indexes.items():
+            cursor.execute(index_sql)
+
+        # Member autocomplete prefix index (FTS5 may be missing from some SQLite builds)
+        member_search_triggers = {
+            'trg_member_search_insert': '''
+                CREATE TRIGGER IF NOT EXISTS trg_member_search_insert
+                AFTER INSERT ON users
+                BEGIN
+                    INSERT INTO member_search (rowid, username, email, full_name)
+                    VALUES (NEW.user_id, NEW.username, NEW.email, NEW.full_name);
+                END
+            ''',
+            'trg_member_search_update': '''
+                CREATE TRIGGER IF NOT EXISTS trg_member_search_update
+                AFTER UPDATE OF username, email, full_name ON users
+                BEGIN
+                    INSERT INTO member_search (member_search, rowid, username, email, full_name)
+                    VALUES ('delete', OLD.user_id, OLD.username, OLD.email, OLD.full_name);
+                    INSERT INTO member_search (rowid, username, email, full_name)
+                    VALUES (NEW.user_id, NEW.username, NEW.email, NEW.full_name);
+                END
+            ''',
+            'trg_member_search_delete': '''
+                CREATE TRIGGER IF NOT EXISTS trg_member_search_delete
+                AFTER DELETE ON users
+                BEGIN
+                    INSERT INTO member_search (member_search, rowid, username, email, full_name)
+                    VALUES ('delete', OLD.user_id, OLD.username, OLD.email, OLD.full_name);
+                END
+            '''
+        }
+        try:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'member_search'")
+            member_search_exists = cursor.fetchone() is not None
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS member_search USING fts5(
+                    username, email, full_name,
+                    content='users', content_rowid='user_id', prefix='2 3 4'
+                )
+            ''')
+            for trigger_name, trigger_sql in member_search_triggers.items():
+                cursor.execute(trigger_sql)
+            if not member_search_exists:
+                cursor.execute("INSERT INTO member_search (member_search) VALUES ('rebuild')")
+        except sqlite3.OperationalError:
+            pass
         
         conn.commit()
     
@@ -3495,6 +7077,32 @@ class Database:
                     conn.close()
                 return False
 
+    @classmethod
+    def execute_batch(cls, statements):
+        """Execute (query, params) pairs in one transaction; a list of param tuples runs executemany"""
+        with cls._lock:
+            conn = cls.get_connection()
+            if not conn:
+                return False
+            try:
+                cursor = conn.cursor()
+                for query, params in statements:
+                    sqlite_query = query.replace('%s', '?')
+                    if isinstance(params, list):
+                        cursor.executemany(sqlite_query, params)
+                    else:
+                        cursor.execute(sqlite_query, params or ())
+                conn.commit()
+                cursor.close()
+                conn.close()
+                return True
+            except Exception as e:
+                st.error(f"Update error: {e}")
+                if conn:
+                    conn.rollback()
+                    conn.close()
+                return False
+
 # ================================================================
 # AUTHENTICATION
 # ================================================================
@@ -4421,63 +8029,23 @@ def generate_book_insights(books):
 
 def calculate_fine(due_date, return_date=None):
     """Calculate fine for overdue books"""
-    if return_date is None:
-        return_date = datetime.now()
-    
-    if isinstance(due_date, str):
-        due_date = datetime.strptime(due_date, '%Y-%m-%d')
-    if isinstance(return_date, str):
-        return_date = datetime.strptime(return_date, '%Y-%m-%d')
-    
-    if return_date <= due_date:
+    days_overdue = LoanDates.day_number(return_date) - LoanDates.day_number(due_date)
+    if days_overdue <= 0:
         return 0.0
     
-    days_overdue = (return_date - due_date).days
     return days_overdue * Config.FINE_PER_DAY
 
 def get_member_statistics(user_id):
-    """Get comprehensive member statistics"""
-    stats = {}
-    
-    # Total books read
-    total_read = Database.execute_query(
-        "SELECT COUNT(*) as count FROM borrowing WHERE user_id = ? AND return_date IS NOT NULL",
-        (user_id,),
-        fetch_one=True
-    )
-    stats['total_read'] = total_read['count'] if total_read else 0
-    
-    # Currently borrowed
-    currently_borrowed = Database.execute_query(
-        "SELECT COUNT(*) as count FROM borrowing WHERE user_id = ? AND return_date IS NULL",
-        (user_id,),
-        fetch_one=True
-    )
-    stats['currently_borrowed'] = currently_borrowed['count'] if currently_borrowed else 0
-    
-    # Total time reading (days)
-    reading_time = Database.execute_query(
-        """SELECT SUM(julianday(COALESCE(return_date, date('now'))) - julianday(checkout_date)) as days 
-           FROM borrowing WHERE user_id = ?""",
-        (user_id,),
-        fetch_one=True
-    )
-    stats['total_reading_days'] = int(reading_time['days']) if reading_time and reading_time['days'] else 0
-    
-    # Favorite genre - simplified to use books table directly
-    fav_genre = Database.execute_query(
-        """SELECT b.genre, COUNT(*) as count 
-           FROM borrowing br 
-           JOIN books b ON br.book_id = b.book_id
-           WHERE br.user_id = ? AND b.genre IS NOT NULL
-           GROUP BY b.genre
-           ORDER BY count DESC LIMIT 1""",
-        (user_id,),
-        fetch_one=True
-    )
-    stats['favorite_genre'] = fav_genre['genre'] if fav_genre else 'N/A'
-    
-    return stats
+    """Get comprehensive member statistics from the member_stats row"""
+    member = MemberStats.get(user_id)
+    return {
+        'total_borrowed': int(member['total_borrowed'] or 0),
+        'total_read': int(member['total_returned'] or 0),
+        'currently_borrowed': int(member['currently_borrowed'] or 0),
+        'total_reading_days': int(member['reading_days'] or 0),
+        'favorite_genre': member['favorite_genre'] or 'N/A',
+        'last_activity': member['last_activity_at'],
+    }
 
 # ================================================================
 # UI STYLING
@@ -5267,8 +8835,9 @@ def show_dashboard():
                 query += " AND is_active = 0"
 
             if search_term:
-                query += " AND (username LIKE ? OR full_name LIKE ? OR email LIKE ?)"
-                params.extend([f"%{search_term}%", f"%{search_term}%", f"%{search_term}%"])
+                member_clause, member_params = MemberDirectory.match_clause(search_term)
+                query += f" AND {member_clause}"
+                params.extend(member_params)
 
             query += " ORDER BY created_at DESC"
             all_users = Database.execute_query(query, params) if params else Database.execute_query(query)
@@ -5353,25 +8922,20 @@ def show_dashboard():
             # KPI Row 1
             col1, col2, col3, col4, col5, col6 = st.columns(6, gap="small")
 
-            total_users = Database.execute_query("SELECT COUNT(*) as count FROM users", fetch_one=True)
-            active_users = Database.execute_query("SELECT COUNT(*) as count FROM users WHERE is_active = 1", fetch_one=True)
-            total_members = Database.execute_query("SELECT COUNT(*) as count FROM users WHERE role = 'member'", fetch_one=True)
-            total_admins = Database.execute_query("SELECT COUNT(*) as count FROM users WHERE role IN ('admin', 'librarian')", fetch_one=True)
-            total_books = Database.execute_query("SELECT COUNT(*) as count FROM books", fetch_one=True)
-            total_transactions = Database.execute_query("SELECT COUNT(*) as count FROM borrowing", fetch_one=True)
+            kpi = KpiCounters.get()
 
             with col1:
-                st.metric("Total Users", total_users['count'] if total_users else 0)
+                st.metric("Total Users", kpi['total_users'])
             with col2:
-                st.metric("Active Users", active_users['count'] if active_users else 0)
+                st.metric("Active Users", kpi['active_users'])
             with col3:
-                st.metric("Members", total_members['count'] if total_members else 0)
+                st.metric("Members", kpi['total_members'])
             with col4:
-                st.metric("Admins", total_admins['count'] if total_admins else 0)
+                st.metric("Admins", kpi['total_admins'])
             with col5:
-                st.metric("Total Books", total_books['count'] if total_books else 0)
+                st.metric("Total Books", kpi['total_books'])
             with col6:
-                st.metric("Transactions", total_transactions['count'] if total_transactions else 0)
+                st.metric("Transactions", kpi['total_borrowings'])
 
             st.divider()
 
@@ -5380,41 +8944,18 @@ def show_dashboard():
 
             with col1:
                 st.write("**Borrowing Status**")
-                active_borrowing = Database.execute_query(
-                    "SELECT COUNT(*) as count FROM borrowing WHERE return_date IS NULL",
-                    fetch_one=True
-                )
-                overdue = Database.execute_query(
-                    "SELECT COUNT(*) as count FROM borrowing WHERE return_date IS NULL AND due_date < date('now')",
-                    fetch_one=True
-                )
-                returned = Database.execute_query(
-                    "SELECT COUNT(*) as count FROM borrowing WHERE return_date IS NOT NULL",
-                    fetch_one=True
-                )
-
-                st.metric("Active Borrowings", active_borrowing['count'] if active_borrowing else 0)
-                st.metric("Overdue Items", overdue['count'] if overdue else 0)
-                st.metric("Returned Items", returned['count'] if returned else 0)
+                st.metric("Active Borrowings", kpi['active_borrowings'])
+                st.metric("Overdue Items", kpi['overdue_borrowings'])
+                st.metric("Returned Items", kpi['returned_borrowings'])
 
             with col2:
                 st.write("**Financial**")
-                total_fines = Database.execute_query(
-                    "SELECT COALESCE(SUM(fine_amount), 0) as total FROM fines WHERE status = 'paid'",
-                    fetch_one=True
-                )
-                pending_fines = Database.execute_query(
-                    "SELECT COALESCE(SUM(fine_amount), 0) as total FROM fines WHERE status = 'pending'",
-                    fetch_one=True
-                )
-                users_with_fines = Database.execute_query(
-                    "SELECT COUNT(DISTINCT user_id) as count FROM users WHERE fine_balance > 0",
-                    fetch_one=True
-                )
+                st.metric("Fines Collected", f"${kpi['fines_paid']:.2f}")
+                st.metric("Pending Fines", f"${kpi['fines_pending']:.2f}")
+                st.metric("Users with Fines", kpi['users_with_fines'])
 
-                st.metric("Fines Collected", f"${total_fines['total']:.2f}" if total_fines else "$0.00")
-                st.metric("Pending Fines", f"${pending_fines['total']:.2f}" if pending_fines else "$0.00")
-                st.metric("Users with Fines", users_with_fines['count'] if users_with_fines else 0)
+            if kpi.get('refreshed_at'):
+                st.caption(f"Overdue and activity figures refreshed {format_datetime(kpi['refreshed_at'])}")
 
         # ============ TAB 3: DETAILED ACTIVITY LOGS ============
         with sa_tab3:
@@ -5427,18 +8968,18 @@ def show_dashboard():
                 log_type = st.selectbox("Activity Type", ["All", "Login", "Borrowing", "Returns", "Fines"], key="sa_log_type")
 
             # User activity
-            activity_query = """
+            activity_query = f"""
                 SELECT u.username, u.full_name, u.role,
                        MAX(b.checkout_date) as last_activity,
                        COUNT(b.borrowing_id) as borrowing_count
                 FROM users u
-                LEFT JOIN borrowing b ON u.user_id = b.user_id AND date(b.checkout_date) >= date('now', '-' || ? || ' days')
+                LEFT JOIN borrowing b ON u.user_id = b.user_id AND b.checkout_day >= {LoanDates.TODAY} - ?
                 GROUP BY u.user_id
                 HAVING MAX(b.checkout_date) IS NOT NULL
                 ORDER BY MAX(b.checkout_date) DESC
             """
 
-            activities = Database.execute_query(activity_query, (log_days,))
+            activities = Database.execute_query(activity_query, (int(log_days),))
 
             if activities:
                 df_activities = []
@@ -5763,43 +9304,21 @@ def show_dashboard():
         # ============ EXECUTIVE SUMMARY - KEY METRICS ============
         st.markdown("#### **Executive Summary**")
 
-        # Core statistics
-        total_books = Database.execute_query(
-            "SELECT COUNT(*) as count FROM books WHERE is_available = 1",
-            fetch_one=True
-        )
-        total_members = Database.execute_query(
-            "SELECT COUNT(*) as count FROM users WHERE role = 'member' AND is_active = 1",
-            fetch_one=True
-        )
-        active_borrowings = Database.execute_query(
-            "SELECT COUNT(*) as count FROM borrowing WHERE return_date IS NULL",
-            fetch_one=True
-        )
-        overdue_books = Database.execute_query(
-            "SELECT COUNT(*) as count FROM borrowing WHERE return_date IS NULL AND due_date < date('now')",
-            fetch_one=True
-        )
+        # Core statistics, all from the KPI counter row
+        kpi = KpiCounters.get()
+        loans = LoanKpiEngine.compute()
+        total_books = {'count': kpi['available_books']}
+        total_members = {'count': kpi['active_members']}
+        active_borrowings = {'count': loans['active_loans']}
+        overdue_books = {'count': loans['overdue_loans']}
 
         # Calculate additional metrics
-        total_inventory = Database.execute_query(
-            "SELECT COUNT(*) as count FROM book_inventory",
-            fetch_one=True
-        )
-        inventory_available = Database.execute_query(
-            "SELECT COUNT(*) as count FROM book_inventory WHERE is_available = 1",
-            fetch_one=True
-        )
+        total_inventory = {'count': kpi['total_inventory']}
+        inventory_available = {'count': kpi['available_inventory']}
 
         # Circulation metrics
-        total_authors = Database.execute_query(
-            "SELECT COUNT(DISTINCT author) as count FROM books WHERE author IS NOT NULL",
-            fetch_one=True
-        )
-        total_genres = Database.execute_query(
-            "SELECT COUNT(DISTINCT genre) as count FROM books WHERE genre IS NOT NULL",
-            fetch_one=True
-        )
+        total_authors = {'count': kpi['distinct_authors']}
+        total_genres = {'count': kpi['distinct_genres']}
 
         # Performance metrics
         circulation_rate = 0
@@ -5815,14 +9334,8 @@ def show_dashboard():
             overdue_rate = (overdue_books['count'] / active_borrowings['count']) * 100
 
         # Member engagement
-        active_members_7d = Database.execute_query(
-            "SELECT COUNT(DISTINCT user_id) as count FROM borrowing WHERE checkout_date >= date('now', '-7 days')",
-            fetch_one=True
-        )
-        active_members_30d = Database.execute_query(
-            "SELECT COUNT(DISTINCT user_id) as count FROM borrowing WHERE checkout_date >= date('now', '-30 days')",
-            fetch_one=True
-        )
+        active_members_7d = {'count': kpi['active_borrowers_7d']}
+        active_members_30d = {'count': kpi['active_borrowers_30d']}
 
         col1, col2, col3, col4, col5, col6 = st.columns(6, gap="small")
 
@@ -5850,6 +9363,11 @@ def show_dashboard():
             with st.container(border=True):
                 st.markdown(f"<div style='text-align:center'><h3 style='margin:0;font-weight:700'>{total_genres['count'] if total_genres else 0}</h3><p style='margin:5px 0 0 0;font-size:0.9em;font-weight:500;opacity:0.8'>Genres</p></div>", unsafe_allow_html=True)
 
+        st.caption(
+            f"Due today: {loans['due_today']} · Due this week: {loans['due_this_week']} · "
+            f"Checked out today: {loans['today_checkouts']} · Returned today: {loans['today_returns']}"
+        )
+
         st.divider()
 
         # ============ PERFORMANCE INDICATORS ============
@@ -5915,14 +9433,14 @@ def show_dashboard():
 
             with col1:
                 st.write("**Daily Borrowing Activity (Last 30 Days)**")
-                daily_data = Database.execute_query("""
+                daily_data = Database.execute_query(f"""
                     SELECT date(checkout_date) as date,
                            COUNT(*) as borrows,
                            COUNT(DISTINCT user_id) as unique_members
                     FROM borrowing
-                    WHERE checkout_date >= date('now', '-30 days')
-                    GROUP BY date(checkout_date)
-                    ORDER BY date
+                    WHERE checkout_day >= {LoanDates.now_sql('-30 days')}
+                    GROUP BY checkout_day
+                    ORDER BY checkout_day
                 """)
 
                 if daily_data:
@@ -5942,12 +9460,12 @@ def show_dashboard():
 
             with col2:
                 st.write("**Monthly Borrowing Comparison (12 Months)**")
-                monthly_data = Database.execute_query("""
+                monthly_data = Database.execute_query(f"""
                     SELECT strftime('%Y-%m', checkout_date) as month,
                            COUNT(*) as borrows,
                            COUNT(DISTINCT user_id) as members
                     FROM borrowing
-                    WHERE checkout_date >= date('now', '-12 months')
+                    WHERE checkout_day >= {LoanDates.now_sql('-12 months')}
                     GROUP BY month
                     ORDER BY month
                 """)
@@ -5968,16 +9486,16 @@ def show_dashboard():
             col1, col2 = st.columns(2, gap="small")
 
             with col1:
-                return_data = Database.execute_query("""
+                return_data = Database.execute_query(f"""
                     SELECT
                         CASE
                             WHEN return_date IS NULL THEN 'Active'
-                            WHEN return_date <= due_date THEN 'On-Time'
+                            WHEN return_day <= due_day THEN 'On-Time'
                             ELSE 'Late'
                         END as status,
                         COUNT(*) as count
                     FROM borrowing
-                    WHERE checkout_date >= date('now', '-90 days')
+                    WHERE checkout_day >= {LoanDates.now_sql('-90 days')}
                     GROUP BY status
                 """)
 
@@ -5995,12 +9513,12 @@ def show_dashboard():
                     st.info("No data available")
 
             with col2:
-                overdue_trend = Database.execute_query("""
+                overdue_trend = Database.execute_query(f"""
                     SELECT strftime('%Y-%m', due_date) as month,
                            COUNT(*) as overdue_count
                     FROM borrowing
-                    WHERE return_date IS NULL AND due_date < date('now')
-                    AND due_date >= date('now', '-12 months')
+                    WHERE return_date IS NULL
+                    AND due_day >= {LoanDates.now_sql('-12 months')} AND due_day < {LoanDates.TODAY}
                     GROUP BY month
                     ORDER BY month
                 """)
@@ -6024,13 +9542,13 @@ def show_dashboard():
 
             with col1:
                 st.write("**Genre Popularity (Last 90 Days)**")
-                genre_data = Database.execute_query("""
+                genre_data = Database.execute_query(f"""
                     SELECT b.genre,
                            COUNT(DISTINCT br.borrowing_id) as borrow_count,
                            COUNT(DISTINCT br.user_id) as unique_members
                     FROM books b
                     LEFT JOIN borrowing br ON b.book_id = br.book_id
-                           AND br.checkout_date >= date('now', '-90 days')
+                           AND br.checkout_day >= {LoanDates.now_sql('-90 days')}
                     WHERE b.genre IS NOT NULL
                     GROUP BY b.genre
                     ORDER BY borrow_count DESC
@@ -6092,13 +9610,13 @@ def show_dashboard():
 
             with col1:
                 st.write("**Most Borrowed Authors**")
-                author_data = Database.execute_query("""
+                author_data = Database.execute_query(f"""
                     SELECT b.author,
                            COUNT(DISTINCT br.borrowing_id) as borrow_count,
                            COUNT(DISTINCT b.book_id) as book_count
                     FROM books b
                     LEFT JOIN borrowing br ON b.book_id = br.book_id
-                           AND br.checkout_date >= date('now', '-90 days')
+                           AND br.checkout_day >= {LoanDates.now_sql('-90 days')}
                     WHERE b.author IS NOT NULL
                     GROUP BY b.author
                     ORDER BY borrow_count DESC
@@ -6148,13 +9666,13 @@ def show_dashboard():
 
             with col1:
                 st.write("**Member Activity Heatmap (7-Day Window)**")
-                activity_data = Database.execute_query("""
+                activity_data = Database.execute_query(f"""
                     SELECT
                         strftime('%w', checkout_date) as day_of_week,
                         strftime('%H', checkout_date) as hour,
                         COUNT(*) as activity_count
                     FROM borrowing
-                    WHERE checkout_date >= date('now', '-7 days')
+                    WHERE checkout_day >= {LoanDates.now_sql('-7 days')}
                     GROUP BY day_of_week, hour
                 """)
 
@@ -6189,7 +9707,7 @@ def show_dashboard():
 
             with col2:
                 st.write("**Member Engagement Tiers**")
-                engagement_data = Database.execute_query("""
+                engagement_data = Database.execute_query(f"""
                     SELECT
                         CASE
                             WHEN borrow_count >= 20 THEN 'Power Users (20+)'
@@ -6201,7 +9719,7 @@ def show_dashboard():
                     FROM (
                         SELECT user_id, COUNT(*) as borrow_count
                         FROM borrowing
-                        WHERE checkout_date >= date('now', '-90 days')
+                        WHERE checkout_day >= {LoanDates.now_sql('-90 days')}
                         GROUP BY user_id
                     )
                     GROUP BY tier
@@ -6290,7 +9808,7 @@ def show_dashboard():
 
             with col1:
                 st.write("**Borrowing Duration Analysis**")
-                duration_data = Database.execute_query("""
+                duration_data = Database.execute_query(f"""
                     SELECT
                         CASE
                             WHEN days_borrowed = 0 THEN '0 days'
@@ -6303,12 +9821,9 @@ def show_dashboard():
                         ROUND(AVG(days_borrowed), 1) as avg_days
                     FROM (
                         SELECT
-                            CASE
-                                WHEN return_date IS NOT NULL THEN julianday(return_date) - julianday(checkout_date)
-                                ELSE julianday('now') - julianday(checkout_date)
-                            END as days_borrowed
+                            COALESCE(return_day, {LoanDates.TODAY}) - checkout_day as days_borrowed
                         FROM borrowing
-                        WHERE checkout_date >= date('now', '-90 days')
+                        WHERE checkout_day >= {LoanDates.now_sql('-90 days')}
                     )
                     GROUP BY duration_bucket
                 """)
@@ -6327,7 +9842,7 @@ def show_dashboard():
 
             with col2:
                 st.write("**Demand vs Supply Analysis**")
-                demand_data = Database.execute_query("""
+                demand_data = Database.execute_query(f"""
                     SELECT
                         b.genre,
                         COUNT(b.book_id) as available_copies,
@@ -6335,7 +9850,7 @@ def show_dashboard():
                         ROUND(CAST(COUNT(br.borrowing_id) AS REAL) / COUNT(b.book_id), 2) as demand_ratio
                     FROM books b
                     LEFT JOIN borrowing br ON b.book_id = br.book_id
-                           AND br.checkout_date >= date('now', '-30 days')
+                           AND br.checkout_day >= {LoanDates.now_sql('-30 days')}
                     WHERE b.genre IS NOT NULL
                     GROUP BY b.genre
                     HAVING COUNT(b.book_id) > 0
@@ -6358,18 +9873,9 @@ def show_dashboard():
             st.write("**Performance Scorecard**")
 
             # Calculate advanced metrics
-            total_checkouts = Database.execute_query(
-                "SELECT COUNT(*) as count FROM borrowing",
-                fetch_one=True
-            )
-            on_time_returns = Database.execute_query(
-                "SELECT COUNT(*) as count FROM borrowing WHERE return_date IS NOT NULL AND return_date <= due_date",
-                fetch_one=True
-            )
-            total_fines = Database.execute_query(
-                "SELECT COALESCE(SUM(fine_amount), 0) as total FROM fines WHERE status = 'paid'",
-                fetch_one=True
-            )
+            total_checkouts = {'count': kpi['total_borrowings']}
+            on_time_returns = {'count': kpi['on_time_returns']}
+            total_fines = {'total': kpi['fines_paid']}
 
             on_time_pct = 0
             if total_checkouts and total_checkouts['count'] > 0 and on_time_returns:
@@ -6399,14 +9905,8 @@ def show_dashboard():
             health_scores = {}
 
             # 1. Collection Health
-            total_collection = Database.execute_query(
-                "SELECT COUNT(*) as count FROM books",
-                fetch_one=True
-            )
-            diverse_genres = Database.execute_query(
-                "SELECT COUNT(DISTINCT genre) as count FROM books WHERE genre IS NOT NULL",
-                fetch_one=True
-            )
+            total_collection = {'count': kpi['total_books']}
+            diverse_genres = {'count': kpi['distinct_genres']}
             collection_health = (diverse_genres['count'] / 20) * 100 if diverse_genres and diverse_genres['count'] > 0 else 0
             collection_health = min(100, collection_health)
             health_scores['Collection Diversity'] = collection_health
@@ -6502,9 +10002,9 @@ def show_dashboard():
             leaderboard_period = st.selectbox("Period", ["This Month", "Last 30 Days", "This Year", "All Time"])
         
         period_conditions = {
-            "This Month": "AND date(br.checkout_date) >= date('now', 'start of month')",
-            "Last 30 Days": "AND br.checkout_date >= date('now', '-30 days')",
-            "This Year": "AND strftime('%Y', br.checkout_date) = strftime('%Y', 'now')",
+            "This Month": f"AND br.checkout_day >= {LoanDates.now_sql('start of month')}",
+            "Last 30 Days": f"AND br.checkout_day >= {LoanDates.now_sql('-30 days')}",
+            "This Year": f"AND br.checkout_day >= {LoanDates.now_sql('start of year')}",
             "All Time": ""
         }
         
@@ -6543,13 +10043,13 @@ def show_dashboard():
         if overdue_books and overdue_books['count'] > 0:
             st.divider()
             st.subheader(" Overdue Books")
-            overdue = Database.execute_query("""
+            overdue = Database.execute_query(f"""
                 SELECT b.title, u.full_name, u.email, br.due_date,
-                       julianday('now') - julianday(br.due_date) as days_overdue
+                       {LoanDates.TODAY} - br.due_day as days_overdue
                 FROM borrowing br
                 JOIN books b ON br.book_id = b.book_id
                 JOIN users u ON br.user_id = u.user_id
-                WHERE br.return_date IS NULL AND br.due_date < date('now')
+                WHERE br.return_date IS NULL AND br.due_day < {LoanDates.TODAY}
                 ORDER BY days_overdue DESC
             """)
             if overdue:
@@ -6561,16 +10061,12 @@ def show_dashboard():
         
         col1, col2, col3 = st.columns(3, gap="small")
         
-        borrowed = Database.execute_query(
-            "SELECT COUNT(*) as count FROM borrowing WHERE user_id = ? AND return_date IS NULL",
-            (user['user_id'],),
-            fetch_one=True
-        )
+        borrowed = {'count': MemberStats.get(user['user_id'])['currently_borrowed']}
         
         books_read = Database.execute_query(
-            """SELECT COUNT(*) as count FROM transactions 
+            f"""SELECT COUNT(*) as count FROM transactions 
                WHERE user_id = ? AND transaction_type = 'return' 
-               AND strftime('%Y', transaction_date) = strftime('%Y', 'now')""",
+               AND transaction_day >= {LoanDates.now_sql('start of year')}""",
             (user['user_id'],),
             fetch_one=True
         )
@@ -6608,9 +10104,9 @@ def show_dashboard():
         st.divider()
         st.subheader(" My Borrowed Books")
         
-        my_books = Database.execute_query("""
+        my_books = Database.execute_query(f"""
             SELECT b.title, br.checkout_date, br.due_date,
-                   julianday(br.due_date) - julianday('now') as days_remaining
+                   br.due_day - {LoanDates.TODAY} as days_remaining
             FROM borrowing br
             JOIN books b ON br.book_id = b.book_id
             WHERE br.user_id = ? AND br.return_date IS NULL
@@ -6650,10 +10146,15 @@ def show_books(embedded=False):
             use_fuzzy = st.checkbox(" Fuzzy Search (Tolerate Typos)")
         
         with col2:
-            # Get genres for filter from books table
-            genres = Database.execute_query("SELECT DISTINCT genre FROM books WHERE genre IS NOT NULL ORDER BY genre")
-            genre_options = ["All Genres"] + [g['genre'] for g in genres] if genres else ["All Genres"]
-            selected_genre = st.selectbox(" Genre Filter", genre_options)
+            # Genre options with counts from the materialized facets
+            genre_counts = {
+                g['value']: g['book_count'] for g in CatalogFacets.global_counts('genre') if g['value'] != 'Unknown'
+            }
+            genre_options = ["All Genres"] + list(genre_counts)
+            selected_genre = st.selectbox(
+                " Genre Filter", genre_options,
+                format_func=lambda g: f"{g} ({genre_counts[g]})" if g in genre_counts else g
+            )
             
             # Availability filter
             availability_filter = st.selectbox(" Availability", ["All", "Available Only", "Checked Out"])
@@ -6677,19 +10178,22 @@ def show_books(embedded=False):
                 "Date Added (Oldest)"
             ])
     
+    page_size_col, _ = st.columns([1, 3], gap="small")
+    with page_size_col:
+        page_size = st.selectbox(" Page Size", CatalogPager.PAGE_SIZES, index=1, key="browse_page_size")
+    
     # Build query
-    query = """
-        SELECT DISTINCT b.book_id, b.isbn, b.title, b.publication_year, b.created_at,
-               b.publisher, b.popularity_score,
-               b.keywords, b.author as authors, b.genre as genres
-        FROM books b
-        WHERE b.is_available = 1
+    book_columns = """
+        b.book_id, b.isbn, b.title, b.publication_year, b.created_at,
+        b.publisher, b.popularity_score,
+        b.keywords, b.author as authors, b.genre as genres
     """
+    where_clause = "b.is_available = 1"
     params = []
     
     # Search filter
     if search and not use_fuzzy:
-        query += """ AND (
+        where_clause += """ AND (
             b.title LIKE ? OR 
             b.isbn LIKE ? OR 
             b.keywords LIKE ? OR
@@ -6698,56 +10202,92 @@ def show_books(embedded=False):
         search_term = f'%{search}%'
         params.extend([search_term, search_term, search_term, search_term])
     
-    # Genre filter
+    # Genre filter, trimmed like the facet values offered in the selectbox
     if selected_genre != "All Genres":
-        query += " AND b.genre = ?"
+        where_clause += " AND TRIM(b.genre) = ?"
         params.append(selected_genre)
     
     # Availability filter - simplified based on is_available flag
     if availability_filter == "Available Only":
-        query += " AND b.is_available = 1"
+        where_clause += " AND b.is_available = 1"
     elif availability_filter == "Checked Out":
         # Find books that are currently borrowed
-        query += """ AND b.book_id IN (
+        where_clause += """ AND b.book_id IN (
             SELECT DISTINCT book_id FROM borrowing 
             WHERE return_date IS NULL
         )"""
     
     # Year filter
     if year_from and year_to:
-        query += " AND b.publication_year BETWEEN ? AND ?"
+        where_clause += " AND b.publication_year BETWEEN ? AND ?"
         params.extend([year_from, year_to])
     
     # Sort
-    if sort_by == "Title (A-Z)":
-        query += " ORDER BY b.title ASC"
-    elif sort_by == "Title (Z-A)":
-        query += " ORDER BY b.title DESC"
-    elif sort_by == "Popularity (High to Low)":
-        query += " ORDER BY b.popularity_score DESC, bs.average_rating DESC"
-    elif sort_by == "Popularity (Low to High)":
-        query += " ORDER BY b.popularity_score ASC, bs.average_rating ASC"
-    elif sort_by == "Year (Newest First)":
-        query += " ORDER BY b.publication_year DESC"
-    elif sort_by == "Year (Oldest First)":
-        query += " ORDER BY b.publication_year ASC"
-    elif sort_by == "Date Added (Newest)":
-        query += " ORDER BY b.created_at DESC"
-    elif sort_by == "Date Added (Oldest)":
-        query += " ORDER BY b.created_at ASC"
-    
-    query += " LIMIT 100"
-    
-    books = Database.execute_query(query, tuple(params) if params else None)
-    
-    # Apply fuzzy search if enabled
-    if search and use_fuzzy and books:
-        books = fuzzy_search.search_books(search, books, threshold=60)
+    sort_modes = {
+        "Title (A-Z)": 'title_asc',
+        "Title (Z-A)": 'title_desc',
+        "Popularity (High to Low)": 'popularity_desc',
+        "Popularity (Low to High)": 'popularity_asc',
+        "Year (Newest First)": 'year_desc',
+        "Year (Oldest First)": 'year_asc',
+        "Date Added (Newest)": 'added_desc',
+        "Date Added (Oldest)": 'added_asc',
+    }
+    
+    # Filters the in-memory snapshot can answer without SQL (text search cannot)
+    snapshot_filters = None
+    if Config.CATALOG_SNAPSHOT_ENABLED and not search and availability_filter != "Checked Out":
+        snapshot_filters = {
+            'is_available': 1,
+            'genre': selected_genre if selected_genre != "All Genres" else None,
+            'year_from': year_from,
+            'year_to': year_to,
+        }
+    
+    pager_state = CatalogPager.get_state(
+        "browse_pager",
+        (where_clause, tuple(params), sort_by, search if use_fuzzy else None, page_size, snapshot_filters is not None)
+    )
+    
+    snapshot_page = None
+    if snapshot_filters is not None:
+        snapshot_page = CatalogSnapshot.query_page(
+            snapshot_filters, sort_modes.get(sort_by, 'title_asc'),
+            page_size=page_size, cursor=pager_state['cursors'][-1]
+        )
+    
+    # Facets describe the listed result set, so fuzzy mode narrows them to the matches
+    facet_where, facet_params = where_clause, tuple(params)
+    if search and use_fuzzy:
+        # Fuzzy matches are ordered by score and paged by offset
+        offset = (len(pager_state['cursors']) - 1) * page_size
+        books, fuzzy_ids = EnhancedSearchFilter.filtered_fuzzy_search(
+            search, where_clause, tuple(params),
+            threshold=60, limit=page_size, offset=offset, columns=book_columns
+        )
+        pager_state['next_cursor'] = None
+        has_next_page = offset + len(books) < len(fuzzy_ids)
+        facet_where = "b.book_id IN (SELECT value FROM json_each(?))"
+        facet_params = (json.dumps(fuzzy_ids),)
+    elif snapshot_page is not None:
+        page_ids, pager_state['next_cursor'] = snapshot_page
+        books = CatalogPager.fetch_by_ids(book_columns, page_ids)
+        has_next_page = pager_state['next_cursor'] is not None
+    else:
+        books, pager_state['next_cursor'] = CatalogPager.fetch_page(
+            book_columns, where_clause, tuple(params),
+            sort_mode=sort_modes.get(sort_by, 'title_asc'),
+            page_size=page_size, cursor=pager_state['cursors'][-1]
+        )
+        has_next_page = pager_state['next_cursor'] is not None
     
     if books:
         # Show count and filters applied
         st.success(f" Found **{len(books)}** books")
         
+        with st.expander(" Result Facets", expanded=False):
+            CatalogFacets.render_counts(CatalogFacets.filtered_counts(facet_where, facet_params))
+        
         # Display summary of active filters
         active_filters = []
         if search:
@@ -6831,8 +10371,12 @@ def show_books(embedded=False):
                             st.info("Reservation feature coming soon!")
                 
                 st.divider()
+        
+        CatalogPager.render_controls("browse_pager", pager_state, has_next_page)
     else:
         st.warning(" No books found matching your criteria. Try adjusting the filters.")
+        if len(pager_state['cursors']) > 1:
+            CatalogPager.render_controls("browse_pager", pager_state, False)
 
 def show_account():
     """Robust account center with profile health, analytics, security, and data controls."""
@@ -7453,15 +10997,15 @@ def show_account():
 
         notify_date_local = now_local.date().isoformat()
         due_items = Database.execute_query(
-            """
+            f"""
             SELECT br.borrowing_id, b.title, br.due_date,
-                   CAST(julianday(br.due_date) - julianday(date('now')) AS INTEGER) as days_until_due
+                   br.due_day - {LoanDates.TODAY} as days_until_due
             FROM borrowing br
             JOIN books b ON br.book_id = b.book_id
             WHERE br.user_id = ?
               AND br.return_date IS NULL
-              AND br.due_date <= date('now', '+' || ? || ' days')
-            ORDER BY br.due_date ASC
+              AND br.due_day <= {LoanDates.TODAY} + ?
+            ORDER BY br.due_day ASC
             """,
             (account['user_id'], to_int(scan_pref.get('deadline_threshold_days'), 3))
         ) or []
@@ -7715,22 +11259,11 @@ def show_account():
             )
 
         if can_use_persisted_features:
-            borrow_health = Database.execute_query(
-                """
-                SELECT
-                    COUNT(*) as active_count,
-                    SUM(CASE WHEN due_date < date('now') THEN 1 ELSE 0 END) as overdue_count,
-                    SUM(CASE WHEN due_date BETWEEN date('now') AND date('now', '+3 days') THEN 1 ELSE 0 END) as due_soon_count
-                FROM borrowing
-                WHERE user_id = ? AND return_date IS NULL
-                """,
-                (account['user_id'],),
-                fetch_one=True
-            )
+            borrow_health = LoanKpiEngine.compute(due_soon_days=3, user_id=account['user_id'])
 
-            active_count = to_int(borrow_health.get('active_count') if borrow_health else 0)
-            overdue_count = to_int(borrow_health.get('overdue_count') if borrow_health else 0)
-            due_soon_count = to_int(borrow_health.get('due_soon_count') if borrow_health else 0)
+            active_count = to_int(borrow_health.get('active_loans'))
+            overdue_count = to_int(borrow_health.get('overdue_loans'))
+            due_soon_count = to_int(borrow_health.get('due_soon'))
 
             c1, c2, c3 = st.columns(3, gap="small")
             c1.metric("Active Borrowings", active_count)
@@ -7738,11 +11271,11 @@ def show_account():
             c3.metric("Due in 3 Days", due_soon_count)
 
             active_items = Database.execute_query(
-                """
+                f"""
                 SELECT b.title,
                        br.checkout_date,
                        br.due_date,
-                       CAST(julianday(br.due_date) - julianday(date('now')) AS INTEGER) as days_left
+                       br.due_day - {LoanDates.TODAY} as days_left
                 FROM borrowing br
                 JOIN books b ON br.book_id = b.book_id
                 WHERE br.user_id = ? AND br.return_date IS NULL
@@ -7786,12 +11319,12 @@ def show_account():
             st.divider()
 
             monthly_activity = Database.execute_query(
-                """
+                f"""
                 SELECT strftime('%Y-%m', checkout_date) as month,
                        COUNT(*) as borrow_count,
-                       AVG(julianday(COALESCE(return_date, date('now'))) - julianday(checkout_date)) as avg_duration
+                       AVG(COALESCE(return_day, {LoanDates.TODAY}) - checkout_day) as avg_duration
                 FROM borrowing
-                WHERE user_id = ? AND checkout_date >= date('now', '-12 months')
+                WHERE user_id = ? AND checkout_day >= {LoanDates.now_sql('-12 months')}
                 GROUP BY month
                 ORDER BY month
                 """,
@@ -7827,18 +11360,7 @@ def show_account():
                 )
                 st.plotly_chart(fig, use_container_width=True)
 
-            genre_distribution = Database.execute_query(
-                """
-                SELECT COALESCE(b.genre, 'Unknown') as genre, COUNT(*) as count
-                FROM borrowing br
-                JOIN books b ON br.book_id = b.book_id
-                WHERE br.user_id = ?
-                GROUP BY COALESCE(b.genre, 'Unknown')
-                ORDER BY count DESC
-                LIMIT 8
-                """,
-                (account['user_id'],)
-            )
+            genre_distribution = MemberStats.genres(account['user_id'], 8)
 
             if genre_distribution:
                 st.subheader("Genre Distribution")
@@ -7847,9 +11369,9 @@ def show_account():
                 st.plotly_chart(fig_genre, use_container_width=True)
 
             recent_history = Database.execute_query(
-                """
+                f"""
                 SELECT b.title, b.isbn, br.checkout_date, br.return_date,
-                       ROUND(julianday(COALESCE(br.return_date, date('now'))) - julianday(br.checkout_date), 1) as days_borrowed
+                       COALESCE(br.return_day, {LoanDates.TODAY}) - br.checkout_day as days_borrowed
                 FROM borrowing br
                 JOIN books b ON br.book_id = b.book_id
                 WHERE br.user_id = ?
@@ -9056,10 +12578,7 @@ def show_manage_books(embedded=False, browse_only=False):
     with books_workspace_tab:
         st.subheader(" Browse Books")
 
-        language_rows = Database.execute_query(
-            "SELECT DISTINCT COALESCE(NULLIF(TRIM(language), ''), 'Unknown') as language_name FROM books ORDER BY language_name"
-        ) or []
-        language_options = ["All"] + [row['language_name'] for row in language_rows if row.get('language_name')]
+        language_options = ["All"] + [row['value'] for row in CatalogFacets.global_counts('language')]
 
         row1_col1, row1_col2, row1_col3 = st.columns(3, gap="small")
         with row1_col1:
@@ -9095,7 +12614,7 @@ def show_manage_books(embedded=False, browse_only=False):
         with row3_col2:
             year_to = st.number_input("Year To", min_value=1800, max_value=max_year, value=current_year, step=1, key="mb_year_to")
         with row3_col3:
-            max_results = st.slider("Max Results", min_value=20, max_value=300, value=120, step=10, key="mb_limit")
+            page_size = st.selectbox("Page Size", CatalogPager.PAGE_SIZES, index=2, key="mb_page_size")
         with row3_col4:
             fuzzy_threshold = st.slider("Fuzzy Threshold", min_value=30, max_value=95, value=60, step=5, key="mb_fuzzy_threshold")
 
@@ -9150,78 +12669,84 @@ def show_manage_books(embedded=False, browse_only=False):
                 st.rerun()
 
         # Unified book query
-        query = """
-            SELECT b.book_id, b.isbn, b.title, b.author, b.genre, b.publication_year,
-                   b.pages, b.language, b.keywords, b.popularity_score, b.is_available, b.created_at,
-                   (SELECT COUNT(*) FROM book_inventory bi WHERE bi.book_id = b.book_id) as total_copies,
-                   (SELECT COUNT(*) FROM book_inventory bi WHERE bi.book_id = b.book_id AND bi.is_available = 1) as available_copies
-            FROM books b
-            WHERE 1=1
+        book_columns = """
+            b.book_id, b.isbn, b.title, b.author, b.genre, b.publication_year,
+            b.pages, b.language, b.keywords, b.popularity_score, b.is_available, b.created_at,
+            b.total_copies, b.available_copies
         """
+        where_clause = "1=1"
         params = []
 
-        if genre_query:
-            query += " AND b.genre LIKE ?"
+        # Low-cardinality predicates answered by bitmap AND/OR when selective enough
+        bitmap_ids = BitmapIndex.matching_ids(genre_query, language_filter_text, status_filter)
+        bitmap_filtered = bitmap_ids is not None and len(bitmap_ids) <= BitmapIndex.MAX_INLINE_IDS
+        if bitmap_filtered:
+            where_clause += " AND b.book_id IN (SELECT value FROM json_each(?))"
+            params.append(json.dumps(bitmap_ids))
+
+        if genre_query and not bitmap_filtered:
+            where_clause += " AND b.genre LIKE ?"
             params.append(f"%{genre_query}%")
 
         if year_from and year_to:
-            query += " AND b.publication_year BETWEEN ? AND ?"
+            where_clause += " AND b.publication_year BETWEEN ? AND ?"
             params.extend([year_from, year_to])
 
         if search and not use_fuzzy:
-            query += " AND (b.title LIKE ? OR b.author LIKE ? OR b.isbn LIKE ? OR b.keywords LIKE ? OR b.isbn_13 LIKE ? OR b.isbn_10 LIKE ?)"
+            where_clause += " AND (b.title LIKE ? OR b.author LIKE ? OR b.isbn LIKE ? OR b.keywords LIKE ? OR b.isbn_13 LIKE ? OR b.isbn_10 LIKE ?)"
             search_term = f'%{search}%'
             params.extend([search_term, search_term, search_term, search_term, search_term, search_term])
 
         if title_query:
-            query += " AND b.title LIKE ?"
+            where_clause += " AND b.title LIKE ?"
             params.append(f"%{title_query}%")
 
         if author_query:
-            query += " AND b.author LIKE ?"
+            where_clause += " AND b.author LIKE ?"
             params.append(f"%{author_query}%")
 
         if keyword_query:
-            query += " AND b.keywords LIKE ?"
+            where_clause += " AND b.keywords LIKE ?"
             params.append(f"%{keyword_query}%")
 
         if isbn_exact:
-            query += " AND (b.isbn = ? OR b.isbn_13 = ? OR b.isbn_10 = ?)"
+            where_clause += " AND (b.isbn = ? OR b.isbn_13 = ? OR b.isbn_10 = ?)"
             params.extend([isbn_exact, isbn_exact, isbn_exact])
 
-        if language_filter_text:
-            query += " AND COALESCE(NULLIF(TRIM(b.language), ''), 'Unknown') LIKE ?"
+        if language_filter_text and not bitmap_filtered:
+            where_clause += " AND COALESCE(NULLIF(TRIM(b.language), ''), 'Unknown') LIKE ?"
             params.append(f"%{language_filter_text}%")
 
         if int(min_available_copies) > 0:
-            query += " AND (SELECT COUNT(*) FROM book_inventory bi WHERE bi.book_id = b.book_id AND bi.is_available = 1) >= ?"
+            where_clause += " AND b.available_copies >= ?"
             params.append(int(min_available_copies))
 
         if int(min_total_copies) > 0:
-            query += " AND (SELECT COUNT(*) FROM book_inventory bi WHERE bi.book_id = b.book_id) >= ?"
+            where_clause += " AND b.total_copies >= ?"
             params.append(int(min_total_copies))
 
         if float(popularity_min) > 0.0:
-            query += " AND COALESCE(b.popularity_score, 0) >= ?"
+            where_clause += " AND COALESCE(b.popularity_score, 0) >= ?"
             params.append(float(popularity_min))
 
         if float(popularity_max) < 100.0:
-            query += " AND COALESCE(b.popularity_score, 0) <= ?"
+            where_clause += " AND COALESCE(b.popularity_score, 0) <= ?"
             params.append(float(popularity_max))
 
-        if status_filter == "Active":
-            query += " AND b.is_available = 1"
-        elif status_filter == "Inactive":
-            query += " AND b.is_available = 0"
-        elif status_filter == "Available Copies Only":
-            query += " AND EXISTS (SELECT 1 FROM book_inventory bi WHERE bi.book_id = b.book_id AND bi.is_available = 1)"
-        elif status_filter == "Checked Out Only":
-            query += " AND EXISTS (SELECT 1 FROM book_inventory bi WHERE bi.book_id = b.book_id AND bi.is_available = 0)"
+        if not bitmap_filtered:
+            if status_filter == "Active":
+                where_clause += " AND b.is_available = 1"
+            elif status_filter == "Inactive":
+                where_clause += " AND b.is_available = 0"
+            elif status_filter == "Available Copies Only":
+                where_clause += " AND b.available_copies > 0"
+            elif status_filter == "Checked Out Only":
+                where_clause += " AND b.total_copies > b.available_copies"
 
         if date_filter_enabled and isinstance(calendar_range, (tuple, list)) and len(calendar_range) == 2:
             start_date, end_date = calendar_range
             if start_date and end_date:
-                query += " AND date(b.created_at) BETWEEN ? AND ?"
+                where_clause += " AND date(b.created_at) BETWEEN ? AND ?"
                 params.extend([str(start_date), str(end_date)])
         elif quick_date_preset != "None":
             preset_map = {
@@ -9232,28 +12757,76 @@ def show_manage_books(embedded=False, browse_only=False):
             }
             preset_value = preset_map.get(quick_date_preset)
             if preset_value:
-                query += " AND date(b.created_at) >= date('now', ?)"
+                where_clause += " AND date(b.created_at) >= date('now', ?)"
                 params.append(preset_value)
 
-        if sort_by == "Title A-Z":
-            query += " ORDER BY b.title ASC"
-        elif sort_by == "Newest Year":
-            query += " ORDER BY b.publication_year DESC, b.title ASC"
-        elif sort_by == "Popularity High":
-            query += " ORDER BY COALESCE(b.popularity_score, 0) DESC, b.title ASC"
-        else:
-            query += " ORDER BY b.title ASC"
+        sort_modes = {
+            "Title A-Z": 'title_asc',
+            "Newest Year": 'year_desc',
+            "Popularity High": 'popularity_desc',
+        }
+        # Widget-driven filters the in-memory snapshot can answer without SQL
+        snapshot_filters = None
+        text_filters = (search, title_query, author_query, keyword_query, isbn_exact)
+        if Config.CATALOG_SNAPSHOT_ENABLED and not any(text_filters):
+            snapshot_filters = {
+                'genre_contains': genre_query,
+                'language_contains': language_filter_text,
+                'year_from': year_from,
+                'year_to': year_to,
+                'min_available_copies': int(min_available_copies),
+                'min_total_copies': int(min_total_copies),
+                'popularity_min': float(popularity_min) if float(popularity_min) > 0.0 else None,
+                'popularity_max': float(popularity_max) if float(popularity_max) < 100.0 else None,
+                'is_available': {"Active": 1, "Inactive": 0}.get(status_filter),
+                'has_available_copy': status_filter == "Available Copies Only",
+                'has_checked_out_copy': status_filter == "Checked Out Only",
+            }
+            if date_filter_enabled and isinstance(calendar_range, (tuple, list)) and len(calendar_range) == 2:
+                snapshot_filters['added_from'], snapshot_filters['added_to'] = calendar_range
+            elif quick_date_preset != "None":
+                preset_days = {"Last 7 Days": 7, "Last 30 Days": 30, "Last 90 Days": 90, "Last 365 Days": 365}
+                snapshot_filters['added_from'] = date.today() - timedelta(days=preset_days[quick_date_preset])
 
-        query += " LIMIT ?"
-        params.append(max_results)
+        pager_state = CatalogPager.get_state(
+            "mb_pager",
+            (where_clause, tuple(params), sort_by, search if use_fuzzy else None, fuzzy_threshold, page_size,
+             snapshot_filters is not None)
+        )
 
-        books = Database.execute_query(query, tuple(params) if params else None)
+        snapshot_page = None
+        if snapshot_filters is not None:
+            snapshot_page = CatalogSnapshot.query_page(
+                snapshot_filters, sort_modes.get(sort_by, 'title_asc'),
+                page_size=page_size, cursor=pager_state['cursors'][-1]
+            )
 
-        # Apply fuzzy search on top of filtered results
-        if search and use_fuzzy and books:
-            fuzzy_books = EnhancedSearchFilter.fuzzy_search_books(search, threshold=fuzzy_threshold)
-            fuzzy_ids = {b['book_id'] for b in fuzzy_books if b.get('book_id') is not None}
-            books = [book for book in books if book.get('book_id') in fuzzy_ids]
+        facet_where, facet_params = where_clause, tuple(params)
+        if search and use_fuzzy:
+            # Structured filters first, then fuzzy-score only the surviving rows
+            offset = (len(pager_state['cursors']) - 1) * page_size
+            books, fuzzy_ids = EnhancedSearchFilter.filtered_fuzzy_search(
+                search, where_clause, tuple(params),
+                threshold=fuzzy_threshold, limit=page_size, offset=offset, columns=book_columns
+            )
+            fuzzy_total = len(fuzzy_ids)
+            facet_where = "b.book_id IN (SELECT value FROM json_each(?))"
+            facet_params = (json.dumps(fuzzy_ids),)
+            pager_state['next_cursor'] = None
+            has_next_page = offset + len(books) < fuzzy_total
+            if fuzzy_total > len(books):
+                st.caption(f"Showing {offset + 1}-{offset + len(books)} of {fuzzy_total} fuzzy matches")
+        elif snapshot_page is not None:
+            page_ids, pager_state['next_cursor'] = snapshot_page
+            books = CatalogPager.fetch_by_ids(book_columns, page_ids)
+            has_next_page = pager_state['next_cursor'] is not None
+        else:
+            books, pager_state['next_cursor'] = CatalogPager.fetch_page(
+                book_columns, where_clause, tuple(params),
+                sort_mode=sort_modes.get(sort_by, 'title_asc'),
+                page_size=page_size, cursor=pager_state['cursors'][-1]
+            )
+            has_next_page = pager_state['next_cursor'] is not None
 
         if books:
             total_inventory = sum((book.get('total_copies') or 0) for book in books)
@@ -9296,6 +12869,9 @@ def show_manage_books(embedded=False, browse_only=False):
                 active_filters.append(f"Date Preset: {quick_date_preset}")
             active_filters.append(f"Sort: {sort_by}")
             st.caption(" | ".join(active_filters))
+
+            with st.expander("Result Facets", expanded=False):
+                CatalogFacets.render_counts(CatalogFacets.filtered_counts(facet_where, facet_params))
         
         if books:
             st.write(f"Found {len(books)} books")
@@ -9335,7 +12911,7 @@ def show_manage_books(embedded=False, browse_only=False):
 
                             if st.session_state.get(f"show_card_details_{book['book_id']}", False):
                                 with st.expander(f"Details: {book['title']}", expanded=True):
-                                    dtab1, dtab2, dtab3 = st.tabs([" Recommendations", " Reviews", " Condition"])
+                                    dtab1, dtab_also, dtab2, dtab3 = st.tabs([" Recommendations", " Also Borrowed", " Reviews", " Condition"])
 
                                     with dtab1:
                                         recs = SmartUtilities.get_book_recommendations(book['book_id'])
@@ -9345,6 +12921,15 @@ def show_manage_books(embedded=False, browse_only=False):
                                         else:
                                             st.info("No recommendations yet")
 
+                                    with dtab_also:
+                                        also_borrowed = SmartUtilities.get_also_borrowed(book['book_id'])
+                                        if also_borrowed:
+                                            st.caption("Members who borrowed this also borrowed")
+                                            for rec in also_borrowed:
+                                                st.write(f"- {rec.get('title', 'N/A')} ({rec['similarity_score']:.0f}%)")
+                                        else:
+                                            st.info("No borrowing overlap yet")
+
                                     with dtab2:
                                         reviews = ReviewsManager.get_book_reviews(book['book_id'])
                                         if reviews:
@@ -9400,7 +12985,7 @@ def show_manage_books(embedded=False, browse_only=False):
                             if st.button(" Details", key=f"list_details_{book['book_id']}", use_container_width=True):
                                 # Show recommendations, reviews, condition
                                 with st.expander(f"Details: {book['title']}", expanded=True):
-                                    dtab1, dtab2, dtab3 = st.tabs([" Recommendations", " Reviews", " Condition"])
+                                    dtab1, dtab_also, dtab2, dtab3 = st.tabs([" Recommendations", " Also Borrowed", " Reviews", " Condition"])
 
                                     with dtab1:
                                         recs = SmartUtilities.get_book_recommendations(book['book_id'])
@@ -9410,6 +12995,15 @@ def show_manage_books(embedded=False, browse_only=False):
                                         else:
                                             st.info("No recommendations yet")
 
+                                    with dtab_also:
+                                        also_borrowed = SmartUtilities.get_also_borrowed(book['book_id'])
+                                        if also_borrowed:
+                                            st.caption("Members who borrowed this also borrowed")
+                                            for rec in also_borrowed:
+                                                st.write(f"- {rec.get('title', 'N/A')} ({rec['similarity_score']:.0f}%)")
+                                        else:
+                                            st.info("No borrowing overlap yet")
+
                                     with dtab2:
                                         reviews = ReviewsManager.get_book_reviews(book['book_id'])
                                         if reviews:
@@ -9440,8 +13034,12 @@ def show_manage_books(embedded=False, browse_only=False):
                                     st.rerun()
 
                         st.divider()
+
+            CatalogPager.render_controls("mb_pager", pager_state, has_next_page)
         else:
             st.info("No books found")
+            if len(pager_state['cursors']) > 1:
+                CatalogPager.render_controls("mb_pager", pager_state, False)
 
     if browse_only:
         return
@@ -9519,14 +13117,8 @@ def show_manage_books(embedded=False, browse_only=False):
         
         with config_tab2:
             filter_col1, filter_col2, filter_col3, filter_col4 = st.columns(4, gap="small")
-            all_genres = Database.execute_query(
-                "SELECT DISTINCT COALESCE(NULLIF(TRIM(genre), ''), 'Unknown') as genre_name FROM books ORDER BY genre_name"
-            ) or []
-            all_languages = Database.execute_query(
-                "SELECT DISTINCT COALESCE(NULLIF(TRIM(language), ''), 'Unknown') as language_name FROM books ORDER BY language_name"
-            ) or []
-            genre_choices = [g['genre_name'] for g in all_genres if g.get('genre_name')]
-            language_choices = [l['language_name'] for l in all_languages if l.get('language_name')]
+            genre_choices = [g['value'] for g in CatalogFacets.global_counts('genre')]
+            language_choices = [l['value'] for l in CatalogFacets.global_counts('language')]
             
             with filter_col1:
                 selected_genres = st.multiselect("Genres", options=genre_choices, key="bs_genres")
@@ -9657,14 +13249,8 @@ def show_manage_books(embedded=False, browse_only=False):
             st.session_state.bs_top_n = top_n
 
         filter_col1, filter_col2, filter_col3, filter_col4, filter_col5 = st.columns(5, gap="small")
-        all_genres = Database.execute_query(
-            "SELECT DISTINCT COALESCE(NULLIF(TRIM(genre), ''), 'Unknown') as genre_name FROM books ORDER BY genre_name"
-        ) or []
-        all_languages = Database.execute_query(
-            "SELECT DISTINCT COALESCE(NULLIF(TRIM(language), ''), 'Unknown') as language_name FROM books ORDER BY language_name"
-        ) or []
-        genre_choices = [g['genre_name'] for g in all_genres if g.get('genre_name')]
-        language_choices = [l['language_name'] for l in all_languages if l.get('language_name')]
+        genre_choices = [g['value'] for g in CatalogFacets.global_counts('genre')]
+        language_choices = [l['value'] for l in CatalogFacets.global_counts('language')]
         with filter_col1:
             selected_genres = st.multiselect("Genres", options=genre_choices, key="bs_genres")
         with filter_col2:
@@ -9710,10 +13296,10 @@ def show_manage_books(embedded=False, browse_only=False):
             base_filters.append("b.is_available = 1")
 
         if not include_zero_copies:
-            base_filters.append("EXISTS (SELECT 1 FROM book_inventory bi WHERE bi.book_id = b.book_id)")
+            base_filters.append("b.total_copies > 0")
 
         if int(min_copies) > 0:
-            base_filters.append("(SELECT COUNT(*) FROM book_inventory bi WHERE bi.book_id = b.book_id) >= ?")
+            base_filters.append("b.total_copies >= ?")
             base_params.append(int(min_copies))
 
         base_filters.append("COALESCE(b.publication_year, 0) BETWEEN ? AND ?")
@@ -9752,8 +13338,8 @@ def show_manage_books(embedded=False, browse_only=False):
             summary_query = f"""
                 SELECT
                     COUNT(*) as book_count,
-                    SUM((SELECT COUNT(*) FROM book_inventory bi WHERE bi.book_id = b.book_id)) as total_copies,
-                    SUM((SELECT COUNT(*) FROM book_inventory bi WHERE bi.book_id = b.book_id AND bi.is_available = 1)) as available_copies,
+                    SUM(b.total_copies) as total_copies,
+                    SUM(b.available_copies) as available_copies,
                     AVG(COALESCE(b.popularity_score, 0)) as avg_popularity,
                     COUNT(DISTINCT COALESCE(NULLIF(TRIM(b.author), ''), 'Unknown')) as unique_authors,
                     SUM(CASE WHEN b.is_available = 0 THEN 1 ELSE 0 END) as inactive_titles,
@@ -9770,8 +13356,8 @@ def show_manage_books(embedded=False, browse_only=False):
             loan_query = f"""
                 SELECT
                     COUNT(*) as active_loans,
-                    SUM(CASE WHEN date(br.due_date) < date('now') THEN 1 ELSE 0 END) as overdue_loans,
-                    SUM(CASE WHEN date(br.due_date) BETWEEN date('now') AND date('now', '+7 days') THEN 1 ELSE 0 END) as due_next_7
+                    SUM(CASE WHEN br.due_day < {LoanDates.TODAY} THEN 1 ELSE 0 END) as overdue_loans,
+                    SUM(CASE WHEN br.due_day BETWEEN {LoanDates.TODAY} AND {LoanDates.now_sql('+7 days')} THEN 1 ELSE 0 END) as due_next_7
                 FROM borrowing br
                 JOIN book_inventory bi ON br.inventory_id = bi.inventory_id
                 JOIN books b ON bi.book_id = b.book_id
@@ -9800,7 +13386,7 @@ def show_manage_books(embedded=False, browse_only=False):
                     COALESCE(NULLIF(TRIM(b.genre), ''), 'Unknown') as genre,
                     COALESCE(NULLIF(TRIM(b.language), ''), 'Unknown') as language,
                     COUNT(*) as titles,
-                    SUM((SELECT COUNT(*) FROM book_inventory bi WHERE bi.book_id = b.book_id)) as copies
+                    SUM(b.total_copies) as copies
                 FROM books b
                 WHERE {where_clause}
                 GROUP BY genre, language
@@ -9950,15 +13536,14 @@ def show_manage_books(embedded=False, browse_only=False):
                 {'state': 'Available', 'copies': available_copies},
                 {'state': 'Checked Out', 'copies': checked_out}
             ])
-            fig_stock = px.pie(
-                stock_df,
+            fig_stock = FigureCache.figure('books_stock_split', stock_df, lambda df: px.pie(
+                df,
                 names='state',
                 values='copies',
                 hole=0.45,
                 title='Inventory Availability Split',
                 color_discrete_map={'Available': '#90EE90', 'Checked Out': '#FFB6C6'}
-            )
-            fig_stock.update_layout(height=360)
+            ).update_layout(height=360))
             st.plotly_chart(fig_stock, use_container_width=True)
 
         with viz_top_col2:
@@ -9980,15 +13565,14 @@ def show_manage_books(embedded=False, browse_only=False):
             age_rows = Database.execute_query(age_query, tuple(current_params) if current_params else None)
             if age_rows:
                 age_df = pd.DataFrame(age_rows)
-                fig_age = px.bar(
-                    age_df,
+                fig_age = FigureCache.figure('books_age_distribution', age_df, lambda df: px.bar(
+                    df,
                     x='age_group',
                     y='titles',
                     title='Collection Age Distribution',
                     labels={'age_group': 'Time in Collection', 'titles': 'Titles'},
                     color_discrete_sequence=['#636EFA']
-                )
-                fig_age.update_layout(height=360)
+                ).update_layout(height=360))
                 st.plotly_chart(fig_age, use_container_width=True)
 
         # GENRE-LANGUAGE HEATMAP
@@ -9998,7 +13582,7 @@ def show_manage_books(embedded=False, browse_only=False):
                 SELECT
                     COALESCE(NULLIF(TRIM(b.language), ''), 'Unknown') as language_name,
                     COUNT(*) as titles,
-                    SUM((SELECT COUNT(*) FROM book_inventory bi WHERE bi.book_id = b.book_id)) as copies
+                    SUM(b.total_copies) as copies
                 FROM books b
                 WHERE {current_where_clause}
                 GROUP BY COALESCE(NULLIF(TRIM(b.language), ''), 'Unknown')
@@ -10011,16 +13595,15 @@ def show_manage_books(embedded=False, browse_only=False):
             )
             if language_rows:
                 language_df = pd.DataFrame(language_rows)
-                fig_lang = px.bar(
-                    language_df,
+                fig_lang = FigureCache.figure('books_language_distribution', language_df, lambda df: px.bar(
+                    df,
                     x='language_name',
                     y='titles',
                     title='Language Distribution',
                     labels={'language_name': 'Language', 'titles': 'Titles'},
                     color='copies',
                     color_continuous_scale='Blues'
-                )
-                fig_lang.update_layout(height=360, xaxis_tickangle=-25)
+                ).update_layout(height=360, xaxis_tickangle=-25))
                 st.plotly_chart(fig_lang, use_container_width=True)
             else:
                 st.info("No language data available for the selected filters.")
@@ -10030,7 +13613,7 @@ def show_manage_books(embedded=False, browse_only=False):
                 SELECT
                     COALESCE(NULLIF(TRIM(b.genre), ''), 'Unknown') as genre_name,
                     COUNT(*) as titles,
-                    SUM((SELECT COUNT(*) FROM book_inventory bi WHERE bi.book_id = b.book_id)) as copies,
+                    SUM(b.total_copies) as copies,
                     AVG(COALESCE(b.popularity_score, 0)) as avg_popularity
                 FROM books b
                 WHERE {current_where_clause}
@@ -10044,8 +13627,8 @@ def show_manage_books(embedded=False, browse_only=False):
             )
             if genre_rows:
                 genre_df = pd.DataFrame(genre_rows)
-                fig_genre = px.scatter(
-                    genre_df,
+                fig_genre = FigureCache.figure('books_top_genres', genre_df, lambda df: px.scatter(
+                    df,
                     x='genre_name',
                     y='titles',
                     size='copies',
@@ -10054,8 +13637,7 @@ def show_manage_books(embedded=False, browse_only=False):
                     labels={'genre_name': 'Genre', 'titles': 'Titles', 'avg_popularity': 'Avg Popularity'},
                     color_continuous_scale='Viridis',
                     hover_data=['copies', 'avg_popularity']
-                )
-                fig_genre.update_layout(height=360, xaxis_tickangle=-25)
+                ).update_layout(height=360, xaxis_tickangle=-25))
                 st.plotly_chart(fig_genre, use_container_width=True)
             else:
                 st.info("No genre data available for the selected filters.")
@@ -10093,15 +13675,14 @@ def show_manage_books(embedded=False, browse_only=False):
             trend_rows = Database.execute_query(trend_query, tuple(current_params) if current_params else None)
             if trend_rows:
                 trend_df = pd.DataFrame(trend_rows).sort_values('period')
-                fig_trend = px.area(
-                    trend_df,
+                fig_trend = FigureCache.figure('books_growth_trend', trend_df, lambda df: px.area(
+                    df,
                     x='period',
                     y='titles_added',
                     markers=True,
                     title=f'Collection Growth Trend ({trend_granularity})',
                     color_discrete_sequence=['#636EFA']
-                )
-                fig_trend.update_layout(height=360)
+                ).update_layout(height=360), granularity=trend_granularity)
                 st.plotly_chart(fig_trend, use_container_width=True)
             else:
                 st.info("No timeline data available for the selected filters.")
@@ -10119,16 +13700,15 @@ def show_manage_books(embedded=False, browse_only=False):
             pop_rows = Database.execute_query(popularity_query, tuple(current_params) if current_params else None)
             if pop_rows:
                 pop_df = pd.DataFrame(pop_rows)
-                fig_pop = px.bar(
-                    pop_df,
+                fig_pop = FigureCache.figure('books_popularity_distribution', pop_df, lambda df: px.bar(
+                    df,
                     x='pop_score',
                     y='titles',
                     title='Popularity Score Distribution',
                     labels={'pop_score': 'Popularity Score', 'titles': 'Titles'},
                     color='titles',
                     color_continuous_scale='Greens'
-                )
-                fig_pop.update_layout(height=360)
+                ).update_layout(height=360))
                 st.plotly_chart(fig_pop, use_container_width=True)
 
         # PUBLICATION YEAR ANALYSIS
@@ -10136,7 +13716,7 @@ def show_manage_books(embedded=False, browse_only=False):
             SELECT
                 b.publication_year as year,
                 COUNT(*) as titles,
-                SUM((SELECT COUNT(*) FROM book_inventory bi WHERE bi.book_id = b.book_id)) as total_copies,
+                SUM(b.total_copies) as total_copies,
                 AVG(COALESCE(b.popularity_score, 0)) as avg_pop
             FROM books b
             WHERE {current_where_clause} AND b.publication_year IS NOT NULL
@@ -10146,8 +13726,8 @@ def show_manage_books(embedded=False, browse_only=False):
         yearly_rows = Database.execute_query(yearly_query, tuple(current_params) if current_params else None)
         if yearly_rows:
             yearly_df = pd.DataFrame(yearly_rows)
-            fig_year = px.scatter(
-                yearly_df,
+            fig_year = FigureCache.figure('books_publication_years', yearly_df, lambda df: px.scatter(
+                df,
                 x='year',
                 y='titles',
                 size='total_copies',
@@ -10156,13 +13736,24 @@ def show_manage_books(embedded=False, browse_only=False):
                 labels={'year': 'Publication Year', 'titles': 'Titles', 'avg_pop': 'Avg Popularity'},
                 color_continuous_scale='RdYlGn',
                 hover_data=['total_copies', 'avg_pop']
-            )
-            fig_year.update_layout(height=330)
+            ).update_layout(height=330))
             st.plotly_chart(fig_year, use_container_width=True)
 
         # ADVANCED OPERATIONAL INSIGHTS
         st.markdown("### 🔍 Advanced Operational Insights")
         
+        insights_computed_at = InventoryInsights.last_computed()
+        if not insights_computed_at:
+            InventoryInsights.refresh()
+            insights_computed_at = InventoryInsights.last_computed()
+        refresh_col, computed_col = st.columns([1, 3], gap="small")
+        with refresh_col:
+            if st.button("🔄 Refresh Insights", use_container_width=True, key="bs_refresh_insights"):
+                InventoryInsights.refresh()
+                st.rerun()
+        with computed_col:
+            st.caption(f"Stock, demand and alert insights last computed {format_datetime(insights_computed_at) if insights_computed_at else 'never'} (refreshed every 15 minutes)")
+
         insight_tabs = st.tabs(["📦 Stock Analysis", "📈 Demand Leaders", "⚠️ Alerts & Issues", "🎯 Recommendations"])
         
         with insight_tabs[0]:
@@ -10175,12 +13766,15 @@ def show_manage_books(embedded=False, browse_only=False):
                         b.title,
                         COALESCE(NULLIF(TRIM(b.author), ''), 'Unknown') as author,
                         COALESCE(NULLIF(TRIM(b.genre), ''), 'Unknown') as genre,
-                        (SELECT COUNT(*) FROM book_inventory bi WHERE bi.book_id = b.book_id) as total_copies,
-                        (SELECT COUNT(*) FROM book_inventory bi WHERE bi.book_id = b.book_id AND bi.is_available = 1) as available_copies,
-                        (SELECT COUNT(*) FROM borrowing br JOIN book_inventory bi ON br.inventory_id = bi.inventory_id WHERE bi.book_id = b.book_id AND br.return_date IS NULL) as current_loans
-                    FROM books b
+                        ii.total_copies as total_copies,
+                        ii.available_copies as available_copies,
+                        ii.current_loans,
+                        ii.is_out_of_stock,
+                        ii.is_high_pressure
+                    FROM inventory_insights ii
+                    JOIN books b ON b.book_id = ii.book_id
                     WHERE {current_where_clause}
-                    ORDER BY available_copies ASC, total_copies ASC, b.title ASC
+                    ORDER BY ii.available_copies ASC, ii.total_copies ASC, b.title ASC
                     LIMIT ?
                 """
                 low_stock_rows = Database.execute_query(
@@ -10197,7 +13791,7 @@ def show_manage_books(embedded=False, browse_only=False):
                         lambda r: f"{int(r['available_copies'])}/{int(r['total_copies'])}", axis=1
                     )
                     pressure_df['pressure_level'] = pressure_df.apply(
-                        lambda r: "🔴 CRITICAL" if r['available_copies'] == 0 else "🟠 HIGH" if r['available_copies'] <= r['total_copies'] * 0.2 else "🟡 MEDIUM",
+                        lambda r: "🔴 CRITICAL" if r['is_out_of_stock'] else "🟠 HIGH" if r['is_high_pressure'] else "🟡 MEDIUM",
                         axis=1
                     )
                     display_cols = ['title', 'author', 'genre', 'availability_ratio', 'current_loans', 'pressure_level']
@@ -10221,13 +13815,13 @@ def show_manage_books(embedded=False, browse_only=False):
                     SELECT
                         b.title,
                         COALESCE(NULLIF(TRIM(b.author), ''), 'Unknown') as author,
-                        (SELECT COUNT(*) FROM book_inventory bi WHERE bi.book_id = b.book_id) as total_copies,
-                        (SELECT COUNT(*) FROM borrowing br JOIN book_inventory bi ON br.inventory_id = bi.inventory_id WHERE bi.book_id = b.book_id) as total_loans,
-                        COALESCE(b.popularity_score, 0) as popularity
-                    FROM books b
-                    WHERE {current_where_clause}
-                        AND (SELECT COUNT(*) FROM borrowing br JOIN book_inventory bi ON br.inventory_id = bi.inventory_id WHERE bi.book_id = b.book_id) < 2
-                    ORDER BY total_loans ASC, b.title ASC
+                        ii.total_copies as total_copies,
+                        ii.total_loans,
+                        ii.popularity
+                    FROM inventory_insights ii
+                    JOIN books b ON b.book_id = ii.book_id
+                    WHERE {current_where_clause} AND ii.is_underutilized = 1
+                    ORDER BY ii.total_loans ASC, b.title ASC
                     LIMIT ?
                 """
                 underutil_rows = Database.execute_query(
@@ -10260,17 +13854,16 @@ def show_manage_books(embedded=False, browse_only=False):
                     b.book_id,
                     b.title,
                     COALESCE(NULLIF(TRIM(b.author), ''), 'Unknown') as author,
-                    COUNT(br.borrowing_id) as total_loans,
-                    SUM(CASE WHEN br.return_date IS NULL THEN 1 ELSE 0 END) as active_loans,
-                    AVG(julianday(COALESCE(br.return_date, date('now'))) - julianday(br.checkout_date)) as avg_loan_days,
-                    COALESCE(b.popularity_score, 0) as popularity
-                FROM books b
-                LEFT JOIN book_inventory bi ON bi.book_id = b.book_id
-                LEFT JOIN borrowing br ON br.inventory_id = bi.inventory_id
-                WHERE {current_where_clause}
-                GROUP BY b.book_id, b.title, b.author
-                HAVING total_loans > 0
-                ORDER BY total_loans DESC, active_loans DESC
+                    ii.total_loans,
+                    ii.current_loans as active_loans,
+                    ii.avg_loan_days,
+                    ii.popularity,
+                    ii.demand_ratio,
+                    ii.demand_score
+                FROM inventory_insights ii
+                JOIN books b ON b.book_id = ii.book_id
+                WHERE {current_where_clause} AND ii.total_loans > 0
+                ORDER BY ii.total_loans DESC, ii.current_loans DESC
                 LIMIT ?
             """
             demand_rows = Database.execute_query(
@@ -10279,13 +13872,12 @@ def show_manage_books(embedded=False, browse_only=False):
             )
             if demand_rows:
                 demand_df = pd.DataFrame(demand_rows)
-                demand_df['avg_loan_days'] = demand_df['avg_loan_days'].fillna(0).round(1)
-                demand_df['popularity'] = demand_df['popularity'].fillna(0).round(2)
-                demand_df['demand_score'] = (demand_df['total_loans'] * demand_df['popularity'] / (demand_df['avg_loan_days'] + 1)).round(2)
+                demand_df['popularity'] = demand_df['popularity'].round(2)
+                demand_df['demand_ratio'] = demand_df['demand_ratio'].round(2)
                 
                 demand_chart_df = demand_df.head(10)[['title', 'total_loans', 'active_loans', 'demand_score']]
-                fig_demand = px.bar(
-                    demand_chart_df,
+                fig_demand = FigureCache.figure('books_demand_leaders', demand_chart_df, lambda df: px.bar(
+                    df,
                     x='title',
                     y='total_loans',
                     color='demand_score',
@@ -10293,12 +13885,11 @@ def show_manage_books(embedded=False, browse_only=False):
                     labels={'title': 'Title', 'total_loans': 'Total Loans', 'demand_score': 'Demand Score'},
                     color_continuous_scale='Reds',
                     hover_data=['active_loans']
-                )
-                fig_demand.update_layout(xaxis_tickangle=-45, height=400)
+                ).update_layout(xaxis_tickangle=-45, height=400))
                 st.plotly_chart(fig_demand, use_container_width=True)
                 
                 st.dataframe(
-                    demand_df[['title', 'author', 'total_loans', 'active_loans', 'avg_loan_days', 'popularity']],
+                    demand_df[['title', 'author', 'total_loans', 'active_loans', 'avg_loan_days', 'demand_ratio', 'popularity']],
                     use_container_width=True,
                     hide_index=True
                 )
@@ -10309,7 +13900,29 @@ def show_manage_books(embedded=False, browse_only=False):
             st.markdown("#### ⚠️ System Alerts")
             
             alerts_generated = []
-            
+            stock_alerts = Database.execute_query(f"""
+                SELECT
+                    COALESCE(SUM(CASE WHEN ii.total_copies > 0 AND ii.is_out_of_stock = 1 THEN 1 ELSE 0 END), 0) as out_of_stock,
+                    COALESCE(SUM(CASE WHEN ii.total_copies > 0 AND ii.available_copies <= ? THEN 1 ELSE 0 END), 0) as low_stock,
+                    COALESCE(SUM(CASE WHEN ii.total_copies > 0 AND ii.utilization * 100 > ? THEN 1 ELSE 0 END), 0) as over_utilized,
+                    COALESCE(SUM(CASE WHEN ii.overdue_loans > 0 THEN 1 ELSE 0 END), 0) as overdue_titles
+                FROM inventory_insights ii
+                JOIN books b ON b.book_id = ii.book_id
+                WHERE {current_where_clause}
+            """, tuple([int(low_stock_threshold), float(utilization_alert_threshold)] + current_params), fetch_one=True) or {}
+
+            if enable_low_stock_alerts and stock_alerts.get('out_of_stock'):
+                alerts_generated.append(("🔴 **OUT OF STOCK**", f"{stock_alerts['out_of_stock']} titles have no copies available."))
+
+            if enable_low_stock_alerts and stock_alerts.get('low_stock'):
+                alerts_generated.append(("🟠 **LOW STOCK**", f"{stock_alerts['low_stock']} titles have {int(low_stock_threshold)} or fewer copies on the shelf."))
+
+            if enable_low_stock_alerts and stock_alerts.get('over_utilized'):
+                alerts_generated.append(("🟠 **TITLE UTILIZATION**", f"{stock_alerts['over_utilized']} titles have more than {utilization_alert_threshold}% of their copies on loan."))
+
+            if enable_overdue_alerts and stock_alerts.get('overdue_titles'):
+                alerts_generated.append(("🟠 **OVERDUE TITLES**", f"{stock_alerts['overdue_titles']} titles have at least one overdue copy."))
+
             if enable_low_stock_alerts and circulation_velocity > float(utilization_alert_threshold):
                 alerts_generated.append(("🔴 **HIGH UTILIZATION**", f"Circulation velocity is {circulation_velocity:.1f}% (threshold: {utilization_alert_threshold}%). Consider acquiring more copies."))
             
@@ -10388,8 +14001,9 @@ def show_manage_members():
         params = []
         
         if search:
-            query += " AND (u.full_name LIKE ? OR u.email LIKE ? OR u.username LIKE ?)"
-            params.extend([f'%{search}%', f'%{search}%', f'%{search}%'])
+            member_clause, member_params = MemberDirectory.match_clause(search, id_column="u.user_id")
+            query += f" AND {member_clause}"
+            params.extend(member_params)
         
         if role_filter != "All":
             query += " AND u.role = ?"
@@ -10770,23 +14384,16 @@ def show_manage_members():
         
         col1, col2, col3, col4 = st.columns(4, gap="small")
         
-        total = Database.execute_query("SELECT COUNT(*) as count FROM users WHERE role = 'member'")
-        active = Database.execute_query("SELECT COUNT(*) as count FROM users WHERE role = 'member' AND is_active = 1")
-        with_fines = Database.execute_query(
-            "SELECT COUNT(*) as count FROM users WHERE fine_balance > 0"
-        )
-        total_fines = Database.execute_query(
-            "SELECT SUM(fine_balance) as total FROM users"
-        )
+        kpi = KpiCounters.get()
         
         with col1:
-            st.metric("Total Members", total[0]['count'] if total else 0)
+            st.metric("Total Members", kpi['total_members'])
         with col2:
-            st.metric("Active Members", active[0]['count'] if active else 0)
+            st.metric("Active Members", kpi['active_members'])
         with col3:
-            st.metric("Members with Fines", with_fines[0]['count'] if with_fines else 0)
+            st.metric("Members with Fines", kpi['users_with_fines'])
         with col4:
-            st.metric("Total Fines", f"${total_fines[0]['total'] if total_fines and total_fines[0]['total'] else 0:.2f}")
+            st.metric("Total Fines", f"${kpi['fine_balance_total']:.2f}")
 
 def show_borrowing_returns():
     """Borrowing and returns page"""
@@ -10796,26 +14403,14 @@ def show_borrowing_returns():
     with ctrl_col1:
         due_soon_days = st.slider("Due Soon Threshold (days)", min_value=1, max_value=14, value=3, key="br_due_soon_days")
     with ctrl_col2:
-        trend_window = st.selectbox("Trend Window", ["7D", "30D", "90D", "180D", "365D"], index=1, key="br_trend_window")
+        trend_window = st.selectbox("Trend Window", ["7D", "30D", "90D", "180D", "365D", "All"], index=1, key="br_trend_window")
     with ctrl_col3:
         fine_preview_mode = st.checkbox("Fine Preview Mode", value=True, key="br_fine_preview")
     with ctrl_col4:
         if st.button("Refresh Dashboard", use_container_width=True, key="br_refresh_dashboard"):
             st.rerun()
 
-    kpi_summary = Database.execute_query(
-        """
-        SELECT
-            (SELECT COUNT(*) FROM borrowing WHERE return_date IS NULL) as active_loans,
-            (SELECT COUNT(*) FROM borrowing WHERE return_date IS NULL AND date(due_date) < date('now')) as overdue_loans,
-            (SELECT COUNT(*) FROM borrowing WHERE return_date IS NULL AND julianday(due_date) - julianday(date('now')) BETWEEN 0 AND ?) as due_soon,
-            (SELECT COUNT(*) FROM borrowing WHERE date(checkout_date) = date('now')) as today_checkouts,
-            (SELECT COUNT(*) FROM borrowing WHERE date(return_date) = date('now')) as today_returns,
-            (SELECT COALESCE(SUM(fine_amount), 0) FROM borrowing WHERE date(return_date) = date('now')) as today_fines
-        """,
-        (int(due_soon_days),),
-        fetch_one=True
-    ) or {}
+    kpi_summary = LoanKpiEngine.compute(due_soon_days=int(due_soon_days))
 
     kpi_col1, kpi_col2, kpi_col3, kpi_col4, kpi_col5, kpi_col6 = st.columns(6, gap="small")
     with kpi_col1:
@@ -10831,6 +14426,30 @@ def show_borrowing_returns():
     with kpi_col6:
         st.metric("Today Fines", format_currency(float(kpi_summary.get('today_fines') or 0)))
 
+    with st.expander(f"Circulation Trend ({trend_window})", expanded=False):
+        trend_start = date.min if trend_window == "All" else date.today() - timedelta(days=int(trend_window[:-1]))
+        trend_rows = DailyStats.series(trend_start, date.today(), ('checkouts', 'returns', 'fines_amount'))
+        if trend_rows:
+            trend_df = pd.DataFrame(trend_rows)
+            trend_col1, trend_col2 = st.columns(2, gap="small")
+            with trend_col1:
+                fig_flow = FigureCache.figure('circulation_flow', trend_df, lambda df: px.line(
+                    df, x='date', y=['checkouts', 'returns'],
+                    title='Checkouts vs Returns',
+                    labels={'date': 'Date', 'value': 'Loans', 'variable': ''}
+                ).update_layout(hovermode='x unified', height=320))
+                st.plotly_chart(fig_flow, use_container_width=True)
+            with trend_col2:
+                fig_fines = FigureCache.figure('circulation_fines', trend_df, lambda df: px.area(
+                    df, x='date', y='fines_amount',
+                    title='Fines per Day',
+                    labels={'date': 'Date', 'fines_amount': 'Amount ($)'},
+                    color_discrete_sequence=['#FF6B6B']
+                ).update_layout(hovermode='x unified', height=320))
+                st.plotly_chart(fig_fines, use_container_width=True)
+        else:
+            st.info("No circulation activity in this window")
+
     global_borrow_search = st.text_input(
         "Global Borrowing Search (member/book/email)",
         key="br_global_search",
@@ -10850,11 +14469,11 @@ def show_borrowing_returns():
         with col4:
             active_limit = st.slider("Max Rows", min_value=10, max_value=200, value=50, step=10, key="br_active_limit")
 
-        query = """
+        query = f"""
             SELECT br.borrowing_id, b.title, b.isbn, u.full_name, u.email,
                    br.checkout_date, br.due_date,
-                   julianday(br.due_date) - julianday(date('now')) as days_remaining,
-                   julianday(date('now')) - julianday(br.due_date) as days_overdue
+                   br.due_day - {LoanDates.TODAY} as days_remaining,
+                   {LoanDates.TODAY} - br.due_day as days_overdue
             FROM borrowing br
             JOIN book_inventory bi ON br.inventory_id = bi.inventory_id
             JOIN books b ON bi.book_id = b.book_id
@@ -10864,10 +14483,10 @@ def show_borrowing_returns():
         params = []
 
         if filter_type == f"Due Soon (< {due_soon_days} days)":
-            query += " AND julianday(br.due_date) - julianday(date('now')) BETWEEN 0 AND ?"
+            query += f" AND br.due_day BETWEEN {LoanDates.TODAY} AND {LoanDates.TODAY} + ?"
             params.append(int(due_soon_days))
         elif filter_type == "Overdue":
-            query += " AND br.due_date < date('now')"
+            query += f" AND br.due_day < {LoanDates.TODAY}"
 
         if search_active:
             query += " AND (u.full_name LIKE ? OR b.title LIKE ?)"
@@ -10962,19 +14581,19 @@ def show_borrowing_returns():
             st.metric("Overdue Loans", overdue_value, f"{overdue_rate:.1f}%")
 
         focus_queue = Database.execute_query(
-            """
+            f"""
             SELECT
                 b.title,
                 u.full_name,
                 br.due_date,
-                CAST(julianday(br.due_date) - julianday(date('now')) AS INTEGER) as days_remaining
+                br.due_day - {LoanDates.TODAY} as days_remaining
             FROM borrowing br
             JOIN book_inventory bi ON br.inventory_id = bi.inventory_id
             JOIN books b ON bi.book_id = b.book_id
             JOIN users u ON br.user_id = u.user_id
             WHERE br.return_date IS NULL
-              AND (julianday(br.due_date) - julianday(date('now')) <= ?)
-            ORDER BY br.due_date ASC
+              AND br.due_day <= {LoanDates.TODAY} + ?
+            ORDER BY br.due_day ASC
             LIMIT 12
             """,
             (int(due_soon_days),)
@@ -11022,10 +14641,7 @@ def show_borrowing_returns():
             member_options = {}
             selected_member = None
             if member_search:
-                members = Database.execute_query(
-                    "SELECT user_id, username, full_name, email, fine_balance FROM users WHERE username LIKE ? OR email LIKE ? OR full_name LIKE ? LIMIT 20",
-                    (f'%{member_search}%', f'%{member_search}%', f'%{member_search}%')
-                )
+                members = MemberDirectory.lookup(member_search, limit=20)
                 if members:
                     member_options = {f"{m['full_name']} (@{m['username']})": m['user_id'] for m in members}
                     selected_member = st.selectbox("Select Member", list(member_options.keys()), key="br_checkout_member_select")
@@ -11042,8 +14658,7 @@ def show_borrowing_returns():
             if book_search:
                 books = Database.execute_query(
                     """SELECT b.book_id, b.title, b.isbn,
-                              (SELECT COUNT(*) FROM book_inventory WHERE book_id = b.book_id AND is_available = 1) as available,
-                              (SELECT COUNT(*) FROM book_inventory WHERE book_id = b.book_id) as total_copies
+                              b.available_copies as available, b.total_copies
                        FROM books b
                        WHERE (b.title LIKE ? OR b.isbn LIKE ?) AND b.is_available = 1
                        LIMIT 20""",
@@ -11172,9 +14787,9 @@ def show_borrowing_returns():
             borrowing_options = {}
             selected_borrowing = None
             if search:
-                return_query = """
+                return_query = f"""
                     SELECT br.borrowing_id, b.title, u.full_name, u.email, br.checkout_date, br.due_date,
-                           julianday(date('now')) - julianday(br.due_date) as days_overdue,
+                           {LoanDates.TODAY} - br.due_day as days_overdue,
                            bi.inventory_id
                     FROM borrowing br
                     JOIN book_inventory bi ON br.inventory_id = bi.inventory_id
@@ -11185,7 +14800,7 @@ def show_borrowing_returns():
                 """
                 return_params = [f'%{search}%', f'%{search}%', f'%{search}%']
                 if return_only_overdue:
-                    return_query += " AND br.due_date < date('now')"
+                    return_query += f" AND br.due_day < {LoanDates.TODAY}"
                 return_query += " ORDER BY br.due_date ASC LIMIT 30"
 
                 borrowings = Database.execute_query(return_query, tuple(return_params))
@@ -11251,10 +14866,10 @@ def show_borrowing_returns():
         # Librarian view - approve/reject renewals
         st.markdown("### Pending Renewal Requests")
         
-        pending = Database.execute_query("""
+        pending = Database.execute_query(f"""
             SELECT rr.renewal_id, rr.borrowing_id, rr.created_at as request_date, rr.requested_days,
                    b.title, u.full_name, u.email, br.due_date,
-                   julianday(date('now')) - julianday(br.due_date) as days_overdue
+                   {LoanDates.TODAY} - br.due_day as days_overdue
             FROM renewal_requests rr
             JOIN borrowing br ON rr.borrowing_id = br.borrowing_id
             JOIN book_inventory bi ON br.inventory_id = bi.inventory_id
@@ -11311,6 +14926,204 @@ def show_borrowing_returns():
             st.info("No pending renewal requests")
     
         
+def render_report_blocks(blocks):
+    """Render blocks produced by a ReportJobRunner definition"""
+    for block in blocks:
+        kind = block['kind']
+        if kind == 'metrics':
+            columns = st.columns(len(block['items']), gap="small")
+            for column, (label, value) in zip(columns, block['items']):
+                with column:
+                    st.metric(label, value)
+        elif kind == 'divider':
+            st.divider()
+        elif kind == 'subheader':
+            st.subheader(block['text'])
+        elif kind == 'figure':
+            st.plotly_chart(FigureCache.from_json(block['figure']), use_container_width=True)
+        elif kind == 'table':
+            st.dataframe(pd.read_json(io.StringIO(block['table']), orient='split'), use_container_width=True, hide_index=True)
+        elif kind in ('info', 'warning', 'error'):
+            getattr(st, kind)(block['text'])
+
+@st.fragment(run_every=ReportJobRunner.POLL_SECONDS)
+def show_report_progress(job_key):
+    """Progress bar re-run on its own timer; reruns the page once the job settles"""
+    status = ReportJobRunner.status(job_key)
+    if status['state'] == 'running':
+        st.progress(status['progress'], text=status['text'])
+    else:
+        st.rerun()
+
+def show_report_job(session_key):
+    """Render the report job remembered under session_key, if any"""
+    job_key = st.session_state.get(session_key)
+    if not job_key:
+        return
+    status = ReportJobRunner.status(job_key)
+    if status['state'] == 'running':
+        # The page stays interactive while only the fragment polls the worker
+        show_report_progress(job_key)
+    elif status['state'] == 'failed':
+        st.error(f"Error generating report: {status['error']}")
+        st.info("Please check the database connection and try again.")
+    elif status['state'] == 'missing':
+        st.info("This report has expired. Generate it again for fresh figures.")
+    else:
+        st.caption(f"Generated {status['created_at']} UTC · shared until {status['expires_at']} UTC")
+        render_report_blocks(status['blocks'])
+
+@ReportJobRunner.report('overview', ttl_seconds=300)
+def build_overview_report(params, progress):
+    """Overview dashboard: period totals, daily checkouts and genre mix"""
+    blocks = []
+    progress(0.1, "Summarising activity")
+    totals = ReportJobRunner.require(DailyStats.totals(params['start'], params['end']), "period totals")
+    blocks.append({'kind': 'metrics', 'items': [
+        (" Books Borrowed", int(totals['checkouts'])),
+        (" Books Returned", int(totals['returns'])),
+        (" New Members", int(totals['new_members'])),
+        (" Fines Collected", format_currency(totals['fines_amount'])),
+    ]})
+    blocks.append({'kind': 'divider'})
+    
+    # Daily activity chart
+    progress(0.4, "Building daily activity")
+    blocks.append({'kind': 'subheader', 'text': " Daily Borrowing Activity"})
+    daily_data = ReportJobRunner.require(DailyStats.daily(params['start'], params['end'], 'checkouts'), "daily checkouts")
+    if daily_data:
+        df = pd.DataFrame(daily_data)
+        fig = px.line(df, x='date', y='checkouts', 
+                    title='Daily Checkout Trend',
+                    labels={'checkouts': 'Number of Checkouts', 'date': 'Date'},
+                    markers=True)
+        fig.update_traces(line_color='#1E88E5', line_width=3)
+        fig.update_layout(hovermode='x unified')
+        blocks.append({'kind': 'figure', 'figure': fig})
+    
+    # Genre distribution
+    progress(0.7, "Building genre distribution")
+    blocks.append({'kind': 'subheader', 'text': " Books Distribution by Genre"})
+    genre_data = ReportJobRunner.require(Database.execute_query("""
+        SELECT g.genre_name, COUNT(DISTINCT b.book_id) as book_count
+        FROM genres g
+        JOIN book_genres bg ON g.genre_id = bg.genre_id
+        JOIN books b ON bg.book_id = b.book_id
+        WHERE b.is_active = 1
+        GROUP BY g.genre_name
+        ORDER BY book_count DESC
+    """), "genre distribution")
+    if genre_data:
+        df = pd.DataFrame(genre_data)
+        fig = px.pie(df, values='book_count', names='genre_name',
+                   title='Book Collection by Genre',
+                   color_discrete_sequence=px.colors.qualitative.Set3)
+        fig.update_traces(textposition='inside', textinfo='percent+label')
+        blocks.append({'kind': 'figure', 'figure': fig})
+    progress(1.0, "Done")
+    return blocks
+
+@ReportJobRunner.report('financial', ttl_seconds=600)
+def build_financial_report(params, progress):
+    """Financial analytics: fine totals, daily fines and monthly revenue"""
+    blocks = []
+    
+    # Summary metrics
+    progress(0.1, "Summarising fines")
+    fine_totals = ReportJobRunner.require(DailyStats.totals(params['start'], params['end']), "fine totals")
+    outstanding_fines = ReportJobRunner.require(Database.execute_query("""
+        SELECT SUM(fine_balance) as total
+        FROM users
+        WHERE fine_balance > 0
+    """, fetch_one=True), "outstanding fines")
+    
+    # Handle null values and ensure proper data types
+    total_collected = float(fine_totals['fines_amount'] or 0)
+    
+    outstanding_total = 0
+    if outstanding_fines and outstanding_fines.get('total'):
+        outstanding_total = float(outstanding_fines['total'])
+    
+    avg_amount = 0
+    if fine_totals['fines_count']:
+        avg_amount = total_collected / fine_totals['fines_count']
+    
+    blocks.append({'kind': 'metrics', 'items': [
+        (" Fines Collected", format_currency(total_collected)),
+        (" Outstanding Fines", format_currency(outstanding_total)),
+        (" Average Fine", format_currency(avg_amount)),
+    ]})
+    blocks.append({'kind': 'divider'})
+    
+    # Daily fines chart
+    progress(0.4, "Building daily fines")
+    fines_daily = [
+        {'date': row['date'], 'total': row['fines_amount'], 'fine_count': row['fines_count']}
+        for row in ReportJobRunner.require(DailyStats.daily(params['start'], params['end'], 'fines_amount'), "daily fines")
+    ]
+    df = pd.DataFrame(fines_daily)
+    if len(df) > 0:
+        df['total'] = pd.to_numeric(df['total'], errors='coerce').fillna(0.0)
+        df['fine_count'] = pd.to_numeric(df['fine_count'], errors='coerce').fillna(0).astype(int)
+    
+    if len(df) > 0 and df['total'].sum() > 0:
+        try:
+            # Area chart for daily fines
+            fig = go.Figure()
+            fig.add_trace(go.Scatter(
+                x=df['date'], y=df['total'],
+                mode='lines',
+                name='Fine Amount',
+                line=dict(color='#4CAF50', width=3),
+                fill='tozeroy',
+                fillcolor='rgba(76, 175, 80, 0.2)'
+            ))
+            fig.update_layout(hovermode='x unified',
+                title="Daily Fines Collected",
+                xaxis_title="Date",
+                yaxis_title="Amount ($)",
+                height=400
+            )
+            blocks.append({'kind': 'figure', 'figure': fig})
+            
+            # Bar chart for fine counts
+            fig2 = px.bar(df, x='date', y='fine_count',
+                        title='Number of Fines per Day',
+                        labels={'date': 'Date', 'fine_count': 'Number of Fines'},
+                        color='fine_count',
+                        color_continuous_scale='Reds')
+            blocks.append({'kind': 'figure', 'figure': fig2})
+        except Exception as viz_error:
+            blocks.append({'kind': 'warning', 'text': f"Could not generate daily charts: {str(viz_error)}"})
+            blocks.append({'kind': 'table', 'table': df})
+    else:
+        blocks.append({'kind': 'info', 'text': "No fine data available for the selected date range"})
+    
+    # Monthly revenue projection
+    progress(0.7, "Building monthly revenue")
+    blocks.append({'kind': 'subheader', 'text': " Monthly Revenue Projection"})
+    df_monthly = pd.DataFrame(ReportJobRunner.require(DailyStats.monthly('fines_amount'), "monthly fines"))
+    if len(df_monthly) > 0:
+        df_monthly['total'] = pd.to_numeric(df_monthly['total'], errors='coerce').fillna(0.0)
+        df_monthly = df_monthly[df_monthly['total'] > 0]
+    
+    if len(df_monthly) > 0:
+        df_monthly = df_monthly.sort_values('month')
+        try:
+            fig = px.line(df_monthly, x='month', y='total',
+                        title='Monthly Fine Revenue (Last 12 Months)',
+                        labels={'month': 'Month', 'total': 'Revenue ($)'},
+                        markers=True)
+            fig.update_traces(line_color='#2196F3', line_width=4)
+            blocks.append({'kind': 'figure', 'figure': fig})
+        except Exception as viz_error:
+            blocks.append({'kind': 'warning', 'text': f"Could not generate monthly revenue chart: {str(viz_error)}"})
+            blocks.append({'kind': 'table', 'table': df_monthly})
+    else:
+        blocks.append({'kind': 'info', 'text': "No monthly revenue data available"})
+    progress(1.0, "Done")
+    return blocks
+
 def show_reports():
     """Advanced Reports page with 20+ visualizations"""
     st.markdown('<h1 class="litgrid-header"> Advanced Reports & Analytics</h1>', unsafe_allow_html=True)
@@ -11333,79 +15146,13 @@ def show_reports():
             end_date = st.date_input("End Date", date.today())
         
         if st.button(" Generate Dashboard", use_container_width=True, key="gen_overview"):
-            st.divider()
-            
-            # Summary statistics
-            col1, col2, col3, col4 = st.columns(4, gap="small")
-            
-            books_borrowed = Database.execute_query(
-                "SELECT COUNT(*) as count FROM borrowing WHERE checkout_date BETWEEN ? AND ?",
-                (start_date, end_date), fetch_one=True
-            )
-            books_returned = Database.execute_query(
-                "SELECT COUNT(*) as count FROM borrowing WHERE return_date BETWEEN ? AND ?",
-                (start_date, end_date), fetch_one=True
+            st.session_state.report_job_overview = ReportJobRunner.submit(
+                'overview', {'start': str(start_date), 'end': str(end_date)}
             )
-            new_members = Database.execute_query(
-                "SELECT COUNT(*) as count FROM users WHERE created_at BETWEEN ? AND ?",
-                (start_date, end_date), fetch_one=True
-            )
-            fines_collected = Database.execute_query(
-                "SELECT SUM(fine_amount) as total FROM borrowing WHERE return_date BETWEEN ? AND ?",
-                (start_date, end_date), fetch_one=True
-            )
-            
-            with col1:
-                st.metric(" Books Borrowed", books_borrowed['count'] if books_borrowed else 0)
-            with col2:
-                st.metric(" Books Returned", books_returned['count'] if books_returned else 0)
-            with col3:
-                st.metric(" New Members", new_members['count'] if new_members else 0)
-            with col4:
-                st.metric(" Fines Collected", format_currency(fines_collected['total'] if fines_collected and fines_collected['total'] else 0))
-            
+        
+        if st.session_state.get('report_job_overview'):
             st.divider()
-            
-            # Daily activity chart
-            st.subheader(" Daily Borrowing Activity")
-            daily_data = Database.execute_query("""
-                SELECT DATE(checkout_date) as date,
-                       COUNT(*) as checkouts
-                FROM borrowing
-                WHERE checkout_date BETWEEN ? AND ?
-                GROUP BY DATE(checkout_date)
-                ORDER BY date
-            """, (start_date, end_date))
-            
-            if daily_data:
-                df = pd.DataFrame(daily_data)
-                fig = px.line(df, x='date', y='checkouts', 
-                            title='Daily Checkout Trend',
-                            labels={'checkouts': 'Number of Checkouts', 'date': 'Date'},
-                            markers=True)
-                fig.update_traces(line_color='#1E88E5', line_width=3)
-                fig.update_layout(hovermode='x unified')
-                st.plotly_chart(fig, use_container_width=True)
-            
-            # Genre distribution
-            st.subheader(" Books Distribution by Genre")
-            genre_data = Database.execute_query("""
-                SELECT g.genre_name, COUNT(DISTINCT b.book_id) as book_count
-                FROM genres g
-                JOIN book_genres bg ON g.genre_id = bg.genre_id
-                JOIN books b ON bg.book_id = b.book_id
-                WHERE b.is_active = 1
-                GROUP BY g.genre_name
-                ORDER BY book_count DESC
-            """)
-            
-            if genre_data:
-                df = pd.DataFrame(genre_data)
-                fig = px.pie(df, values='book_count', names='genre_name',
-                           title='Book Collection by Genre',
-                           color_discrete_sequence=px.colors.qualitative.Set3)
-                fig.update_traces(textposition='inside', textinfo='percent+label')
-                st.plotly_chart(fig, use_container_width=True)
+            show_report_job('report_job_overview')
     
     with tab2:
         st.subheader(" Books Analytics")
@@ -11424,14 +15171,17 @@ def show_reports():
             try:
                 data = Database.execute_query("""
                     SELECT b.title, b.isbn, b.publication_year,
-                           COALESCE(bs.total_checkouts, 0) as total_checkouts, 
+                           COALESCE(p.total_checkouts, 0) as total_checkouts, 
+                           COALESCE(p.checkouts_30d, 0) as checkouts_30d,
+                           COALESCE(b.popularity_score, 0) as popularity_score,
                            COALESCE(bs.available_copies, 0) as available_copies, 
                            COALESCE(bs.total_copies, 0) as total_copies,
                            COALESCE(bs.average_rating, 0) as average_rating
                     FROM books b
+                    LEFT JOIN book_popularity p ON b.book_id = p.book_id
                     LEFT JOIN book_statistics bs ON b.book_id = bs.book_id
                     WHERE b.is_active = 1
-                    ORDER BY COALESCE(bs.total_checkouts, 0) DESC
+                    ORDER BY COALESCE(b.popularity_score, 0) DESC, b.book_id DESC
                     LIMIT 20
                 """)
             except Exception as e:
@@ -11443,34 +15193,34 @@ def show_reports():
                 st.dataframe(df, use_container_width=True, hide_index=True)
                 
                 # Horizontal bar chart
-                fig = px.bar(df.head(10), x='total_checkouts', y='title',
+                fig = FigureCache.figure('reports_most_popular', df.head(10), lambda df: px.bar(df, x='total_checkouts', y='title',
                            orientation='h',
                            title="Top 10 Most Popular Books",
                            labels={'total_checkouts': 'Total Checkouts', 'title': 'Book Title'},
                            color='total_checkouts',
-                           color_continuous_scale='Blues')
-                fig.update_layout(hovermode='x unified', yaxis={'categoryorder':'total ascending'}, height=500)
+                           color_continuous_scale='Blues').update_layout(hovermode='x unified', yaxis={'categoryorder':'total ascending'}, height=500))
                 st.plotly_chart(fig, use_container_width=True)
                 
                 # Scatter plot: Checkouts vs Rating
-                fig2 = px.scatter(df, x='average_rating', y='total_checkouts',
+                fig2 = FigureCache.figure('reports_popularity_vs_rating', df, lambda df: px.scatter(df, x='average_rating', y='total_checkouts',
                                 size='total_checkouts', hover_data=['title'],
                                 title='Book Popularity vs Rating',
                                 labels={'average_rating': 'Average Rating', 'total_checkouts': 'Checkouts'},
                                 color='total_checkouts',
-                                color_continuous_scale='Viridis')
+                                color_continuous_scale='Viridis'))
                 st.plotly_chart(fig2, use_container_width=True)
         
         elif report_type == "Least Popular Books":
             try:
                 data = Database.execute_query("""
                     SELECT b.title, b.isbn, b.author, b.publication_year,
-                           COALESCE(bs.total_checkouts, 0) as total_checkouts,
+                           COALESCE(p.total_checkouts, 0) as total_checkouts,
                            COALESCE(bs.average_rating, 0) as average_rating
                     FROM books b
+                    LEFT JOIN book_popularity p ON b.book_id = p.book_id
                     LEFT JOIN book_statistics bs ON b.book_id = bs.book_id
                     WHERE b.is_active = 1
-                    ORDER BY COALESCE(bs.total_checkouts, 0) ASC, b.created_at DESC
+                    ORDER BY COALESCE(b.popularity_score, 0) ASC, b.book_id DESC
                     LIMIT 20
                 """)
             except Exception as e:
@@ -11484,13 +15234,12 @@ def show_reports():
                 # Only create chart if we have data
                 if len(df) > 0:
                     # Bar chart for least popular
-                    fig = px.bar(df.head(10), x='total_checkouts', y='title',
+                    fig = FigureCache.figure('reports_least_popular', df.head(10), lambda df: px.bar(df, x='total_checkouts', y='title',
                                orientation='h',
                                title="10 Least Popular Books",
                                labels={'total_checkouts': 'Total Checkouts', 'title': 'Book Title'},
                                color='total_checkouts',
-                               color_continuous_scale='Reds')
-                    fig.update_layout(hovermode='x unified', yaxis={'categoryorder':'total descending'}, height=500)
+                               color_continuous_scale='Reds').update_layout(hovermode='x unified', yaxis={'categoryorder':'total descending'}, height=500))
                     st.plotly_chart(fig, use_container_width=True)
                 else:
                     st.warning("No data available for visualization")
@@ -11502,18 +15251,19 @@ def show_reports():
                 data = Database.execute_query("""
                     SELECT g.genre_name,
                            COUNT(DISTINCT b.book_id) as total_books,
-                           COUNT(br.borrowing_id) as total_borrows,
                            AVG(bs.average_rating) as avg_rating
                     FROM genres g
                     JOIN book_genres bg ON g.genre_id = bg.genre_id
                     JOIN books b ON bg.book_id = b.book_id
-                    LEFT JOIN book_inventory bi ON b.book_id = bi.book_id
-                    LEFT JOIN borrowing br ON bi.inventory_id = br.inventory_id
                     LEFT JOIN book_statistics bs ON b.book_id = bs.book_id
                     WHERE b.is_active = 1
                     GROUP BY g.genre_name
-                    ORDER BY total_borrows DESC
                 """)
+                if data:
+                    genre_borrows = DailyStats.dimension_totals('genre', 'checkouts')
+                    for row in data:
+                        row['total_borrows'] = genre_borrows.get(row['genre_name'], 0)
+                    data.sort(key=lambda row: row['total_borrows'], reverse=True)
             except Exception as e:
                 st.error(f"Database error in Genre Performance: {str(e)}")
                 data = None
@@ -11539,10 +15289,10 @@ def show_reports():
                     st.plotly_chart(fig, use_container_width=True)
                     
                     # Bubble chart
-                    fig2 = px.scatter(df, x='total_books', y='total_borrows', size='avg_rating',
+                    fig2 = FigureCache.figure('reports_genre_bubble', df, lambda df: px.scatter(df, x='total_books', y='total_borrows', size='avg_rating',
                                     hover_data=['genre_name'], title='Genre Insights Bubble Chart',
                                     labels={'total_books': 'Total Books', 'total_borrows': 'Total Borrows'},
-                                    color='avg_rating', color_continuous_scale='RdYlGn')
+                                    color='avg_rating', color_continuous_scale='RdYlGn'))
                     st.plotly_chart(fig2, use_container_width=True)
                 else:
                     st.warning("No data available for genre performance visualization")
@@ -11576,11 +15326,11 @@ def show_reports():
                 if len(df) > 0:
                     df['rating_label'] = df['rating_group'].astype(str) + ' - ' + (df['rating_group'] + 1).astype(str) + ' '
                     
-                    fig = px.bar(df, x='rating_label', y='book_count',
+                    fig = FigureCache.figure('reports_rating_distribution', df, lambda df: px.bar(df, x='rating_label', y='book_count',
                                title='Book Ratings Distribution',
                                labels={'rating_label': 'Rating Range', 'book_count': 'Number of Books'},
                                color='book_count',
-                               color_continuous_scale='YlOrRd')
+                               color_continuous_scale='YlOrRd'))
                     st.plotly_chart(fig, use_container_width=True)
                 else:
                     st.warning("No valid rating data available for visualization")
@@ -11619,12 +15369,11 @@ def show_reports():
                 
                 if len(df) > 0:
                     # Publisher performance chart
-                    fig = px.bar(df, x='publisher_name', y='total_books',
+                    fig = FigureCache.figure('reports_publishers', df, lambda df: px.bar(df, x='publisher_name', y='total_books',
                                title='Books by Publisher',
                                labels={'publisher_name': 'Publisher', 'total_books': 'Number of Books'},
                                color='total_borrows',
-                               color_continuous_scale='Blues')
-                    fig.update_layout(hovermode='x unified', xaxis_tickangle=-45, height=500)
+                               color_continuous_scale='Blues').update_layout(hovermode='x unified', xaxis_tickangle=-45, height=500))
                     st.plotly_chart(fig, use_container_width=True)
                 else:
                     st.warning("No data available for publisher visualization")
@@ -11633,9 +15382,9 @@ def show_reports():
         
         elif report_type == "Average Days per Book":
             try:
-                data = Database.execute_query("""
+                data = Database.execute_query(f"""
                     SELECT b.title, b.author,
-                           AVG(julianday(COALESCE(br.return_date, date('now'))) - julianday(br.checkout_date)) as avg_days,
+                           AVG(COALESCE(br.return_day, {LoanDates.TODAY}) - br.checkout_day) as avg_days,
                            COUNT(br.borrowing_id) as times_borrowed
                     FROM books b
                     JOIN book_inventory bi ON b.book_id = bi.book_id
@@ -11663,13 +15412,13 @@ def show_reports():
                 
                 if len(df) > 0:
                     # Scatter plot of average days vs times borrowed
-                    fig = px.scatter(df, x='times_borrowed', y='avg_days',
+                    fig = FigureCache.figure('reports_days_per_book', df, lambda df: px.scatter(df, x='times_borrowed', y='avg_days',
                                    hover_data=['title'], 
                                    title='Average Borrowing Duration vs Popularity',
                                    labels={'times_borrowed': 'Times Borrowed', 'avg_days': 'Average Days'},
                                    size='avg_days',
                                    color='avg_days',
-                                   color_continuous_scale='RdYlBu')
+                                   color_continuous_scale='RdYlBu'))
                     st.plotly_chart(fig, use_container_width=True)
                 else:
                     st.warning("No valid borrowing duration data available")
@@ -11743,13 +15492,12 @@ def show_reports():
                     # Horizontal bar chart with color by tier
                     if len(df) > 0:
                         try:
-                            fig = px.bar(df.head(15), x='total_borrowed', y='full_name',
+                            fig = FigureCache.figure('reports_top_borrowers', df.head(15), lambda df: px.bar(df, x='total_borrowed', y='full_name',
                                        orientation='h',
                                        title="Top 15 Borrowers",
                                        labels={'total_borrowed': 'Total Books Borrowed', 'full_name': 'Member Name'},
                                        color='member_tier',
-                                       color_discrete_map={'basic': '#FFA726', 'premium': '#66BB6A', 'gold': '#FFD700'})
-                            fig.update_layout(hovermode='x unified', yaxis={'categoryorder':'total ascending'}, height=600)
+                                       color_discrete_map={'basic': '#FFA726', 'premium': '#66BB6A', 'gold': '#FFD700'}).update_layout(hovermode='x unified', yaxis={'categoryorder':'total ascending'}, height=600))
                             st.plotly_chart(fig, use_container_width=True)
                         except Exception as viz_error:
                             st.warning(f"Could not generate visualization: {str(viz_error)}")
@@ -11793,10 +15541,10 @@ def show_reports():
                                 st.metric("Members with Fines", len(df))
                             
                             # Histogram of fine distribution
-                            fig = px.histogram(df, x='fine_balance', nbins=min(20, len(df)),
+                            fig = FigureCache.figure('reports_fine_distribution', df, lambda df: px.histogram(df, x='fine_balance', nbins=min(20, len(df)),
                                              title='Fine Amount Distribution',
                                              labels={'fine_balance': 'Fine Amount ($)', 'count': 'Number of Members'},
-                                             color_discrete_sequence=['#FF6B6B'])
+                                             color_discrete_sequence=['#FF6B6B']))
                             st.plotly_chart(fig, use_container_width=True)
                         except Exception as viz_error:
                             st.warning(f"Could not generate fine statistics: {str(viz_error)}")
@@ -11810,15 +15558,10 @@ def show_reports():
         
         elif member_report == "Member Registration Trend":
             try:
-                data = Database.execute_query("""
-                    SELECT strftime('%Y-%m', created_at) as month,
-                           COUNT(*) as new_members
-                    FROM users
-                    WHERE role = 'member' AND created_at IS NOT NULL
-                    GROUP BY strftime('%Y-%m', created_at)
-                    ORDER BY month DESC
-                    LIMIT 12
-                """)
+                data = [
+                    {'month': row['month'], 'new_members': row['total']}
+                    for row in DailyStats.monthly('new_members') or []
+                ]
                 
                 if data:
                     df = pd.DataFrame(data)
@@ -11833,11 +15576,10 @@ def show_reports():
                         df = df.sort_values('month')
                         
                         try:
-                            fig = px.area(df, x='month', y='new_members',
+                            fig = FigureCache.figure('reports_registration_trend', df, lambda df: px.area(df, x='month', y='new_members',
                                         title='Member Registration Trend (Last 12 Months)',
                                         labels={'month': 'Month', 'new_members': 'New Members'},
-                                        color_discrete_sequence=['#4CAF50'])
-                            fig.update_traces(fill='tozeroy')
+                                        color_discrete_sequence=['#4CAF50']).update_traces(fill='tozeroy'))
                             st.plotly_chart(fig, use_container_width=True)
                         except Exception as viz_error:
                             st.warning(f"Could not generate trend visualization: {str(viz_error)}")
@@ -11853,12 +15595,10 @@ def show_reports():
         
         elif member_report == "Member Tier Distribution":
             try:
-                data = Database.execute_query("""
-                    SELECT member_tier, COUNT(*) as count
-                    FROM users
-                    WHERE role = 'member' AND is_active = 1
-                    GROUP BY member_tier
-                """)
+                data = [
+                    {'member_tier': tier, 'count': count}
+                    for tier, count in DailyStats.dimension_totals('tier', 'active_members').items()
+                ]
                 
                 if data:
                     df = pd.DataFrame(data)
@@ -11872,11 +15612,10 @@ def show_reports():
                     if len(df) > 0:
                         try:
                             # Donut chart
-                            fig = px.pie(df, values='count', names='member_tier',
+                            fig = FigureCache.figure('reports_tier_distribution', df, lambda df: px.pie(df, values='count', names='member_tier',
                                        title='Member Tier Distribution',
                                        hole=0.4,
-                                       color_discrete_sequence=px.colors.sequential.RdBu)
-                            fig.update_traces(textposition='inside', textinfo='percent+label+value')
+                                       color_discrete_sequence=px.colors.sequential.RdBu).update_traces(textposition='inside', textinfo='percent+label+value'))
                             st.plotly_chart(fig, use_container_width=True)
                         except Exception as viz_error:
                             st.warning(f"Could not generate pie chart: {str(viz_error)}")
@@ -11892,7 +15631,7 @@ def show_reports():
         
         elif member_report == "Inactive Members":
             try:
-                data = Database.execute_query("""
+                data = Database.execute_query(f"""
                     SELECT u.full_name, u.email, u.member_tier,
                            u.created_at as joined_date,
                            COALESCE(MAX(br.checkout_date), 'Never') as last_activity,
@@ -11901,7 +15640,7 @@ def show_reports():
                     LEFT JOIN borrowing br ON u.user_id = br.user_id
                     WHERE u.role = 'member' AND u.is_active = 1
                     GROUP BY u.user_id
-                    HAVING (last_activity = 'Never' OR julianday('now') - julianday(MAX(br.checkout_date)) > 90)
+                    HAVING (last_activity = 'Never' OR MAX(br.checkout_day) < {LoanDates.now_sql('-90 days')})
                     ORDER BY last_activity DESC
                     LIMIT 20
                 """)
@@ -11933,14 +15672,14 @@ def show_reports():
         
         elif member_report == "Most Active Members (This Month)":
             try:
-                data = Database.execute_query("""
+                data = Database.execute_query(f"""
                     SELECT u.full_name, u.email, u.member_tier,
                            COUNT(br.borrowing_id) as books_this_month,
-                           AVG(julianday(COALESCE(br.return_date, date('now'))) - julianday(br.checkout_date)) as avg_duration
+                           AVG(COALESCE(br.return_day, {LoanDates.TODAY}) - br.checkout_day) as avg_duration
                     FROM users u
                     JOIN borrowing br ON u.user_id = br.user_id
                     WHERE u.role = 'member' AND u.is_active = 1
-                      AND br.checkout_date >= date('now', 'start of month')
+                      AND br.checkout_day >= {LoanDates.now_sql('start of month')}
                     GROUP BY u.user_id
                     ORDER BY books_this_month DESC, avg_duration ASC
                     LIMIT 15
@@ -11962,12 +15701,11 @@ def show_reports():
                         
                         try:
                             # Activity chart
-                            fig = px.bar(df, x='full_name', y='books_this_month',
+                            fig = FigureCache.figure('reports_active_members', df, lambda df: px.bar(df, x='full_name', y='books_this_month',
                                        title='Most Active Members This Month',
                                        labels={'full_name': 'Member Name', 'books_this_month': 'Books Borrowed'},
                                        color='member_tier',
-                                       color_discrete_map={'basic': '#FFA726', 'premium': '#66BB6A', 'gold': '#FFD700'})
-                            fig.update_layout(hovermode='x unified', xaxis_tickangle=-45, height=500)
+                                       color_discrete_map={'basic': '#FFA726', 'premium': '#66BB6A', 'gold': '#FFD700'}).update_layout(hovermode='x unified', xaxis_tickangle=-45, height=500))
                             st.plotly_chart(fig, use_container_width=True)
                         except Exception as viz_error:
                             st.warning(f"Could not generate activity chart: {str(viz_error)}")
@@ -11992,155 +15730,13 @@ def show_reports():
             fin_end = st.date_input("To Date", date.today(), key="fin_end")
         
         if st.button(" Generate Financial Report", use_container_width=True):
-            try:
-                st.divider()
-                
-                # Summary metrics
-                total_fines = Database.execute_query("""
-                    SELECT SUM(fine_amount) as total
-                    FROM borrowing
-                    WHERE return_date BETWEEN ? AND ? AND fine_amount > 0
-                """, (fin_start, fin_end), fetch_one=True)
-                
-                outstanding_fines = Database.execute_query("""
-                    SELECT SUM(fine_balance) as total
-                    FROM users
-                    WHERE fine_balance > 0
-                """, fetch_one=True)
-                
-                avg_fine = Database.execute_query("""
-                    SELECT AVG(fine_amount) as avg
-                    FROM borrowing
-                    WHERE return_date BETWEEN ? AND ? AND fine_amount > 0
-                """, (fin_start, fin_end), fetch_one=True)
-                
-                # Handle null values and ensure proper data types
-                total_collected = 0
-                if total_fines and total_fines.get('total'):
-                    total_collected = float(total_fines['total'])
-                
-                outstanding_total = 0
-                if outstanding_fines and outstanding_fines.get('total'):
-                    outstanding_total = float(outstanding_fines['total'])
-                
-                avg_amount = 0
-                if avg_fine and avg_fine.get('avg'):
-                    avg_amount = float(avg_fine['avg'])
-                
-                col1, col2, col3 = st.columns(3, gap="small")
-                with col1:
-                    st.metric(" Fines Collected", format_currency(total_collected))
-                with col2:
-                    st.metric(" Outstanding Fines", format_currency(outstanding_total))
-                with col3:
-                    st.metric(" Average Fine", format_currency(avg_amount))
-            except Exception as e:
-                st.error(f"Error generating financial summary: {str(e)}")
-                st.info("Please check the database connection and try again.")
-            
-                st.divider()
-                
-                # Daily fines chart
-                try:
-                    fines_daily = Database.execute_query("""
-                        SELECT DATE(return_date) as date, 
-                               SUM(fine_amount) as total,
-                               COUNT(*) as fine_count
-                        FROM borrowing
-                        WHERE return_date BETWEEN ? AND ? AND fine_amount > 0
-                        GROUP BY DATE(return_date)
-                        ORDER BY date
-                    """, (fin_start, fin_end))
-                    
-                    if fines_daily:
-                        df = pd.DataFrame(fines_daily)
-                        # Handle null values and ensure proper data types
-                        df = df.fillna(0)
-                        df['total'] = pd.to_numeric(df['total'], errors='coerce').fillna(0.0)
-                        df['fine_count'] = pd.to_numeric(df['fine_count'], errors='coerce').fillna(0).astype(int)
-                        
-                        if len(df) > 0 and df['total'].sum() > 0:
-                            try:
-                                # Area chart for daily fines
-                                fig = go.Figure()
-                                fig.add_trace(go.Scatter(
-                                    x=df['date'], y=df['total'],
-                                    mode='lines',
-                                    name='Fine Amount',
-                                    line=dict(color='#4CAF50', width=3),
-                                    fill='tozeroy',
-                                    fillcolor='rgba(76, 175, 80, 0.2)'
-                                ))
-                                fig.update_layout(hovermode='x unified',
-                                    title="Daily Fines Collected",
-                                    xaxis_title="Date",
-                                    yaxis_title="Amount ($)",
-                                    height=400
-                                )
-                                st.plotly_chart(fig, use_container_width=True)
-                                
-                                # Bar chart for fine counts
-                                fig2 = px.bar(df, x='date', y='fine_count',
-                                            title='Number of Fines per Day',
-                                            labels={'date': 'Date', 'fine_count': 'Number of Fines'},
-                                            color='fine_count',
-                                            color_continuous_scale='Reds')
-                                st.plotly_chart(fig2, use_container_width=True)
-                            except Exception as viz_error:
-                                st.warning(f"Could not generate daily charts: {str(viz_error)}")
-                                st.dataframe(df, use_container_width=True, hide_index=True)
-                        else:
-                            st.info("No fine data available for the selected date range")
-                    else:
-                        st.info("No fine data available for the selected date range")
-                except Exception as e:
-                    st.error(f"Error generating daily fines analysis: {str(e)}")
-            
-                # Monthly revenue projection
-                st.subheader(" Monthly Revenue Projection")
-                try:
-                    monthly_fines = Database.execute_query("""
-                        SELECT strftime('%Y-%m', return_date) as month,
-                               SUM(fine_amount) as total
-                        FROM borrowing
-                        WHERE fine_amount > 0 AND return_date IS NOT NULL
-                        GROUP BY strftime('%Y-%m', return_date)
-                        ORDER BY month DESC
-                        LIMIT 12
-                    """)
-                    
-                    if monthly_fines:
-                        df_monthly = pd.DataFrame(monthly_fines)
-                        # Handle null values and ensure proper data types
-                        df_monthly = df_monthly.fillna({'month': '', 'total': 0})
-                        df_monthly['total'] = pd.to_numeric(df_monthly['total'], errors='coerce').fillna(0.0)
-                        
-                        # Filter out invalid months and zero totals
-                        df_monthly = df_monthly[df_monthly['month'] != '']
-                        df_monthly = df_monthly[df_monthly['total'] > 0]
-                        
-                        if len(df_monthly) > 0:
-                            df_monthly = df_monthly.sort_values('month')
-                            
-                            try:
-                                fig = px.line(df_monthly, x='month', y='total',
-                                            title='Monthly Fine Revenue (Last 12 Months)',
-                                            labels={'month': 'Month', 'total': 'Revenue ($)'},
-                                            markers=True)
-                                fig.update_traces(line_color='#2196F3', line_width=4)
-                                st.plotly_chart(fig, use_container_width=True)
-                            except Exception as viz_error:
-                                st.warning(f"Could not generate monthly revenue chart: {str(viz_error)}")
-                                st.dataframe(df_monthly, use_container_width=True, hide_index=True)
-                        else:
-                            st.info("No monthly revenue data available")
-                    else:
-                        st.info("No monthly revenue data available")
-                except Exception as e:
-                    st.error(f"Error generating monthly revenue projection: {str(e)}")
-            except Exception as e:
-                st.error(f"Error generating Financial Analytics report: {str(e)}")
-                st.info("Please check the database connection and try again.")
+            st.session_state.report_job_financial = ReportJobRunner.submit(
+                'financial', {'start': str(fin_start), 'end': str(fin_end)}
+            )
+        
+        if st.session_state.get('report_job_financial'):
+            st.divider()
+            show_report_job('report_job_financial')
     
     with tab5:
         st.subheader(" Advanced Visualizations")
@@ -12164,10 +15760,10 @@ def show_reports():
                 avail_books = Database.execute_query("SELECT COUNT(*) as cnt FROM book_inventory WHERE is_available=1", fetch_one=True)
                 # Active members
                 active_members = Database.execute_query("SELECT COUNT(*) as cnt FROM users WHERE is_active=1 AND role='member'", fetch_one=True)
-                # Current borrows
-                current_borrows = Database.execute_query("SELECT COUNT(*) as cnt FROM borrowing WHERE return_date IS NULL", fetch_one=True)
-                # Overdue books
-                overdue = Database.execute_query("SELECT COUNT(*) as cnt FROM borrowing WHERE return_date IS NULL AND due_date < date('now')", fetch_one=True)
+                # Current and overdue borrows
+                loans = LoanKpiEngine.compute()
+                current_borrows = {'cnt': loans['active_loans']}
+                overdue = {'cnt': loans['overdue_loans']}
                 
                 # Handle null values and ensure proper data types
                 metrics = {
@@ -12189,13 +15785,12 @@ def show_reports():
                 })
                 
                 try:
-                    fig = px.bar(health_df, x='Metric', y='Score',
+                    fig = FigureCache.figure('reports_health_scores', health_df, lambda df: px.bar(df, x='Metric', y='Score',
                                title='Library Health Scores',
                                labels={'Score': 'Score (%)'},
                                color='Score',
                                color_continuous_scale='RdYlGn',
-                               range_y=[0, 100])
-                    fig.update_layout(hovermode='x unified', height=400)
+                               range_y=[0, 100]).update_layout(hovermode='x unified', height=400))
                     st.plotly_chart(fig, use_container_width=True)
                 except Exception as viz_error:
                     st.warning(f"Could not generate health chart: {str(viz_error)}")
@@ -12224,18 +15819,19 @@ def show_reports():
                 genre_perf = Database.execute_query("""
                     SELECT g.genre_name,
                            COUNT(DISTINCT b.book_id) as book_count,
-                           COUNT(br.borrowing_id) as borrow_count,
                            AVG(bs.average_rating) as avg_rating
                     FROM genres g
                     JOIN book_genres bg ON g.genre_id = bg.genre_id
                     JOIN books b ON bg.book_id = b.book_id
-                    LEFT JOIN book_inventory bi ON b.book_id = bi.book_id
-                    LEFT JOIN borrowing br ON bi.inventory_id = br.inventory_id
                     LEFT JOIN book_statistics bs ON b.book_id = bs.book_id
                     WHERE b.is_active = 1
                     GROUP BY g.genre_name
                     LIMIT 10
                 """)
+                if genre_perf:
+                    genre_borrows = DailyStats.dimension_totals('genre', 'checkouts')
+                    for row in genre_perf:
+                        row['borrow_count'] = genre_borrows.get(row['genre_name'], 0)
                 
                 if genre_perf:
                     df = pd.DataFrame(genre_perf)
@@ -12408,7 +16004,7 @@ def show_reports():
                     if len(df) > 0:
                         try:
                             # 3D Scatter plot
-                            fig = px.scatter_3d(df, x='publication_year', y='total_checkouts', z='average_rating',
+                            fig = FigureCache.figure('reports_multidimensional', df, lambda df: px.scatter_3d(df, x='publication_year', y='total_checkouts', z='average_rating',
                                               color='genre_name', size='total_copies',
                                               hover_data=['title'],
                                               title='3D Book Analysis: Year vs Popularity vs Rating',
@@ -12416,8 +16012,7 @@ def show_reports():
                                                   'publication_year': 'Publication Year',
                                                   'total_checkouts': 'Total Checkouts',
                                                   'average_rating': 'Rating'
-                                              })
-                            fig.update_layout(hovermode='x unified', height=700)
+                                              }).update_layout(hovermode='x unified', height=700))
                             st.plotly_chart(fig, use_container_width=True)
                         except Exception as viz_error:
                             st.warning(f"Could not generate 3D scatter plot: {str(viz_error)}")
@@ -12427,11 +16022,10 @@ def show_reports():
                             sunburst_df = df[df['genre_name'] != 'Unknown']
                             if len(sunburst_df) > 0:
                                 st.markdown("###  Collection Hierarchy")
-                                fig2 = px.sunburst(sunburst_df, path=['genre_name', 'title'], values='total_checkouts',
+                                fig2 = FigureCache.figure('reports_genre_sunburst', sunburst_df, lambda df: px.sunburst(df, path=['genre_name', 'title'], values='total_checkouts',
                                                   title='Book Collection by Genre (Size = Popularity)',
                                                   color='average_rating',
-                                                  color_continuous_scale='RdYlGn')
-                                fig2.update_layout(height=600)
+                                                  color_continuous_scale='RdYlGn').update_layout(height=600))
                                 st.plotly_chart(fig2, use_container_width=True)
                         except Exception as viz_error:
                             st.warning(f"Could not generate sunburst chart: {str(viz_error)}")
@@ -12512,59 +16106,42 @@ def show_my_library():
             checked_out_copies = max(total_copies - available_copies, 0)
             availability_pct = (available_copies / total_copies * 100) if total_copies > 0 else 0.0
 
-            active_loan_summary = Database.execute_query(
-                """
-                SELECT
-                    SUM(CASE WHEN return_date IS NULL THEN 1 ELSE 0 END) as active_loans,
-                    SUM(CASE WHEN return_date IS NULL AND date(due_date) < date('now') THEN 1 ELSE 0 END) as overdue_loans
-                FROM borrowing
-                """,
-                fetch_one=True
-            ) or {}
-            active_loans = int(active_loan_summary.get('active_loans') or 0)
-            overdue_loans = int(active_loan_summary.get('overdue_loans') or 0)
+            loan_summary = LoanKpiEngine.compute(window_days=window_days)
+            active_loans = int(loan_summary.get('active_loans') or 0)
+            overdue_loans = int(loan_summary.get('overdue_loans') or 0)
 
             if window_days is None:
                 titles_window_query = "SELECT COUNT(*) as count FROM books"
                 titles_window_params = None
-                checkouts_window_query = "SELECT COUNT(*) as count FROM borrowing"
-                checkouts_window_params = None
                 checkouts_trend_query = """
                     SELECT date(checkout_date) as day, COUNT(*) as checkout_count
                     FROM borrowing
-                    WHERE checkout_date IS NOT NULL
-                    GROUP BY date(checkout_date)
-                    ORDER BY day DESC
+                    WHERE checkout_day IS NOT NULL
+                    GROUP BY checkout_day
+                    ORDER BY checkout_day DESC
                     LIMIT 30
                 """
                 checkouts_trend_params = None
             else:
                 titles_window_query = "SELECT COUNT(*) as count FROM books WHERE date(created_at) >= date('now', ?)"
                 titles_window_params = (f"-{window_days} days",)
-                checkouts_window_query = "SELECT COUNT(*) as count FROM borrowing WHERE date(checkout_date) >= date('now', ?)"
-                checkouts_window_params = (f"-{window_days} days",)
-                checkouts_trend_query = """
+                checkouts_trend_query = f"""
                     SELECT date(checkout_date) as day, COUNT(*) as checkout_count
                     FROM borrowing
-                    WHERE checkout_date IS NOT NULL AND date(checkout_date) >= date('now', ?)
-                    GROUP BY date(checkout_date)
-                    ORDER BY day DESC
+                    WHERE checkout_day >= {LoanDates.TODAY} - ?
+                    GROUP BY checkout_day
+                    ORDER BY checkout_day DESC
                     LIMIT 30
                 """
-                checkouts_trend_params = (f"-{window_days} days",)
+                checkouts_trend_params = (int(window_days),)
 
             titles_window = Database.execute_query(
                 titles_window_query,
                 titles_window_params,
                 fetch_one=True
             ) or {'count': 0}
-            checkouts_window = Database.execute_query(
-                checkouts_window_query,
-                checkouts_window_params,
-                fetch_one=True
-            ) or {'count': 0}
             new_titles_in_window = int(titles_window.get('count') or 0)
-            checkouts_in_window = int(checkouts_window.get('count') or 0)
+            checkouts_in_window = int(loan_summary.get('window_checkouts') or 0)
 
             kpi_col1, kpi_col2 = st.columns(2, gap="small")
             with kpi_col1:
@@ -12796,7 +16373,22 @@ def show_my_library():
                                 else:
                                     st.error(pdf_msg)
 
+                        duplicate_book = None
                         if create_catalog and is_management_user:
+                            duplicate_book = DataValidator.detect_duplicate_books(title, authors_text or "Unknown", isbn_issn)
+                            if duplicate_book and DataValidator.is_other_edition(duplicate_book, isbn_issn):
+                                st.warning(
+                                    f"Possible other edition of book #{duplicate_book['book_id']} "
+                                    f"\"{duplicate_book['title']}\" (different ISBN), creating a separate record."
+                                )
+                                duplicate_book = None
+                            elif duplicate_book:
+                                st.error(
+                                    f"Catalog record not created: matches existing book #{duplicate_book['book_id']} "
+                                    f"\"{duplicate_book['title']}\" by {duplicate_book['author'] or 'Unknown'}."
+                                )
+
+                        if create_catalog and is_management_user and not duplicate_book:
                             resolved_isbn = (isbn_issn or "").strip()
                             if not resolved_isbn:
                                 resolved_isbn = f"AUTO-{user['user_id']}-{int(time.time())}"
@@ -12970,9 +16562,10 @@ def show_my_library():
                         {"Status": "Private", "Count": private_count}
                     ]
                     if any(v["Count"] > 0 for v in vis_data):
-                        fig_vis = px.pie(pd.DataFrame(vis_data), names='Status', values='Count', 
-                                        color_discrete_map={"Public": "#4CAF50", "Private": "#2196F3"})
-                        fig_vis.update_layout(height=280, margin=dict(l=0, r=0, t=0, b=0))
+                        fig_vis = FigureCache.figure('library_visibility', pd.DataFrame(vis_data), lambda df: px.pie(
+                            df, names='Status', values='Count',
+                            color_discrete_map={"Public": "#4CAF50", "Private": "#2196F3"}
+                        ).update_layout(height=280, margin=dict(l=0, r=0, t=0, b=0)))
                         st.plotly_chart(fig_vis, use_container_width=True)
                     else:
                         st.info("No visibility data")
@@ -12992,9 +16585,9 @@ def show_my_library():
                 st.markdown("**Genre Distribution**")
                 if genre_counts:
                     genre_df = pd.DataFrame(list(genre_counts.items()), columns=['Genre', 'Count']).sort_values('Count', ascending=False)
-                    fig_genre = px.bar(genre_df, x='Genre', y='Count', title=None, 
-                                      color='Count', color_continuous_scale='Blues')
-                    fig_genre.update_layout(height=280, showlegend=False, margin=dict(l=0, r=0, t=20, b=0))
+                    fig_genre = FigureCache.figure('library_genres', genre_df, lambda df: px.bar(
+                        df, x='Genre', y='Count', title=None, color='Count', color_continuous_scale='Blues'
+                    ).update_layout(height=280, showlegend=False, margin=dict(l=0, r=0, t=20, b=0)))
                     st.plotly_chart(fig_genre, use_container_width=True)
                 else:
                     st.info("No genre data")
@@ -13006,9 +16599,9 @@ def show_my_library():
                 if author_counts:
                     top_authors = sorted(author_counts.items(), key=lambda x: x[1], reverse=True)[:5]
                     author_df = pd.DataFrame(top_authors, columns=['Author', 'Count'])
-                    fig_author = px.bar(author_df, x='Author', y='Count', title=None, 
-                                       color='Count', color_continuous_scale='Greens')
-                    fig_author.update_layout(height=280, showlegend=False, margin=dict(l=0, r=0, t=20, b=0))
+                    fig_author = FigureCache.figure('library_authors', author_df, lambda df: px.bar(
+                        df, x='Author', y='Count', title=None, color='Count', color_continuous_scale='Greens'
+                    ).update_layout(height=280, showlegend=False, margin=dict(l=0, r=0, t=20, b=0)))
                     st.plotly_chart(fig_author, use_container_width=True)
                 else:
                     st.info("No author data")
@@ -13023,9 +16616,9 @@ def show_my_library():
                         {"Title": p.get('title')[:25], "Views": int(p.get('views_count') or 0)}
                         for p in top_viewed
                     ])
-                    fig_views = px.bar(view_df, x='Title', y='Views', title=None,
-                                      color='Views', color_continuous_scale='Reds')
-                    fig_views.update_layout(height=280, showlegend=False, margin=dict(l=0, r=0, t=20, b=0))
+                    fig_views = FigureCache.figure('library_top_viewed', view_df, lambda df: px.bar(
+                        df, x='Title', y='Views', title=None, color='Views', color_continuous_scale='Reds'
+                    ).update_layout(height=280, showlegend=False, margin=dict(l=0, r=0, t=20, b=0)))
                     st.plotly_chart(fig_views, use_container_width=True)
                 else:
                     st.info("No view data")
@@ -14135,6 +17728,12 @@ def show_system_tools():
                                             st.write(f"**ISBN:** {rec.get('isbn', 'N/A')}")
                                 else:
                                     st.info("No recommendations found")
+                                
+                                also_borrowed = SmartUtilities.get_also_borrowed(selected_book['book_id'])
+                                if also_borrowed:
+                                    st.markdown("**Members who borrowed this also borrowed:**")
+                                    for rec in also_borrowed:
+                                        st.write(f"- {rec['title']} by {rec['author']} ({rec['similarity_score']:.1f}%)")
                     else:
                         st.warning("No books found")
             
@@ -14147,37 +17746,27 @@ def show_system_tools():
                 
                 if st.button(" Check Spelling", key="check_spell"):
                     if text_to_check:
-                        # Simple spell check using fuzzy matching against known words
-                        words = text_to_check.split()
+                        # Check words against the catalog spelling dictionary
+                        suggestions = SpellingIndex.suggest(SpellingIndex.tokenize(text_to_check))
                         
-                        # Get common book words from database
-                        common_words = Database.execute_query("""
-                            SELECT DISTINCT LOWER(title) as word FROM books
-                            UNION
-                            SELECT DISTINCT LOWER(a.name) as word FROM authors a
-                        """)
+                        suspicious_words = [
+                            {
+                                'word': word,
+                                'suggestion': suggestion,
+                                'score': fuzz.ratio(word, suggestion) if suggestion else 0
+                            }
+                            for word, suggestion in suggestions.items()
+                        ]
                         
-                        if common_words:
-                            word_list = [w['word'] for w in common_words]
-                            
-                            suspicious_words = []
-                            for word in words:
-                                clean_word = word.lower().strip('.,!?;:')
-                                # Check if word exists or is very similar
-                                matches = process.extract(clean_word, word_list, limit=1)
-                                if matches and matches[0][1] < 80:  # Less than 80% match
-                                    suspicious_words.append({
-                                        'word': word,
-                                        'suggestion': matches[0][0] if matches else None,
-                                        'score': matches[0][1] if matches else 0
-                                    })
-                            
-                            if suspicious_words:
-                                st.warning(f" Found {len(suspicious_words)} potential issues:")
-                                for item in suspicious_words:
+                        if suspicious_words:
+                            st.warning(f" Found {len(suspicious_words)} potential issues:")
+                            for item in suspicious_words:
+                                if item['suggestion']:
                                     st.write(f"- **{item['word']}** -> Did you mean: *{item['suggestion']}*? (Confidence: {item['score']}%)")
-                            else:
-                                st.success(" No spelling issues detected")
+                                else:
+                                    st.write(f"- **{item['word']}** -> not in catalog vocabulary")
+                        else:
+                            st.success(" No spelling issues detected")
                     else:
                         st.warning("Please enter text to check")
             
@@ -14197,38 +17786,16 @@ def show_system_tools():
                         """)
                         
                         if all_books and len(all_books) > 1:
-                            duplicates = []
-                            checked = set()
+                            progress = st.progress(0.0)
+                            status_line = st.empty()
+                            matches = []
                             
-                            for i, book1 in enumerate(all_books):
-                                if book1['book_id'] in checked:
-                                    continue
-                                    
-                                for book2 in all_books[i+1:]:
-                                    if book2['book_id'] in checked:
-                                        continue
-                                    
-                                    # Calculate similarity
-                                    title_sim = fuzz.ratio(
-                                        book1['title'].lower(), 
-                                        book2['title'].lower()
-                                    )
-                                    author_sim = fuzz.ratio(
-                                        book1['author'].lower(), 
-                                        book2['author'].lower()
-                                    )
-                                    
-                                    # Average similarity
-                                    avg_sim = (title_sim + author_sim) / 2
-                                    
-                                    if avg_sim >= threshold:
-                                        duplicates.append({
-                                            'book1': book1,
-                                            'book2': book2,
-                                            'similarity': avg_sim
-                                        })
-                                        checked.add(book1['book_id'])
-                                        checked.add(book2['book_id'])
+                            for scored, total, found in DuplicateDetector.iter_matches(all_books, threshold):
+                                matches.extend(found)
+                                progress.progress(scored / total if total else 1.0)
+                                status_line.caption(f"Scored {scored:,} of {total:,} candidate pairs - {len(matches)} above threshold")
+                            
+                            duplicates = DuplicateDetector.pick_matches(all_books, matches)
                             
                             if duplicates:
                                 st.warning(f" Found {len(duplicates)} potential matches:")
@@ -14552,15 +18119,15 @@ def show_system_tools():
             """)
             
             # Preview affected members
-            affected = Database.execute_query("""
+            affected = Database.execute_query(f"""
                 SELECT br.borrowing_id, b.title, u.full_name, u.email, br.due_date,
-                       julianday(br.due_date) - julianday(date('now')) as days_until_due
+                       br.due_day - {LoanDates.TODAY} as days_until_due
                 FROM borrowing br
                 JOIN book_inventory bi ON br.inventory_id = bi.inventory_id
                 JOIN books b ON bi.book_id = b.book_id
                 JOIN users u ON br.user_id = u.user_id
                 WHERE br.return_date IS NULL
-                  AND julianday(br.due_date) - julianday(date('now')) <= 3
+                  AND br.due_day <= {LoanDates.now_sql('+3 days')}
                 ORDER BY br.due_date
             """)
             
@@ -14613,6 +18180,7 @@ def main():
     
     # Initialize DB
     Database.init_pool()
+    MaintenanceScheduler.start()
     
     # Initialize auth
     Auth.init_session()